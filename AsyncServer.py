@@ -0,0 +1,939 @@
+import asyncio
+import base64
+import json
+import random
+import time
+from urllib.parse import quote
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from github import GithubException
+
+from .Server import COMPARE_FILES_LIMIT, CONTENTS_LIMIT, Codec, Index, JSON, MetadataCache, Metrics, Query, Scheduler, TableCache, TableChange, TableDecoder, TableLayout, Tree, TreeItem, TreeWalker, logger, prioritized, verbose_logging
+
+
+
+
+class AsyncServer(TableLayout):
+    """
+    asyncio counterpart of `server`, talking to the GitHub REST API through one
+    aiohttp session: a bounded keep-alive connection pool (`pool_size`) and at
+    most `concurrency` requests in flight. Tables are stored exactly like
+    `server` stores them (same paths, shards, indexes and codecs), so both can
+    work on the same repository. Requests are paced by a Scheduler, like
+    `server`'s, which can be shared with it, and measured in the same Metrics.
+
+        async with AsyncServer('TOKEN', 'REPO') as S:
+            tables = await S.get_many([('CLASS', 'A'), ('CLASS', 'B')])
+    """
+    def __init__(self, token, repo, branch='main', owner=None, base_url='https://api.github.com', pool_size=20,
+                 concurrency=10, cache_ttl=5.0, cache_max_bytes=64 * 1024 * 1024, shard_max_bytes=512 * 1024,
+                 codec='json', max_retries=10, retry_delay=0.1, scheduler=None, metadata_ttl=3600.0,
+                 metrics=None, sinks=(), trace=False, verbose=False):
+        if aiohttp is None:
+            raise ImportError("AsyncServer requires the aiohttp package.")
+        if verbose:
+            verbose_logging()
+        self.token = token
+        self.repo = repo
+        self.branch = branch
+        self.owner = owner
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.concurrency = concurrency
+        self.cache = TableCache(ttl=cache_ttl, max_bytes=cache_max_bytes)
+        self.shard_max_bytes = shard_max_bytes
+        self.codec = Codec.parse(codec)
+        self.codecs = {}
+        self.layouts = {}
+        self.indexes = {}
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.conflicts = 0
+        self.retries = 0
+        self.failures = 0
+        self.turns = {}
+        self.scheduler = scheduler or Scheduler()
+        self.metadata = MetadataCache(ttl=metadata_ttl)
+        self.metrics = metrics or Metrics(sinks, trace=trace)
+        self.session = None
+        self.semaphore = None
+
+    async def connect(self):
+        """
+        # AsyncServer (connect)
+
+        The purpose of this function is to open the HTTP session (and look the repository owner up when it was not
+        given). It is called by `async with` and, lazily, by the first request.
+        """
+        if self.session is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30),
+                headers={
+                    "Authorization": f"Bearer {self.token}",
+                    "Accept": "application/vnd.github+json",
+                    "X-GitHub-Api-Version": "2022-11-28",
+                },
+            )
+        if self.owner is None:
+            # Same on-disk login cache as server, so a warm start makes no request
+            self.owner = self.metadata.get(self.token, "login")
+            if self.owner is None:
+                self.owner = (await self._request("GET", "/user"))[1]["login"]
+                self.metadata.put(self.token, "login", self.owner)
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def __str__(self):
+        return f'Repository(full_name="{self.owner}/{self.repo}")'
+
+    # === HTTP ===
+    async def _request(self, method, path, body=None, params=None, headers=None):
+        """
+        Sends one request through the scheduler and returns (status, data, headers). Errors are raised as
+        GithubException, like PyGithub does, so callers handle both clients the same way.
+        """
+        if self.session is None:
+            await self.connect()
+        payload = None if body is None else json.dumps(body).encode()
+        if payload is not None:
+            headers = dict(headers or {}, **{"Content-Type": "application/json"})
+        for attempt in range(self.scheduler.max_retries + 1):
+            await self.scheduler.acquire_async(method)
+            async with self.semaphore:
+                start = time.perf_counter()
+                async with self.session.request(method, self.base_url + path, data=payload, params=params, headers=headers) as response:
+                    raw = await response.read()
+                    status, response_headers = response.status, response.headers
+                Metrics.request(method, path, status, time.perf_counter() - start, len(payload or b""), len(raw), response_headers)
+            delay = self.scheduler.observe(status, response_headers, attempt)
+            if delay is None:
+                break
+            Metrics.record("throttled")
+        try:
+            data = json.loads(raw) if raw else None
+        except ValueError:
+            # A proxy or an outage may answer with an HTML or text page instead of JSON
+            if status < 400:
+                raise
+            data = {"message": raw.decode(errors="replace")}
+        if status >= 400:
+            raise GithubException(status, data, dict(response_headers))
+        return status, data, response_headers
+
+    async def _read_blob(self, sha, decoder):
+        """
+        Feeds blob `sha` to `decoder` chunk by chunk, fetched with the raw media type (no base64).
+        """
+        if self.session is None:
+            await self.connect()
+        for attempt in range(self.scheduler.max_retries + 1):
+            await self.scheduler.acquire_async("GET")
+            async with self.semaphore:
+                path, start = self._repo_path(f"/git/blobs/{sha}"), time.perf_counter()
+                async with self.session.get(self.base_url + path, headers={"Accept": "application/vnd.github.raw"}) as response:
+                    Metrics.request("GET", path, response.status, time.perf_counter() - start, headers=response.headers)
+                    delay = self.scheduler.observe(response.status, response.headers, attempt)
+                    if delay is not None:
+                        Metrics.record("throttled")
+                        continue
+                    if response.status >= 400:
+                        raise GithubException(response.status, {"message": await response.text()}, dict(response.headers))
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        Metrics.record("bytes_down", len(chunk))
+                        decoder.feed(chunk)
+                    return decoder.close()
+        raise GithubException(403, {"message": "Rate limited while reading a blob"}, None)
+
+    def _repo_path(self, suffix=""):
+        return f"/repos/{self.owner}/{self.repo}{suffix}"
+
+    def _contents_path(self, path):
+        return self._repo_path(f"/contents/{quote(path)}")
+
+    # === Git Data API ===
+    async def _head(self):
+        _, ref, _ = await self._request("GET", self._repo_path(f"/git/ref/heads/{self.branch}"))
+        sha = ref["object"]["sha"]
+        _, commit, _ = await self._request("GET", self._repo_path(f"/git/commits/{sha}"))
+        return sha, commit["tree"]["sha"]
+
+    async def _walk(self, sha, prefix=""):
+        """
+        Returns every TreeItem below tree `sha`, from one recursive listing (cached per
+        tree sha in TreeWalker) or, when GitHub truncates it, subtree by subtree.
+        """
+        items = TreeWalker.cached(sha) if not prefix else None
+        if items is not None:
+            return items
+        _, tree, _ = await self._request("GET", self._repo_path(f"/git/trees/{sha}"), params={"recursive": "1"})
+        if tree.get("truncated"):
+            _, tree, _ = await self._request("GET", self._repo_path(f"/git/trees/{sha}"))
+            if tree.get("truncated"):
+                raise ValueError(f"Tree '{prefix or sha}' has too many entries to be listed.")
+            items = []
+            subtrees = []
+            for item in tree["tree"]:
+                items.append(TreeItem(prefix + item["path"], item["mode"], item["type"], item["sha"], item.get("size")))
+                if item["type"] == "tree":
+                    subtrees.append(self._walk(item["sha"], f'{prefix}{item["path"]}/'))
+            for listed in await asyncio.gather(*subtrees):
+                items.extend(listed)
+        else:
+            items = [TreeItem(prefix + item["path"], item["mode"], item["type"], item["sha"], item.get("size")) for item in tree["tree"]]
+        if not prefix:
+            TreeWalker.store(sha, items)
+        return items
+
+    async def _blobs(self, head, paths):
+        """
+        Returns the files (TreeItem) at or below any of `paths` in the `head` commit.
+        """
+        return TreeWalker.select(await self._walk(head[1]), paths)
+
+    async def _element(self, path, data):
+        try:
+            text = data.decode()
+        except UnicodeDecodeError:
+            _, blob, _ = await self._request("POST", self._repo_path("/git/blobs"), {"content": base64.b64encode(data).decode(), "encoding": "base64"})
+            return {"path": path, "mode": "100644", "type": "blob", "sha": blob["sha"]}
+        if len(data) <= CONTENTS_LIMIT:
+            return {"path": path, "mode": "100644", "type": "blob", "content": text}
+        _, blob, _ = await self._request("POST", self._repo_path("/git/blobs"), {"content": text, "encoding": "utf-8"})
+        return {"path": path, "mode": "100644", "type": "blob", "sha": blob["sha"]}
+
+    async def _commit(self, elements, message, head=None, expect=None):
+        """
+        Same as Tree.commit: one commit on top of the branch head, a 409 if any `expect`ed path changed,
+        rebased on the new head when only the branch moved.
+        """
+        head = head or await self._head()
+        base = head
+        for attempt in range(Tree.REBASES + 1):
+            if expect:
+                current = {item.path: item.sha for item in await self._blobs(head, list(expect))}
+                for path, sha in expect.items():
+                    if current.get(path) != sha:
+                        raise GithubException(409, {"message": f"'{path}' changed since it was read"}, None)
+            _, tree, _ = await self._request("POST", self._repo_path("/git/trees"), {"base_tree": head[1], "tree": elements})
+            _, commit, _ = await self._request("POST", self._repo_path("/git/commits"), {"message": message, "tree": tree["sha"], "parents": [head[0]]})
+            try:
+                await self._request("PATCH", self._repo_path(f"/git/refs/heads/{self.branch}"), {"sha": commit["sha"]})
+                return commit["sha"]
+            except GithubException as e:
+                if e.status != 422:
+                    raise
+                if attempt == Tree.REBASES:
+                    raise GithubException(409, {"message": f"'{self.branch}' moved while committing"}, None)
+            if not expect:
+                paths = [element["path"] for element in elements]
+                shas = {item.path: item.sha for item in await self._blobs(base, paths)}
+                expect = {path: shas.get(path) for path in paths}
+            head = await self._head()
+
+    async def _delete(self, paths, message):
+        head = await self._head()
+        items = await self._blobs(head, paths)
+        if items:
+            await self._commit([{"path": item.path, "mode": item.mode, "type": item.type, "sha": None} for item in items], message, head)
+        return [item.path for item in items]
+
+    # === Tables ===
+    async def _read_table(self, table, clas, fresh=False):
+        """
+        Returns (DATA, sha) for a table, revalidating cached tables with If-None-Match.
+        """
+        key = (clas, table, self.branch)
+        entry, stale = self.cache.peek(key, fresh)
+        if entry is not None and not stale:
+            return entry["data"], entry["sha"]
+
+        headers = {"If-None-Match": entry["content"]} if entry is not None and entry["content"] else None
+        status, data, response_headers = await self._request("GET", self._contents_path(self._table_path(table, clas)), params={"ref": self.branch}, headers=headers)
+        if status == 304:
+            self.cache.revalidated(key, False)
+            return entry["data"], entry["sha"]
+        if entry is not None:
+            self.cache.revalidated(key, True)
+        if data.get("encoding") == "none":
+            DATA, self.codecs[(clas, table)] = await self._read_blob(data["sha"], TableDecoder())
+            size = data["size"]
+        else:
+            raw = base64.b64decode(data["content"])
+            (DATA, self.codecs[(clas, table)]), size = Codec.load(raw), len(raw)
+        self.cache.put(key, DATA, data["sha"], response_headers.get("ETag"), size)
+        return DATA, data["sha"]
+
+    async def _write_table(self, table, clas, DATA, sha):
+        raw = self._encode(table, clas, DATA)
+        if len(raw) > CONTENTS_LIMIT:
+            path = self._table_path(table, clas)
+            await self._commit([await self._element(path, raw)], "File updated via AsyncServer", expect={path: sha})
+            self.cache.put((clas, table, self.branch), DATA, Tree.blob_sha(raw), None, len(raw))
+            return Tree.blob_sha(raw), len(raw)
+        body = {"message": "File updated via AsyncServer", "content": base64.b64encode(raw).decode(), "branch": self.branch}
+        if sha is not None:
+            body["sha"] = sha
+        _, result, _ = await self._request("PUT", self._contents_path(self._table_path(table, clas)), body)
+        self.cache.put((clas, table, self.branch), DATA, result["content"]["sha"], None, len(raw))
+        return result["content"]["sha"], len(raw)
+
+    async def _write_files(self, clas, parts, message, expect=None):
+        """
+        Same as server._write_files: several tables of a class in one conditional tree commit.
+        """
+        head = await self._head()
+        elements = []
+        expect = dict(expect or {})
+        encoded = {}
+        for part, (DATA, sha) in parts.items():
+            path = self._table_path(part, clas)
+            expect[path] = sha
+            if DATA is None:
+                elements.append({"path": path, "mode": "100644", "type": "blob", "sha": None})
+                continue
+            encoded[part] = self._encode(part, clas, DATA)
+            elements.append(await self._element(path, encoded[part]))
+        await self._commit(elements, message, head, expect=expect)
+
+        for part, (DATA, _) in parts.items():
+            if DATA is None:
+                self.cache.invalidate((clas, part, self.branch))
+            else:
+                raw = encoded[part]
+                self.cache.put((clas, part, self.branch), DATA, Tree.blob_sha(raw), None, len(raw))
+        return {part: len(raw) for part, raw in encoded.items()}
+
+    async def _shards(self, table, clas, fresh=False):
+        layout = self.layouts.get((clas, table))
+        if layout is None:
+            try:
+                await self._read_table(table, clas, fresh=fresh)
+                self.layouts[(clas, table)] = "plain"
+                return None
+            except GithubException as e:
+                if e.status != 404:
+                    raise
+        elif layout == "plain":
+            return None
+        manifest, _ = await self._read_table(f'{table}/_manifest', clas, fresh=fresh)
+        self.layouts[(clas, table)] = "sharded"
+        return manifest["shards"]
+
+    async def _parts(self, table, clas, fresh=False):
+        shards = await self._shards(table, clas, fresh=fresh)
+        if shards is None:
+            return [table]
+        return [self._shard_table(table, index) for index in range(shards)]
+
+    async def _write_shards(self, table, clas, parts, message, expect=None):
+        head = await self._head()
+        plain = self._table_path(table, clas)
+        old = [item.path for item in await self._blobs(head, [f'{clas}/{table}', plain])]
+        elements = [await self._element(self._table_path(f'{table}/_manifest', clas), JSON.encode({"shards": len(parts), "hash": "crc32"}))]
+        paths = set()
+        for index, DATA in enumerate(parts):
+            part = self._shard_table(table, index)
+            path = self._table_path(part, clas)
+            paths.add(path)
+            elements.append(await self._element(path, self._encode(part, clas, DATA)))
+        for path in old:
+            if (path == plain or path.rsplit("/", 1)[-1].startswith("shard_")) and path not in paths:
+                elements.append({"path": path, "mode": "100644", "type": "blob", "sha": None})
+        await self._commit(elements, message, head, expect=expect)
+        self.cache.invalidate(clas=clas, table=table)
+        self.layouts[(clas, table)] = "sharded"
+
+    # === Indexes ===
+    async def _index_fields(self, table, clas, fresh=False):
+        known = self.indexes.get((clas, table))
+        if known is not None and not fresh and (self.cache.ttl is None or time.monotonic() - known[1] < self.cache.ttl):
+            return known[0]
+        try:
+            fields = (await self._read_table(self._index_part(table), clas, fresh=fresh))[0]["fields"]
+        except GithubException as e:
+            if e.status != 404:
+                raise
+            fields = []
+        self.indexes[(clas, table)] = (fields, time.monotonic())
+        return fields
+
+    async def _index_updates(self, table, clas, fields, changes):
+        updates = {}
+        for field in fields:
+            part = self._index_part(table, field)
+            data, sha = await self._read_table(part, clas, fresh=True)
+            index = Index.from_data(data).copy()
+            for name, before, after in changes:
+                old = Index.value_of(field, before)
+                new = Index.value_of(field, after)
+                if old == new:
+                    continue
+                if old[0]:
+                    index.remove(old[1], name)
+                if new[0]:
+                    index.add(new[1], name)
+            updates[part] = (index.to_data(), sha)
+        return updates
+
+    # === Mutations ===
+    async def _retry(self, attempt, layout=None):
+        for n in range(self.max_retries + 1):
+            try:
+                return await attempt(n)
+            except GithubException as e:
+                resharded = e.status == 404 and layout is not None and self.layouts.pop(layout, None) == "plain"
+                if e.status != 409 and not resharded:
+                    raise
+                self.conflicts += 1
+                if n == self.max_retries:
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                await asyncio.sleep(random.uniform(0, self.retry_delay * 2 ** min(n, 4)))
+
+    async def _mutate(self, table, clas, rows, apply):
+        pending = self._detached(list(rows))
+        await self._check_rows(table, clas, pending)
+        outcomes = {}
+        # Tasks of this client take turns on a table instead of conflicting with each other
+        async with self.turns.setdefault((clas, table), asyncio.Lock()):
+            await self._retry(lambda attempt: self._apply_rows(table, clas, pending, apply, outcomes, fresh=attempt > 0), (clas, table))
+        return outcomes
+
+    async def _check_rows(self, table, clas, rows):
+        """
+        Same as server._check_rows: a TypeError for rows their table's codec would not give back unchanged.
+        """
+        shards = await self._shards(table, clas)
+        for name, data in rows:
+            part = self._part_of(table, shards, name)
+            known = (clas, part) in self.codecs
+            # A table whose codec is not known yet may be JSON, which takes the fewest types
+            if self._survives(self._codec(part, clas), name, data) and (known or self._survives(JSON, name, data)):
+                continue
+            await self._read_table(part, clas)
+            codec = self._codec(part, clas)
+            if self.codecs.get((clas, part)) != "legacy" and not self._survives(codec, name, data):
+                raise self._lossy(table, clas, codec, name)
+
+    async def _apply_rows(self, table, clas, pending, apply, outcomes, fresh=False):
+        shards = await self._shards(table, clas, fresh=True)
+        fields = await self._index_fields(table, clas, fresh=fresh)
+        groups = {}
+        for row in pending:
+            groups.setdefault(self._part_of(table, shards, row[0]), []).append(row)
+
+        reads = await asyncio.gather(*(self._read_table(part, clas, fresh=True) for part in groups))
+        writes = {}
+        changes = []
+        for (part, items), (DATA, sha) in zip(groups.items(), reads):
+            DATA = dict(DATA)
+            for name, data in items:
+                before = self._detached(DATA.get(name))
+                outcomes[name] = apply(DATA, name, data)
+                if outcomes[name] in ("inserted", "updated", "removed"):
+                    changes.append((name, before, DATA.get(name)))
+                    writes[part] = (DATA, sha)
+
+        if fields:
+            sizes = {}
+            if writes:
+                writes.update(await self._index_updates(table, clas, fields, changes))
+                sizes = await self._write_files(clas, writes, f"Updating table '{clas}/{table}'")
+        else:
+            async def write(part, items):
+                size = None
+                if part in writes:
+                    size = (await self._write_table(part, clas, *writes[part]))[1]
+                done = set(map(id, items))
+                pending[:] = [row for row in pending if id(row) not in done]
+                return part, size
+
+            results = await asyncio.gather(*(write(part, items) for part, items in groups.items()), return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            sizes = dict(results)
+        pending.clear()
+        if shards is not None and any(size and size > self.shard_max_bytes for part, size in sizes.items() if part.startswith(f"{table}/shard_")):
+            try:
+                await self.reshard(table, clas, shards * 2)
+            except GithubException as e:
+                if e.status != 409:
+                    raise
+                logger.warning(f"Resharding table '{clas}/{table}' kept conflicting, it will be tried again on a later write.")
+
+    def write_stats(self):
+        return {"conflicts": self.conflicts, "retries": self.retries, "failures": self.failures}
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    def scheduler_stats(self):
+        return self.scheduler.stats()
+
+    def metrics_stats(self):
+        return self.metrics.snapshot()
+
+    def metrics_text(self):
+        return self.metrics.prometheus()
+
+    def clear_cache(self):
+        self.cache.invalidate()
+
+    # === Public API ===
+    @prioritized('normal')
+    async def create_class(self, name):
+        """
+        # AsyncServer (create_class)
+        Parameters: name (str)
+
+        The purpose of this function is to create a class in the repository.
+        """
+        try:
+            await self._request("GET", self._contents_path(name), params={"ref": self.branch})
+            logger.info(f"Class '{name}' already exists in the repository '{self}'.")
+        except GithubException as e:
+            if e.status != 404:
+                raise
+            await self._request("PUT", self._contents_path(f"{name}/.gitkeep"), {"message": f"Creating folder '{name}'", "content": "", "branch": self.branch})
+            logger.info(f"Class '{name}' created successfully in the repository '{self}'.")
+        return name
+
+    @prioritized('normal')
+    async def create_table(self, name, clas, shards=None):
+        """
+        # AsyncServer (create_table)
+        Parameters: name and clas (str, str)
+        Optional: shards (int)
+
+        The purpose of this function is to create a table (optionally sharded) in the specified class.
+        """
+        try:
+            await self._shards(name, clas, fresh=True)
+            logger.info(f"Table '{name}' already exists in class '{clas}' of the repository '{self}'.")
+            return name
+        except GithubException:
+            pass
+        if shards:
+            await self._write_shards(name, clas, [{} for _ in range(shards)], f"Creating sharded table '{clas}/{name}'")
+        else:
+            await self._write_table(name, clas, {}, None)
+            self.layouts[(clas, name)] = "plain"
+        logger.info(f"Table '{name}' created successfully in class '{clas}' of the repository '{self}'.")
+        return name
+
+    @prioritized('bulk')
+    async def reshard(self, table, clas, shards):
+        """
+        # AsyncServer (reshard)
+        Parameters: table, clas and shards (str, str, int)
+
+        The purpose of this function is to redistribute the rows of a table over a new number of shards in a single commit,
+        conditional on the files that were read (see server.reshard).
+        """
+        async def attempt(n):
+            current = await self._shards(table, clas, fresh=True)
+            if current == shards:
+                return
+            expect = {}
+            if current is not None:
+                manifest = f'{table}/_manifest'
+                expect[self._table_path(manifest, clas)] = (await self._read_table(manifest, clas))[1]
+            parts = [{} for _ in range(shards)]
+            names = await self._parts(table, clas)
+            for part, (DATA, sha) in zip(names, await asyncio.gather(*(self._read_table(part, clas, fresh=True) for part in names))):
+                expect[self._table_path(part, clas)] = sha
+                for name, data in DATA.items():
+                    parts[self._shard_of(name, shards)][name] = data
+                if self.codecs.get((clas, part)) == "legacy":
+                    self.codecs.update(((clas, self._shard_table(table, index)), "legacy") for index in range(shards))
+            await self._write_shards(table, clas, parts, f"Resharding table '{clas}/{table}' into {shards} shards", expect=expect)
+
+        await self._retry(attempt, (clas, table))
+        logger.info(f"Table '{table}' in class '{clas}' resharded into {shards} shards.")
+
+    @prioritized('normal')
+    async def insert_data(self, table, clas, name, data):
+        """
+        # AsyncServer (insert_data)
+        Parameters: table, clas, name and data (str, str, str, dict)
+
+        The purpose of this function is to insert data into a specified table.
+        """
+        if (await self.insert_many(table, clas, [(name, data)], report=False))[name] == "exists":
+            logger.info(f"Data with name '{name}' already exists in table '{table}'.")
+            return
+        logger.info(f"Data inserted successfully into table '{table}' in class '{clas}' of the repository '{self}'.")
+
+    @prioritized('normal')
+    async def update_data(self, table, clas, name, data):
+        """
+        # AsyncServer (update_data)
+        Parameters: table, clas, name, data (str, str, str, dict)
+
+        The purpose of this function is to update data for a specific entry in a given table.
+        """
+        if (await self.update_many(table, clas, [(name, data)], report=False))[name] == "missing":
+            logger.info(f"Data with name '{name}' does not exist in table '{table}'.")
+            return
+        logger.info(f"Data with name '{name}' updated successfully in table '{table}' in class '{clas}' of the repository '{self}'.")
+
+    @prioritized('normal')
+    async def remove_data(self, table, clas, name):
+        """
+        # AsyncServer (remove_data)
+        Parameters: table, clas and name (str, str, str)
+
+        The purpose of this function is to remove data from a specified table.
+        """
+        if (await self.remove_many(table, clas, [name], report=False))[name] == "missing":
+            logger.info(f"Data with name '{name}' does not exist in table '{table}'.")
+            return
+        logger.info(f"Data with name '{name}' removed successfully from table '{table}' in class '{clas}' of the repository '{self}'.")
+
+    @prioritized('bulk')
+    async def insert_many(self, table, clas, rows, report=True):
+        """
+        # AsyncServer (insert_many)
+        Parameters: table, clas and rows (str, str, iterable of (name, data) or dict)
+
+        The purpose of this function is to insert many rows with one read and one commit per touched file.
+        Returns a dict mapping each name to 'inserted' or 'exists'.
+        """
+        def apply(DATA, name, data):
+            if name in DATA:
+                return "exists"
+            DATA[name] = data
+            return "inserted"
+
+        outcomes = await self._mutate(table, clas, self._rows(rows), apply)
+        if report:
+            self._report("inserted", table, clas, outcomes)
+        return outcomes
+
+    @prioritized('bulk')
+    async def update_many(self, table, clas, rows, report=True):
+        """
+        # AsyncServer (update_many)
+        Parameters: table, clas and rows (str, str, iterable of (name, data) or dict)
+
+        The purpose of this function is to update many existing rows with one read and one commit per touched file.
+        Returns a dict mapping each name to 'updated' or 'missing'.
+        """
+        def apply(DATA, name, data):
+            if name not in DATA:
+                return "missing"
+            DATA[name] = data
+            return "updated"
+
+        outcomes = await self._mutate(table, clas, self._rows(rows), apply)
+        if report:
+            self._report("updated", table, clas, outcomes)
+        return outcomes
+
+    @prioritized('bulk')
+    async def remove_many(self, table, clas, names, report=True):
+        """
+        # AsyncServer (remove_many)
+        Parameters: table, clas and names (str, str, iterable of str)
+
+        The purpose of this function is to remove many rows with one read and one commit per touched file.
+        Returns a dict mapping each name to 'removed' or 'missing'.
+        """
+        def apply(DATA, name, data):
+            if name not in DATA:
+                return "missing"
+            del DATA[name]
+            return "removed"
+
+        outcomes = await self._mutate(table, clas, [(name, None) for name in names], apply)
+        if report:
+            self._report("removed", table, clas, outcomes)
+        return outcomes
+
+    @prioritized('interactive')
+    async def get_data(self, table, clas):
+        """
+        # AsyncServer (get_data)
+        Parameters: table, clas (str, str)
+
+        The purpose of this function is to retrieve all data from a specified table in a given class.
+        Shards are fetched concurrently.
+        """
+        DATA = {}
+        for part, _ in await asyncio.gather(*(self._read_table(part, clas) for part in await self._parts(table, clas))):
+            DATA.update(part)
+        return self._detached(DATA)
+
+    @prioritized('interactive')
+    async def get_many(self, tables):
+        """
+        # AsyncServer (get_many)
+        Parameters: tables (iterable of (clas, table))
+
+        The purpose of this function is to read many tables concurrently. Returns a dict of (clas, table) -> data.
+        """
+        tables = list(tables)
+        results = await asyncio.gather(*(self.get_data(table, clas) for clas, table in tables))
+        return dict(zip(tables, results))
+
+    @prioritized('interactive')
+    async def search_data(self, table, clas, name):
+        """
+        # AsyncServer (search_data)
+        Parameters: table, clas, name (str, str, str)
+
+        The purpose of this function is to search for a specific entry by name in a given table and class.
+        """
+        DATA, _ = await self._read_table(self._part_of(table, await self._shards(table, clas), name), clas)
+        if name not in DATA:
+            logger.info(f"Data with name '{name}' does not exist in table '{table}'.")
+            return
+        return self._detached(DATA[name])
+
+    @prioritized('bulk')
+    async def create_index(self, table, clas, field):
+        """
+        # AsyncServer (create_index)
+        Parameters: table, clas and field (str, str, str)
+
+        The purpose of this function is to index a row field of a table (see server.create_index).
+        """
+        self._index_part(table, field)
+
+        async def attempt(n):
+            fields = await self._index_fields(table, clas, fresh=True)
+            if field in fields:
+                return False
+            parts = await self._parts(table, clas, fresh=True)
+            reads = await asyncio.gather(*(self._read_table(part, clas, fresh=True) for part in parts))
+            expect = {self._table_path(part, clas): sha for part, (_, sha) in zip(parts, reads)}
+            rows = [row for DATA, _ in reads for row in DATA.items()]
+            registry_sha = (await self._read_table(self._index_part(table), clas))[1] if fields else None
+            await self._write_files(clas, {
+                self._index_part(table): ({"fields": fields + [field]}, registry_sha),
+                self._index_part(table, field): (Index.build(field, rows).to_data(), None),
+            }, f"Creating index on '{field}' for table '{clas}/{table}'", expect=expect)
+            self.indexes[(clas, table)] = (fields + [field], time.monotonic())
+            return True
+
+        if not await self._retry(attempt):
+            logger.info(f"Index on '{field}' already exists in table '{table}' in class '{clas}'.")
+            return field
+        logger.info(f"Index on '{field}' created successfully in table '{table}' in class '{clas}' of the repository '{self}'.")
+        return field
+
+    async def _find(self, table, clas, field, lookup, match):
+        shards = await self._shards(table, clas)
+        if shards is None or field not in await self._index_fields(table, clas):
+            found = {}
+            for part in await self._parts(table, clas):
+                for name, row in (await self._read_table(part, clas))[0].items():
+                    has, value = Index.value_of(field, row)
+                    if has and match(value):
+                        found[name] = row
+            return self._detached(found)
+
+        index = Index.from_data((await self._read_table(self._index_part(table, field), clas))[0])
+        groups = {}
+        for name in lookup(index):
+            groups.setdefault(self._part_of(table, shards, name), []).append(name)
+        reads = await asyncio.gather(*(self._read_table(part, clas) for part in groups))
+        return self._detached({name: DATA[name] for names, (DATA, _) in zip(groups.values(), reads) for name in names if name in DATA})
+
+    @prioritized('interactive')
+    async def find_by(self, table, clas, field, value):
+        """
+        # AsyncServer (find_by)
+        Parameters: table, clas, field and value (str, str, str, any)
+
+        The purpose of this function is to find the rows whose `field` equals `value`. Returns a dict of name -> row.
+        """
+        key = Index.key(value)
+        return await self._find(table, clas, field, lambda index: index.find(value), lambda v: Index.key(v) == key)
+
+    @prioritized('interactive')
+    async def find_range(self, table, clas, field, low=None, high=None):
+        """
+        # AsyncServer (find_range)
+        Parameters: table, clas, field (str, str, str), low and high (any, optional)
+
+        The purpose of this function is to find the rows whose `field` is between `low` and `high` (inclusive).
+        """
+        def match(value):
+            return (low is None or Index.key(value) >= Index.key(low)) and (high is None or Index.key(value) <= Index.key(high))
+
+        return await self._find(table, clas, field, lambda index: index.range(low, high), match)
+
+    async def query(self, table, clas, where=None, select=None, order_by=None, limit=None, offset=0, cursor=None):
+        """
+        # AsyncServer (query)
+        Parameters: table, clas (str, str), where (dict or callable), select (list), order_by (str), limit, offset
+        (int) and cursor (str, optional)
+
+        The purpose of this function is to iterate (async for) over the (name, row) of the rows matching `where`, like
+        `server.query`. The parts of the table the query needs are read concurrently, then matched.
+        """
+        plan = Query(where, select, order_by, limit, offset, cursor)
+        for _, name, row in plan.run(await self._query_parts(table, clas, plan)):
+            yield name, self._detached(row)
+
+    @prioritized('interactive', 'query')
+    async def query_page(self, table, clas, size=50, cursor=None, where=None, select=None, order_by=None):
+        """
+        # AsyncServer (query_page)
+        Parameters: table, clas (str, str), size (int), cursor (str), where, select and order_by (optional)
+
+        The purpose of this function is to read one page of a query. Returns (rows, cursor of the next page or None).
+        """
+        if size < 1:
+            raise ValueError("The page size must be at least 1.")
+        plan = Query(where, select, order_by, size + 1, 0, cursor)
+        page = list(plan.run(await self._query_parts(table, clas, plan)))
+        following = page[size - 1][0] if len(page) > size else None
+        return self._detached({name: row for _, name, row in page[:size]}), following
+
+    @prioritized('interactive', 'query')
+    async def _query_parts(self, table, clas, plan):
+        """
+        Returns the (part number, rows) a compiled Query reads, restricted by an index when it can be.
+        """
+        parts = list(enumerate(await self._parts(table, clas)))
+        shards = await self._shards(table, clas)
+        found = plan.lookup(await self._index_fields(table, clas)) if plan.conditions and shards is not None else None
+        candidates = None
+        if found is not None:
+            field, lookup = found
+            candidates = set(lookup(Index.from_data((await self._read_table(self._index_part(table, field), clas))[0])))
+            wanted = {self._part_of(table, shards, name) for name in candidates}
+            parts = [(number, part) for number, part in parts if part in wanted]
+        reads = await asyncio.gather(*(self._read_table(part, clas) for _, part in parts))
+        return [
+            (number, [(name, row) for name, row in DATA.items() if candidates is None or name in candidates])
+            for (number, _), (DATA, _) in zip(parts, reads)
+        ]
+
+    @prioritized('interactive')
+    async def list_classes(self):
+        """
+        # AsyncServer (list_classes)
+
+        The purpose of this function is to list the classes (top-level folders) of the repository.
+        """
+        items = await self._walk((await self._head())[1])
+        return sorted(name for name, kind in TreeWalker.children(items) if kind == "tree")
+
+    @prioritized('interactive')
+    async def list_tables(self, clas):
+        """
+        # AsyncServer (list_tables)
+        Parameters: clas (str)
+
+        The purpose of this function is to list the tables of a class, sharded tables included.
+        """
+        return self._tables_in(await self._walk((await self._head())[1]), clas)
+
+    async def head_commit(self):
+        """
+        # AsyncServer (head_commit)
+
+        The purpose of this function is to return the sha of the latest commit of the branch.
+        """
+        _, ref, _ = await self._request("GET", self._repo_path(f"/git/ref/heads/{self.branch}"))
+        return ref["object"]["sha"]
+
+    async def changes_since(self, commit_sha, head=None, rows=True):
+        """
+        # AsyncServer (changes_since)
+        Parameters: commit_sha (str)
+        Optional: head (str) and rows (bool)
+
+        The purpose of this function is the same as `server.changes_since`, as an async generator: one
+        TableChange per table written since `commit_sha`. The changed shards of a table are read concurrently.
+        """
+        head, changed = await self._compare(commit_sha, head)
+        self._forget_paths(changed)
+        base = None
+        for (clas, table), parts in self._changed_tables(changed).items():
+            if not rows:
+                yield TableChange(clas, table, None, head)
+                continue
+            if base is None:
+                base = await self._blob_shas(commit_sha)
+            yield TableChange(clas, table, await self._table_diff(parts, base, changed), head)
+
+    @prioritized('normal', 'changes_since')
+    async def _compare(self, base, head=None):
+        head = head or await self.head_commit()
+        if head == base:
+            return head, {}
+        _, comparison, _ = await self._request("GET", self._repo_path(f"/compare/{base}...{head}"))
+        files = comparison.get("files") or []
+        if len(files) < COMPARE_FILES_LIMIT:
+            changed = {}
+            for file in files:
+                if file["status"] == "renamed" and file.get("previous_filename"):
+                    changed[file["previous_filename"]] = None
+                changed[file["filename"]] = None if file["status"] == "removed" else file["sha"]
+            return head, changed
+        old, new = await asyncio.gather(self._blob_shas(base), self._blob_shas(head))
+        return head, {path: new.get(path) for path in old.keys() | new.keys() if old.get(path) != new.get(path)}
+
+    async def _blob_shas(self, commit_sha):
+        _, commit, _ = await self._request("GET", self._repo_path(f"/git/commits/{commit_sha}"))
+        return {item.path: item.sha for item in await self._walk(commit["tree"]["sha"]) if item.type == "blob"}
+
+    @prioritized('normal', 'changes_since_rows')
+    async def _table_diff(self, parts, base, changed):
+        sides = [[sha for sha in (side.get(path) for path in parts) if sha] for side in (base, changed)]
+        reads = await asyncio.gather(*(self._read_blob(sha, TableDecoder()) for side in sides for sha in side))
+        old, new = {}, {}
+        for n, (DATA, _) in enumerate(reads):
+            (old if n < len(sides[0]) else new).update(DATA)
+        return self._row_changes(old, new)
+
+    @prioritized('normal')
+    async def remove_table(self, clas, table):
+        """
+        # AsyncServer (remove_table)
+        Parameters: clas and table (str, str)
+
+        The purpose of this function is to remove a table (with its shards and indexes) in a single commit.
+        """
+        sharded = await self._shards(table, clas, fresh=True) is not None
+        paths = [f'{clas}/{table}' if sharded else self._table_path(table, clas)]
+        if await self._index_fields(table, clas, fresh=True):
+            paths.append(f'{clas}/_indexes/{table}')
+        await self._delete(paths, f"Deleting table '{clas}/{table}'")
+        self._forget(clas, table)
+        logger.info(f"Table '{table}' removed successfully from class '{clas}' in the repository '{self}'.")
+
+    @prioritized('normal')
+    async def remove_class(self, clas):
+        """
+        # AsyncServer (remove_class)
+        Parameters: clas (str)
+
+        The purpose of this function is to remove a class and all its contents in a single commit.
+        """
+        await self._delete([clas], f"Deleting folder '{clas}'")
+        self.cache.invalidate(clas=clas)
+        self.layouts = {key: layout for key, layout in self.layouts.items() if key[0] != clas}
+        self.indexes = {key: fields for key, fields in self.indexes.items() if key[0] != clas}
+        logger.info(f"Class '{clas}' removed successfully from the repository '{self}'.")
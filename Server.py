@@ -1,513 +1,3884 @@
-from datetime import datetime
-import ast
-from github import Github
-from pathlib import PurePosixPath
-
-
-
-
-class GitHubRepo:
-    def __init__(self, token: str, repo_name: str):
-        self.token = token
-        self.repo_name = repo_name
-        self.client = Github(self.token)
-
-        try:
-            self.repo = self.client.get_user().get_repo(self.repo_name)
-            print(f"{datetime.now().strftime('[%d/%m/%Y | %H:%M]')} [GitHub] Successfully connected to repository '{self.repo_name}'.")
-        except Exception as e:
-            print(f"{datetime.now().strftime('[%d/%m/%Y | %H:%M]')} [GitHub] Failed to connect to repository '{self.repo_name}': {e}")
-            self.repo = None
-
-    def get_repo(self):
-        return self.repo
-
-
-
-class GitHubRepoDev:
-    def __init__(self, token: str, repo_name: str = None):
-        self.token = token
-        self.client = Github(self.token)
-        self.repo_name = repo_name
-        self.user = self.client.get_user()
-
-        self.repo = None
-        if repo_name:
-            try:
-                self.repo = self.user.get_repo(repo_name)
-                print(f"[{datetime.now().strftime('%d/%m/%Y | %H:%M')}] Connected to repo: {repo_name}")
-            except Exception as e:
-                print(f"Error accessing repo: {e}")
-
-    # === Repository ===
-    def create_repo(self, name, private=True, description=""):
-        repo = self.user.create_repo(name=name, private=private, description=description)
-        print(f"Repository '{name}' created.")
-        return repo
-
-    def delete_repo(self):
-        if self.repo:
-            self.repo.delete()
-            print(f"Repository '{self.repo_name}' deleted.")
-
-    def rename_repo(self, new_name):
-        if self.repo:
-            self.repo.edit(name=new_name)
-            print(f"Repository renamed to '{new_name}'")
-
-    def get_repo_info(self):
-        if self.repo:
-            return {
-                "name": self.repo.name,
-                "full_name": self.repo.full_name,
-                "description": self.repo.description,
-                "private": self.repo.private,
-                "url": self.repo.html_url,
-                "created_at": str(self.repo.created_at)
-            }
-
-
-    # === Hooks ===
-    def list_hooks(self):
-        return self.repo.get_hooks()
-
-    def create_hook(self, config, events=["push"], active=True):
-        """
-        Creates a repository webhook.
-        
-        Args:
-            config (dict): Configuration of the hook, e.g., {"url": "...", "content_type": "json"}
-            events (list): Events that trigger the webhook (default is ["push"])
-            active (bool): Whether the webhook is active (default is True)
-        """
-        try:
-            self.repo.create_hook(
-                name="web",  # fixed value, GitHub expects "web"
-                config=config,
-                events=events,
-                active=active
-            )
-            print("✅ Webhook created successfully.")
-        except Exception as e:
-            print(f"❌ Failed to create webhook: {e}")
-
-    def delete_hook(self, hook_id):
-        hook = self.repo.get_hook(hook_id)
-        hook.delete()
-        print(f"Hook '{hook_id}' deleted.")
-
-
-
-
-class File:
-    def __init__(self, repo, file_path: str = "", new_content: str = "", source: str = "", destination: str = "", branch: str = "main"):
-        self.repo = repo                   
-        self.file_path = file_path
-        self.new_content = new_content
-        self.source = source
-        self.destination = destination
-        self.branch = branch
-        
-    def __cof__(self, repo, file_path: str = "", new_content: str = "", source: str = "", destination: str = "", branch: str = "main"):
-        self.repo = repo                   
-        self.file_path = file_path
-        self.new_content = new_content
-        self.source = source
-        self.destination = destination
-        self.branch = branch
-
-    def read(self) -> str:
-        file = self.repo.get_contents(self.file_path, ref=self.branch)
-        print(f"{datetime.now().strftime('[%d/%m/%Y | %H:%M]')} [GitHub] File '{self.file_path}' fetched successfully.")
-        return file.decoded_content.decode()
-
-    def update(self):
-        file = self.repo.get_contents(self.file_path, ref=self.branch)
-        self.repo.update_file(
-            path=self.file_path,
-            message="File updated via PyGithub",
-            content=self.new_content,
-            sha=file.sha,
-            branch=self.branch
-        )
-        print(f"{datetime.now().strftime('[%d/%m/%Y | %H:%M]')} [GitHub] File '{self.file_path}' updated successfully.")
-
-    def create(self):
-        self.repo.create_file(
-            path=self.file_path,
-            message="New file created via PyGithub",
-            content=self.new_content,
-            branch=self.branch
-        )
-        print(f"{datetime.now().strftime('[%d/%m/%Y | %H:%M]')} [GitHub] File '{self.file_path}' created.")
-
-    def delete(self):
-        file = self.repo.get_contents(self.file_path, ref=self.branch)
-        self.repo.delete_file(
-            path=self.file_path,
-            message="File deleted via PyGithub",
-            sha=file.sha,
-            branch=self.branch
-        )
-        print(f"{datetime.now().strftime('[%d/%m/%Y | %H:%M]')} [GitHub] File '{self.file_path}' deleted.")
-
-    def move(self):
-        source = str(PurePosixPath(self.source))
-        destination = str(PurePosixPath(self.destination))
-
-        try:
-            # Try file first
-            content = self.repo.get_contents(source, ref=self.branch)
-            self.repo.create_file(
-                path=destination,
-                message=f"Moved '{source}' to '{destination}'",
-                content=content.decoded_content,
-                branch=self.branch
-            )
-            self.repo.delete_file(
-                path=source,
-                message=f"Deleted '{source}' after moving",
-                sha=content.sha,
-                branch=self.branch
-            )
-            print(f"{datetime.now().strftime('[%d/%m/%Y | %H:%M]')} [GitHub] File '{source}' moved to '{destination}'.")
-        
-        except Exception:
-            # Try as folder
-            try:
-                items = self.repo.get_contents(source, ref=self.branch)
-                if not items:
-                    raise ValueError(f"Folder '{source}' is empty or does not exist.")
-
-                for item in items:
-                    sub_source = item.path
-                    sub_rel = PurePosixPath(sub_source).relative_to(source)
-                    sub_dest = str(PurePosixPath(destination) / sub_rel)
-
-                    if item.type == "dir":
-                        nested = File(self.repo, branch=self.branch, source=sub_source, destination=sub_dest)
-                        nested.move()
-                    else:
-                        self.repo.create_file(
-                            path=sub_dest,
-                            message=f"Moved '{sub_source}' to '{sub_dest}'",
-                            content=item.decoded_content,
-                            branch=self.branch
-                        )
-                        self.repo.delete_file(
-                            path=sub_source,
-                            message=f"Deleted '{sub_source}' after moving",
-                            sha=item.sha,
-                            branch=self.branch
-                        )
-
-                # Attempt to remove empty source folder marker
-                marker_path = f"{source}/.gitkeep"
-                try:
-                    self.repo.create_file(marker_path, "Remove folder marker", "", branch=self.branch)
-                    sha = self.repo.get_contents(marker_path, ref=self.branch).sha
-                    self.repo.delete_file(marker_path, "Deleted folder marker", sha=sha, branch=self.branch)
-                except Exception:
-                    pass
-
-                print(f"{datetime.now().strftime('[%d/%m/%Y | %H:%M]')} [GitHub] Folder '{source}' moved to '{destination}'.")
-
-            except Exception as e:
-                print(f"{datetime.now().strftime('[%d/%m/%Y | %H:%M]')} [GitHub] Error moving '{source}': {e}")
-
-
-
-
-class Folder:
-    def __init__(self, repo, path: str, branch: str = "main", new_path: str = ""):
-        self.repo = repo
-        self.path = str(PurePosixPath(path))
-        self.new_path = str(PurePosixPath(new_path)) if new_path else ""
-        self.branch = branch
-        
-    def __cof__(self, repo, path: str, branch: str = "main", new_path: str = ""):
-        self.repo = repo
-        self.path = str(PurePosixPath(path))
-        self.new_path = str(PurePosixPath(new_path)) if new_path else ""
-        self.branch = branch
-
-    def _timestamp(self):
-        return datetime.now().strftime("[%d/%m/%Y | %H:%M]")
-
-    def create(self):
-        try:
-            marker_path = f"{self.path}/.gitkeep"
-            self.repo.create_file(
-                path=marker_path,
-                message=f"Creating folder '{self.path}'",
-                content="",
-                branch=self.branch
-            )
-            print(f"{self._timestamp()} [GitHub] Folder '{self.path}' created with .gitkeep.")
-        except Exception as e:
-            print(f"{self._timestamp()} [GitHub] Error creating folder '{self.path}': {e}")
-
-    def delete(self):
-        try:
-            items = self.repo.get_contents(self.path, ref=self.branch)
-            for item in items:
-                if item.type == "dir":
-                    sub_folder = Folder(self.repo, path=item.path, branch=self.branch)
-                    sub_folder.delete()
-                else:
-                    self.repo.delete_file(
-                        path=item.path,
-                        message=f"Deleting '{item.path}'",
-                        sha=item.sha,
-                        branch=self.branch
-                    )
-                    print(f"{self._timestamp()} [GitHub] Deleted file '{item.path}'.")
-
-            # Attempt to delete the .gitkeep or residual marker
-            marker_path = f"{self.path}/.gitkeep"
-            try:
-                marker = self.repo.get_contents(marker_path, ref=self.branch)
-                self.repo.delete_file(
-                    path=marker_path,
-                    message="Deleting .gitkeep after folder cleanup",
-                    sha=marker.sha,
-                    branch=self.branch
-                )
-                print(f"{self._timestamp()} [GitHub] Deleted folder marker '{marker_path}'.")
-            except:
-                pass
-
-            print(f"{self._timestamp()} [GitHub] Folder '{self.path}' deleted.")
-        except Exception as e:
-            print(f"{self._timestamp()} [GitHub] Error deleting folder '{self.path}': {e}")
-
-    def move(self):
-        if not self.new_path:
-            raise ValueError("New path not provided for move operation.")
-
-        try:
-            items = self.repo.get_contents(self.path, ref=self.branch)
-            for item in items:
-                rel_path = PurePosixPath(item.path).relative_to(self.path)
-                dest_path = str(PurePosixPath(self.new_path) / rel_path)
-
-                if item.type == "dir":
-                    subfolder = Folder(self.repo, path=item.path, new_path=dest_path, branch=self.branch)
-                    subfolder.move()
-                else:
-                    self.repo.create_file(
-                        path=dest_path,
-                        message=f"Moving '{item.path}' to '{dest_path}'",
-                        content=item.decoded_content,
-                        branch=self.branch
-                    )
-                    self.repo.delete_file(
-                        path=item.path,
-                        message=f"Deleting original '{item.path}' after move",
-                        sha=item.sha,
-                        branch=self.branch
-                    )
-                    print(f"{self._timestamp()} [GitHub] Moved file '{item.path}' → '{dest_path}'.")
-
-            # Clean up original folder marker
-            marker_path = f"{self.path}/.gitkeep"
-            try:
-                self.repo.create_file(marker_path, "Remove folder marker", "", branch=self.branch)
-                sha = self.repo.get_contents(marker_path, ref=self.branch).sha
-                self.repo.delete_file(marker_path, "Deleted folder marker", sha=sha, branch=self.branch)
-            except:
-                pass
-
-            print(f"{self._timestamp()} [GitHub] Folder '{self.path}' moved to '{self.new_path}'.")
-        except Exception as e:
-            print(f"{self._timestamp()} [GitHub] Error moving folder '{self.path}': {e}")
-
-    def rename(self, new_name: str):
-        new_path = str(PurePosixPath(self.path).parent / new_name)
-        self.new_path = new_path
-        self.move()
-
-
-class server:
-    def __init__(self, token, repo):
-        """
-        # Server (__init__)
-        Parameters: token and repository (str, str)
-
-        The purpose of this function is to pass parameters to the 'Server' class. This class was developed
-        to manipulate data on a server, using GitHub as a repository. To use it, access your GitHub account,
-        get the name of the desired repository and the corresponding access token.
-        """
-        try:
-            self.token = token
-            self.repo = repo
-            self.G = GitHubRepoDev(token=self.token, repo_name=self.repo)
-            self.repo = GitHubRepo(token=self.token, repo_name=self.repo).get_repo()
-            time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            serv = f'''
-= Note ================================================
-Server initialized with:
-[TIME]             [{time}]
-[SERVER]                            [\033[34mON\033[0m]
-[GUITHUB]                    [\033[33mCONNECTED\033[0m]
-[REPOSITORY]                 [\033[33mCONNECTED\033[0m]
-[TOKEN]                      [\033[33mCONNECTED\033[0m]
-=======================================================
-            '''
-            print(serv)
-        except Exception as e:
-            print(f"Error initializing Server: {e}")
-            raise
-        
-    def create_class(self, name):
-        """
-        # Server (CreateClass)
-        Parameters: name (str)
-
-        The purpose of this function is to create a class in the repository.
-        """
-        # Verifica se a pasta já existe
-        try:
-            self.repo.get_contents(f'{name}/', ref='main')
-            print(f"Class '{name}' already exists in the repository '{self.repo}'.")
-            return name
-        except Exception:
-            Folder(self.repo, f'{name}/', 'main').create()
-            print(f"Class '{name}' created successfully in the repository '{self.repo}'.")
-            return name
-
-    def create_table(self, name, clas):
-        """
-        # Server (CreateTable)
-        Parameters: name and clas (str, str)
-
-        The purpose of this function is to create a table in the specified class.
-        """
-        # Verifica se o arquivo já existe
-        try:
-            self.repo.get_contents(f'{clas}/{name}.json', ref='main')
-            print(f"Table '{name}' already exists in class '{clas}' of the repository '{self.repo}'.")
-            return name
-        except Exception:
-            File(self.repo, f'{clas}/{name}.json', '{}',branch='main').create()
-            print(f"Table '{name}' created successfully in class '{clas}' of the repository '{self.repo}'.")
-            return name
-
-    def insert_data(self, table, clas, name,  data):
-        """
-        # Server (insert_data_table)
-        Parameters: table, clas, name and data (str, str, str, dict)
-
-        The purpose of this function is to insert data into a specified table.
-        """
-        r = File(self.repo, f'{clas}/{table}.json', '{}',branch='main').read()
-        DATA = ast.literal_eval(r)
-        if name in DATA:
-            print(f"Data with name '{name}' already exists in table '{table}'.")
-            return
-        DATA[name] = data
-        File(self.repo, f'{clas}/{table}.json', f'{str(DATA)}',branch='main').update()
-        print(f"Data inserted successfully into table '{table}' in class '{clas}' of the repository '{self.repo}'.")
-        
-    def remove_data(self, table, clas, name):
-        """
-        # Server (remove_data_table)
-        Parameters: table, clas and name (str, str, str)
-
-        The purpose of this function is to remove data from a specified table.
-        """
-        r = File(self.repo, f'{clas}/{table}.json', '{}',branch='main').read()
-        DATA = ast.literal_eval(r)
-        if name not in DATA:
-            print(f"Data with name '{name}' does not exist in table '{table}'.")
-            return
-        del DATA[name]
-        File(self.repo, f'{clas}/{table}.json', f'{str(DATA)}',branch='main').update()
-        print(f"Data with name '{name}' removed successfully from table '{table}' in class '{clas}' of the repository '{self.repo}'.")
-        
-        
-    def update_data(self, table, clas, name, data):
-        """
-        # Server (update_data)
-        Parameters: table, clas, name, data (str, str, str, dict)
-
-        The purpose of this function is to update data for a specific entry in a given table.
-        """
-        r = File(self.repo, f'{clas}/{table}.json', '{}',branch='main').read()
-        DATA = ast.literal_eval(r)
-        if name not in DATA:
-            print(f"Data with name '{name}' does not exist in table '{table}'.")
-            return
-        DATA[name] = data
-        File(self.repo, f'{clas}/{table}.json', f'{str(DATA)}',branch='main').update()
-        print(f"Data with name '{name}' updated successfully in table '{table}' in class '{clas}' of the repository '{self.repo}'.")
-            
-    def get_data(self, table, clas):
-        """
-        # Server (get_data)
-        Parameters: table, clas (str, str)
-
-        The purpose of this function is to retrieve all data from a specified table in a given class.
-        """
-        r = File(self.repo, f'{clas}/{table}.json', '{}',branch='main').read()
-        DATA = ast.literal_eval(r)
-        print(f"Data from table '{table}' in class '{clas}' of the repository '{self.repo}':")
-        print(DATA)
-        return DATA
-    
-    def search_data(self, table, clas, name):
-        """
-        # Server (search_data)
-        Parameters: table, clas, name (str, str, str)
-
-        The purpose of this function is to search for a specific entry by name in a given table and class.
-        """
-        r = File(self.repo, f'{clas}/{table}.json', '{}',branch='main').read()
-        DATA = ast.literal_eval(r)
-        if name not in DATA:
-            print(f"Data with name '{name}' does not exist in table '{table}'.")
-            return
-        print(f"Data with name '{name}' found in table '{table}' in class '{clas}' of the repository '{self.repo}':")
-        print(DATA[name])
-        return DATA[name]
-
-
-    def remove_table(self, clas, table):
-        """
-        # Server (remove_table)
-        Parameters: clas and table (str, str)
-
-        The purpose of this function is to remove a specified table (JSON file) from a given class (folder) in the repository.
-        """
-        File(self.repo, f'{clas}/{table}.json', '{}',branch='main').delete()
-        print(f"Table '{table}' removed successfully from class '{clas}' in the repository '{self.repo}'.")
-                
-    def remove_class(self, clas):
-        """
-        # Server (remove_class)
-        Parameters: clas (str)
-
-        The purpose of this function is to remove a specified class (folder) and all its contents from the repository.
-        """
-        Folder(self.repo, f'{clas}/', 'main').delete()
-        print(f"Class '{clas}' removed successfully from the repository '{self.repo}'.")
-
-
-        
-            
-# S = server('TOKEN', 'REPO')
-# S.create_class('TESTE')
-# S.create_table('TESTE', 'TESTE')
-# S.insert_data('TESTE', 'TESTE', 'teste1', 'teste')
-# S.insert_data('TESTE', 'TESTE', 'teste2', 'teste')
-# S.get_data('TESTE', 'TESTE')
-# S.search_data('TESTE', 'TESTE', 'teste1')
-# S.update_data('TESTE', 'TESTE', 'teste1', 'TESTE')
-# S.search_data('TESTE', 'TESTE', 'teste1')
-# S.remove_data('TESTE', 'TESTE', 'teste1')
-# S.get_data('TESTE', 'TESTE')
-# S.remove_data('TESTE', 'TESTE', 'teste1')
-# S.get_data('TESTE', 'TESTE')
-# S.remove_table('TESTE', 'TESTE')
-# S.remove_class('TESTE')
+from datetime import datetime
+import ast
+import asyncio
+import atexit
+import base64
+import bisect
+import codecs
+import contextlib
+import copy
+import contextvars
+import functools
+import hashlib
+import heapq
+import hmac
+import ipaddress
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tarfile
+import zlib
+import threading
+import time
+import urllib.parse
+import weakref
+from collections import OrderedDict, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from github import Github, GithubException, InputGitTreeElement
+from github.Repository import Repository
+from pathlib import PurePosixPath
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger("gitserver")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+
+
+class MetadataCache:
+    """
+    Keeps the login of a token and the metadata of its repositories on disk for
+    `ttl` seconds, so a new process can build its repository handle without any
+    request. Files are named after a hash of the token, never the token itself.
+    """
+    def __init__(self, path: str = None, ttl: float = 3600.0):
+        self.path = path or os.environ.get("GITSERVER_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "gitserver")
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+    def _file(self, token):
+        return os.path.join(self.path, hashlib.sha256(str(token).encode()).hexdigest()[:16] + ".json")
+
+    def _load(self, token):
+        try:
+            with open(self._file(token)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, token, key):
+        """
+        Returns the value stored under `key` for `token`, or None when missing or older than `ttl`.
+        """
+        if not self.ttl:
+            return None
+        entry = self._load(token).get(key)
+        if entry is None or time.time() - entry["fetched"] > self.ttl:
+            return None
+        return entry["value"]
+
+    def put(self, token, key, value):
+        if not self.ttl:
+            return
+        with self.lock:
+            data = self._load(token)
+            data[key] = {"value": value, "fetched": time.time()}
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                temporary = f"{self._file(token)}.{os.getpid()}"
+                with open(temporary, "w") as file:
+                    json.dump(data, file)
+                os.replace(temporary, self._file(token))
+            except OSError as e:
+                logger.warning(f"[GitHub] Could not write the metadata cache: {e}")
+
+
+class BlobCache:
+    """
+    Raw git blobs kept on disk by sha ({path}/blobs/ab/abcdef...), shared by every process using the
+    same directory (`GITSERVER_CACHE_DIR`, like MetadataCache). A blob never changes, so a cached one
+    is served without any request or revalidation; a download is only stored once it is complete
+    and matches its sha. Past `max_bytes` the least recently used blobs (by modification time,
+    touched on every hit) are evicted, down to 80% of the cap. max_bytes=0 turns the cache off.
+    """
+    def __init__(self, path: str = None, max_bytes: int = 256 * 1024 * 1024):
+        root = path or os.environ.get("GITSERVER_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "gitserver")
+        self.path = os.path.join(root, "blobs")
+        self.max_bytes = max_bytes
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def _file(self, sha):
+        return os.path.join(self.path, sha[:2], sha)
+
+    def read(self, sha: str, fetch, chunk_size: int = 64 * 1024):
+        """
+        Yields the bytes of blob `sha`: from disk when cached, otherwise from `fetch()` (an iterable
+        of chunks), stored as they pass through.
+        """
+        if not self.max_bytes:
+            yield from fetch()
+            return
+        path = self._file(sha)
+        try:
+            file = open(path, "rb")
+        except OSError:
+            file = None
+        if file is not None:
+            with file:
+                with contextlib.suppress(OSError):
+                    os.utime(path)
+                with self.lock:
+                    self.hits += 1
+                for chunk in iter(lambda: file.read(chunk_size), b""):
+                    yield chunk
+            return
+        with self.lock:
+            self.misses += 1
+        yield from self._store(sha, path, fetch())
+
+    def _store(self, sha, path, chunks):
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file = open(temporary, "wb")
+        except OSError as e:
+            logger.warning(f"[BlobCache] Could not write to '{self.path}': {e}")
+            yield from chunks
+            return
+        size, complete = 0, False
+        try:
+            with file:
+                for chunk in chunks:
+                    file.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+            complete = True
+        finally:
+            if complete and self._sha(temporary, size) == sha:
+                os.replace(temporary, path)
+                self._grow(size)
+            else:
+                with contextlib.suppress(OSError):
+                    os.remove(temporary)
+
+    @staticmethod
+    def _sha(path, size):
+        digest = hashlib.sha1(b"blob %d\0" % size)
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _files(self):
+        files = []
+        for folder, _, names in os.walk(self.path):
+            for name in names:
+                with contextlib.suppress(OSError):
+                    stat = os.stat(os.path.join(folder, name))
+                    files.append((stat.st_mtime, stat.st_size, os.path.join(folder, name)))
+        return files
+
+    def _grow(self, size):
+        with self.lock:
+            if self.size is None:
+                self.size = sum(size for _, size, _ in self._files())
+            else:
+                self.size += size
+            if self.size <= self.max_bytes:
+                return
+            # Other processes share the directory: evict from what is really there
+            files = sorted(self._files())
+            self.size = sum(size for _, size, _ in files)
+            for _, size, path in files:
+                if self.size <= self.max_bytes * 0.8:
+                    break
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+                    self.size -= size
+                    self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {"bytes": self.size, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class LazyRepo:
+    """
+    Stands in for a Repository until it is first used, so nothing is requested before then.
+    """
+    def __init__(self, connection, name: str):
+        self._connection = connection
+        self._name = name
+        self._repo = None
+
+    def _resolve(self):
+        if self._repo is None:
+            self._repo = self._connection.repo(self._name)
+        return self._repo
+
+    def __getattr__(self, attribute):
+        return getattr(self._resolve(), attribute)
+
+    def __repr__(self):
+        return repr(self._repo) if self._repo is not None else f'Repository(name="{self._name}")'
+
+
+class GitHubConnection:
+    """
+    One Github client per token (and scheduler, and metadata cache settings),
+    shared by GitHubRepo, GitHubRepoDev and every server of the process. Nothing
+    is requested when it is built: the login and the repository handles are
+    resolved on first use, from the MetadataCache when it is fresh, so a warm
+    start makes no request and a cold one makes two (`GET /user` and
+    `GET /repos/{owner}/{repo}`). A connection lives as long as something uses it.
+    """
+    connections = weakref.WeakValueDictionary()
+    lock = threading.Lock()
+
+    def __init__(self, token: str, scheduler=None, metadata=None, base_url: str = None):
+        self.token = token
+        self.base_url = base_url
+        self.scheduler = scheduler or Scheduler()
+        self.metadata = metadata or MetadataCache()
+        self._client = None
+        self._login = None
+        self.repos = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, token: str, scheduler=None, metadata=None, base_url: str = None):
+        """
+        Returns the connection of `token` (and `scheduler`, when one is given) to the API at `base_url`
+        (default: api.github.com), creating it once. Servers whose `metadata` caches differ in path or ttl
+        get connections of their own.
+        """
+        metadata = metadata or MetadataCache()
+        with cls.lock:
+            key = (token, id(scheduler) if scheduler else None, base_url, metadata.path, metadata.ttl)
+            connection = cls.connections.get(key)
+            if connection is None:
+                connection = cls.connections[key] = cls(token, scheduler, metadata, base_url)
+            return connection
+
+    @property
+    def client(self):
+        with self.lock:
+            if self._client is None:
+                self._client = self.scheduler.client(self.token, **({"base_url": self.base_url} if self.base_url else {}))
+            return self._client
+
+    @property
+    def user(self):
+        # AuthenticatedUser is built without a request, its attributes are fetched when first read
+        return self.client.get_user()
+
+    @property
+    def login(self):
+        if self._login is None:
+            self._login = self.metadata.get(self.token, "login")
+            if self._login is None:
+                self._login = self.user.login
+                self.metadata.put(self.token, "login", self._login)
+        return self._login
+
+    def repo(self, name: str, connect: bool = True):
+        """
+        Returns the Repository `name` ('repo' of the token's user, or 'owner/repo'). Its attributes come
+        from the metadata cache when fresh; otherwise they are fetched now, or on first use with `connect=False`.
+        """
+        if name in self.repos:
+            return self.repos[name]
+        full_name = name if "/" in name else None
+        data = self.metadata.get(self.token, f"repo:{name}")
+        if data is None and not connect:
+            return LazyRepo(self, name)
+        if data is None:
+            full_name = full_name or f"{self.login}/{name}"
+            data = self.client.get_repo(full_name).raw_data
+            self.metadata.put(self.token, f"repo:{name}", data)
+        repo = Repository(self.client.requester, attributes=dict(data, url=f"{self.client.requester.base_url}/repos/{data['full_name']}"), completed=False)
+        self.repos[name] = repo
+        return repo
+
+
+class GitHubRepo:
+    def __init__(self, token: str, repo_name: str, scheduler=None, connect: bool = True, base_url: str = None, metadata=None):
+        self.token = token
+        self.repo_name = repo_name
+        self.connection = GitHubConnection.shared(token, scheduler, metadata, base_url)
+        self.client = self.connection.client
+
+        try:
+            self.repo = self.connection.repo(self.repo_name, connect)
+            if connect:
+                logger.info(f"[GitHub] Successfully connected to repository '{self.repo_name}'.")
+        except Exception as e:
+            logger.warning(f"[GitHub] Failed to connect to repository '{self.repo_name}': {e}")
+            self.repo = None
+
+    def get_repo(self):
+        return self.repo
+
+
+
+class GitHubRepoDev:
+    def __init__(self, token: str, repo_name: str = None, scheduler=None, connect: bool = True, base_url: str = None, metadata=None):
+        self.token = token
+        self.connection = GitHubConnection.shared(token, scheduler, metadata, base_url)
+        self.client = self.connection.client
+        self.repo_name = repo_name
+        self.user = self.connection.user
+
+        self.repo = None
+        if repo_name:
+            try:
+                self.repo = self.connection.repo(repo_name, connect)
+                if connect:
+                    logger.info(f"Connected to repo: {repo_name}")
+            except Exception as e:
+                logger.warning(f"Error accessing repo: {e}")
+
+    # === Repository ===
+    def create_repo(self, name, private=True, description=""):
+        repo = self.user.create_repo(name=name, private=private, description=description)
+        logger.info(f"Repository '{name}' created.")
+        return repo
+
+    def delete_repo(self):
+        if self.repo:
+            self.repo.delete()
+            logger.info(f"Repository '{self.repo_name}' deleted.")
+
+    def rename_repo(self, new_name):
+        if self.repo:
+            self.repo.edit(name=new_name)
+            logger.info(f"Repository renamed to '{new_name}'")
+
+    def get_repo_info(self):
+        if self.repo:
+            return {
+                "name": self.repo.name,
+                "full_name": self.repo.full_name,
+                "description": self.repo.description,
+                "private": self.repo.private,
+                "url": self.repo.html_url,
+                "created_at": str(self.repo.created_at)
+            }
+
+
+    # === Hooks ===
+    def list_hooks(self):
+        return self.repo.get_hooks()
+
+    def create_hook(self, config, events=["push"], active=True):
+        """
+        Creates a repository webhook.
+        
+        Args:
+            config (dict): Configuration of the hook, e.g., {"url": "...", "content_type": "json"}
+            events (list): Events that trigger the webhook (default is ["push"])
+            active (bool): Whether the webhook is active (default is True)
+        """
+        try:
+            self.repo.create_hook(
+                name="web",  # fixed value, GitHub expects "web"
+                config=config,
+                events=events,
+                active=active
+            )
+            logger.info("✅ Webhook created successfully.")
+        except Exception as e:
+            logger.warning(f"❌ Failed to create webhook: {e}")
+
+    def delete_hook(self, hook_id):
+        hook = self.repo.get_hook(hook_id)
+        hook.delete()
+        logger.info(f"Hook '{hook_id}' deleted.")
+
+
+
+
+TreeItem = namedtuple("TreeItem", "path mode type sha size")
+
+# What `changes_since` yields: `rows` maps each changed row name to 'added', 'updated' or 'removed' (None
+# when rows were not asked for); `commit` is the commit the change was read at.
+TableChange = namedtuple("TableChange", "clas table rows commit")
+
+# The compare API lists at most this many files; past it the two trees are compared instead.
+COMPARE_FILES_LIMIT = 300
+
+
+class TreeWalker:
+    """
+    Lists every file and folder of a tree with a single `git/trees/{sha}?recursive=1`
+    call. Trees are immutable, so listings are cached by tree sha and shared by every
+    caller. When GitHub truncates a recursive listing, the walker lists that tree's
+    entries and walks each subtree on its own instead.
+    """
+    listings = OrderedDict()
+    max_listings = 16
+    lock = threading.Lock()
+
+    def __init__(self, repo):
+        self.repo = repo
+
+    @classmethod
+    def cached(cls, sha):
+        with cls.lock:
+            items = cls.listings.get(sha)
+            if items is not None:
+                cls.listings.move_to_end(sha)
+            return items
+
+    @classmethod
+    def store(cls, sha, items):
+        with cls.lock:
+            cls.listings[sha] = items
+            while len(cls.listings) > cls.max_listings:
+                cls.listings.popitem(last=False)
+
+    def walk(self, sha):
+        """
+        Returns every TreeItem below tree `sha`, with paths relative to it.
+        """
+        items = self.cached(sha)
+        if items is None:
+            items = self._list(sha, "")
+            self.store(sha, items)
+        return items
+
+    def _list(self, sha, prefix):
+        tree = self.repo.get_git_tree(sha, recursive=True)
+        if not tree.truncated:
+            return [TreeItem(prefix + item.path, item.mode, item.type, item.sha, item.size) for item in tree.tree]
+        tree = self.repo.get_git_tree(sha)
+        if tree.truncated:
+            raise ValueError(f"Tree '{prefix or sha}' has too many entries to be listed.")
+        items = []
+        for item in tree.tree:
+            items.append(TreeItem(prefix + item.path, item.mode, item.type, item.sha, item.size))
+            if item.type == "tree":
+                items.extend(self._list(item.sha, f"{prefix}{item.path}/"))
+        return items
+
+    @staticmethod
+    def select(items, path):
+        """
+        Returns the files at `path` (or any of a list of paths) or below it.
+        """
+        paths = [str(PurePosixPath(p)) for p in ([path] if isinstance(path, str) else path) if p]
+        return [
+            item for item in items
+            if item.type != "tree" and (not paths or any(item.path == p or item.path.startswith(p + "/") for p in paths))
+        ]
+
+    @staticmethod
+    def children(items, path=""):
+        """
+        Returns the direct children of folder `path` as (name, type) pairs.
+        """
+        prefix = f"{str(PurePosixPath(path))}/" if path else ""
+        return [
+            (item.path[len(prefix):], item.type) for item in items
+            if item.path.startswith(prefix) and "/" not in item.path[len(prefix):]
+        ]
+
+
+
+
+class Tree:
+    """
+    Builds whole-branch changes with the Git Data API: the new tree is made from
+    existing blob shas (nothing is re-uploaded) and lands as one commit, moved
+    forward with a fast-forward-only ref update.
+    """
+    REBASES = 5
+
+    def __init__(self, repo, branch: str = "main"):
+        self.repo = repo
+        self.branch = branch
+
+    def head(self):
+        ref = self.repo.get_git_ref(f"heads/{self.branch}")
+        return ref, self.repo.get_git_commit(ref.object.sha)
+
+    def blobs(self, commit, path: str = ""):
+        """
+        Returns the files (TreeItem) at `path` (or any of a list of paths) or below it in `commit`.
+        """
+        return TreeWalker.select(TreeWalker(self.repo).walk(commit.tree.sha), path)
+
+    def commit(self, elements, message: str, head=None, expect=None):
+        """
+        Applies `elements` (InputGitTreeElement list) on top of the branch head in a single commit.
+        `expect` maps paths to the blob sha they must still have (None: must not exist); if any
+        differs a 409 GithubException is raised, like a Contents API write with a stale sha. When
+        only the branch moved (another file was committed meanwhile), the commit is rebased on the
+        new head up to REBASES times instead; without `expect`, the paths of `elements` must still
+        be as they were in the first parent for that.
+        """
+        ref, parent = head or self.head()
+        base = parent
+        for attempt in range(self.REBASES + 1):
+            if expect:
+                # Compared against the parent's tree listing (cached per tree sha), which has no size cap
+                current = {item.path: item.sha for item in self.blobs(parent, list(expect))}
+                for path, sha in expect.items():
+                    if current.get(path) != sha:
+                        raise GithubException(409, {"message": f"'{path}' changed since it was read"}, None)
+
+            tree = self.repo.create_git_tree(elements, base_tree=parent.tree)
+            commit = self.repo.create_git_commit(message, tree, [parent])
+            try:
+                ref.edit(commit.sha)
+                return commit.sha
+            except GithubException as e:
+                if e.status != 422:
+                    raise
+                if attempt == self.REBASES:
+                    raise GithubException(409, {"message": f"'{self.branch}' moved while committing"}, None)
+            if not expect:
+                paths = [element._identity["path"] for element in elements]
+                shas = {item.path: item.sha for item in self.blobs(base, paths)}
+                expect = {path: shas.get(path) for path in paths}
+            ref, parent = self.head()
+
+    @staticmethod
+    def blob_sha(data: bytes):
+        """
+        Returns the git blob sha `data` will be stored under.
+        """
+        return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+    def element(self, path: str, data: bytes, inline: bool = True):
+        """
+        Returns a tree element writing `data` at `path`: inline for small text, through a blob for large
+        (sent as UTF-8, without base64) or binary data, and for every file with inline=False, so that
+        a tree of many files does not carry their content.
+        """
+        try:
+            text = data.decode()
+        except UnicodeDecodeError:
+            blob = self.repo.create_git_blob(base64.b64encode(data).decode(), "base64")
+            return InputGitTreeElement(path, "100644", "blob", sha=blob.sha)
+        if inline and len(data) <= CONTENTS_LIMIT:
+            return InputGitTreeElement(path, "100644", "blob", content=text)
+        blob = self.repo.create_git_blob(text, "utf-8")
+        return InputGitTreeElement(path, "100644", "blob", sha=blob.sha)
+
+    def read_blob(self, sha: str, chunk_size: int = 64 * 1024):
+        """
+        Yields the raw bytes of blob `sha` as they arrive, with the raw media type: no JSON
+        envelope and no base64, so any blob up to GitHub's 100 MB file limit can be read.
+        """
+        if hasattr(self.repo, "read_blob"):
+            # a Mirror reads the blob from its local object store
+            yield from self.repo.read_blob(sha, chunk_size)
+            return
+        status, headers, output = self.repo.requester._Requester__requestEncode(
+            None, "GET", f"{self.repo.url}/git/blobs/{sha}", None,
+            {"Accept": "application/vnd.github.raw"}, None, lambda _: ("", ""), stream=True,
+        )
+        if status >= 400:
+            raise GithubException(status, {"message": output.read()}, headers)
+        for chunk in output.iter_content(chunk_size):
+            Metrics.record("bytes_down", len(chunk))
+            yield chunk
+
+    def read_archive(self, ref: str, chunk_size: int = 64 * 1024):
+        """
+        Yields the gzipped tarball of commit `ref` as it arrives: one `tarball` request, followed to
+        the archive host it redirects to.
+        """
+        if hasattr(self.repo, "read_archive"):
+            # a Mirror builds the archive from its local object store
+            yield from self.repo.read_archive(ref, chunk_size)
+            return
+        status, headers, output = self.repo.requester._Requester__requestEncode(
+            None, "GET", f"{self.repo.url}/tarball/{ref}", None, {}, None, lambda _: ("", ""),
+            stream=True, follow_302_redirect=True,
+        )
+        if status >= 400:
+            raise GithubException(status, {"message": output.read()}, headers)
+        for chunk in output.iter_content(chunk_size):
+            Metrics.record("bytes_down", len(chunk))
+            yield chunk
+
+    def move(self, source: str, destination: str, message: str = ""):
+        """
+        Moves a file or folder in one commit. Returns the moved file paths (empty if nothing was found).
+        """
+        source = str(PurePosixPath(source))
+        destination = str(PurePosixPath(destination))
+        head = self.head()
+        items = self.blobs(head[1], source)
+        if not items:
+            return []
+
+        elements = []
+        for item in items:
+            target = destination if item.path == source else str(PurePosixPath(destination) / PurePosixPath(item.path).relative_to(source))
+            elements.append(InputGitTreeElement(target, item.mode, item.type, sha=item.sha))
+            elements.append(InputGitTreeElement(item.path, item.mode, item.type, sha=None))
+        self.commit(elements, message or f"Moved '{source}' to '{destination}'", head)
+        return [item.path for item in items]
+
+    def delete(self, path, message: str = ""):
+        """
+        Deletes a file or folder (or a list of them) in one commit. Returns the deleted file paths
+        (empty if nothing was found).
+        """
+        paths = [path] if isinstance(path, str) else list(path)
+        head = self.head()
+        items = self.blobs(head[1], paths)
+        if not items:
+            return []
+
+        elements = [InputGitTreeElement(item.path, item.mode, item.type, sha=None) for item in items]
+        self.commit(elements, message or f"Deleted '{', '.join(paths)}'", head)
+        return [item.path for item in items]
+
+
+
+
+class File:
+    def __init__(self, repo, file_path: str = "", new_content: str = "", source: str = "", destination: str = "", branch: str = "main", sha: str = None):
+        self.repo = repo                   
+        self.file_path = file_path
+        self.new_content = new_content
+        self.source = source
+        self.destination = destination
+        self.branch = branch
+        self.sha = sha
+        
+    def __cof__(self, repo, file_path: str = "", new_content: str = "", source: str = "", destination: str = "", branch: str = "main", sha: str = None):
+        self.repo = repo                   
+        self.file_path = file_path
+        self.new_content = new_content
+        self.source = source
+        self.destination = destination
+        self.branch = branch
+        self.sha = sha
+
+    def read(self) -> str:
+        file = self.repo.get_contents(self.file_path, ref=self.branch)
+        logger.info(f"[GitHub] File '{self.file_path}' fetched successfully.")
+        if getattr(file, "encoding", None) == "none":
+            # Past the Contents API size limit the content is not inlined, read the blob instead
+            return b"".join(Tree(self.repo, self.branch).read_blob(file.sha)).decode()
+        return file.decoded_content.decode()
+
+    def update(self):
+        # With the sha that was read, the write only succeeds if nobody changed the file since (409 otherwise)
+        sha = self.sha or self.repo.get_contents(self.file_path, ref=self.branch).sha
+        result = self.repo.update_file(
+            path=self.file_path,
+            message="File updated via PyGithub",
+            content=self.new_content,
+            sha=sha,
+            branch=self.branch
+        )
+        self.sha = result["content"].sha
+        logger.info(f"[GitHub] File '{self.file_path}' updated successfully.")
+
+    def create(self):
+        self.repo.create_file(
+            path=self.file_path,
+            message="New file created via PyGithub",
+            content=self.new_content,
+            branch=self.branch
+        )
+        logger.info(f"[GitHub] File '{self.file_path}' created.")
+
+    def delete(self):
+        file = self.repo.get_contents(self.file_path, ref=self.branch)
+        self.repo.delete_file(
+            path=self.file_path,
+            message="File deleted via PyGithub",
+            sha=file.sha,
+            branch=self.branch
+        )
+        logger.info(f"[GitHub] File '{self.file_path}' deleted.")
+
+    def move(self):
+        source = str(PurePosixPath(self.source))
+        destination = str(PurePosixPath(self.destination))
+
+        moved = Tree(self.repo, self.branch).move(source, destination)
+        if not moved:
+            logger.warning(f"[GitHub] Nothing to move: '{source}' is empty or does not exist.")
+            return
+        kind = "File" if moved == [source] else "Folder"
+        logger.info(f"[GitHub] {kind} '{source}' moved to '{destination}'.")
+
+
+
+
+class Folder:
+    def __init__(self, repo, path: str, branch: str = "main", new_path: str = ""):
+        self.repo = repo
+        self.path = str(PurePosixPath(path))
+        self.new_path = str(PurePosixPath(new_path)) if new_path else ""
+        self.branch = branch
+        
+    def __cof__(self, repo, path: str, branch: str = "main", new_path: str = ""):
+        self.repo = repo
+        self.path = str(PurePosixPath(path))
+        self.new_path = str(PurePosixPath(new_path)) if new_path else ""
+        self.branch = branch
+
+    def create(self):
+        try:
+            marker_path = f"{self.path}/.gitkeep"
+            self.repo.create_file(
+                path=marker_path,
+                message=f"Creating folder '{self.path}'",
+                content="",
+                branch=self.branch
+            )
+            logger.info(f"[GitHub] Folder '{self.path}' created with .gitkeep.")
+        except Exception as e:
+            logger.warning(f"[GitHub] Error creating folder '{self.path}': {e}")
+
+    def delete(self):
+        deleted = Tree(self.repo, self.branch).delete(self.path, message=f"Deleting folder '{self.path}'")
+        if not deleted:
+            logger.warning(f"[GitHub] Nothing to delete: folder '{self.path}' is empty or does not exist.")
+            return
+        logger.info(f"[GitHub] Folder '{self.path}' deleted ({len(deleted)} files).")
+
+    def move(self):
+        if not self.new_path:
+            raise ValueError("New path not provided for move operation.")
+
+        moved = Tree(self.repo, self.branch).move(self.path, self.new_path, message=f"Moving folder '{self.path}' to '{self.new_path}'")
+        if not moved:
+            logger.warning(f"[GitHub] Nothing to move: folder '{self.path}' is empty or does not exist.")
+            return
+        logger.info(f"[GitHub] Folder '{self.path}' moved to '{self.new_path}' ({len(moved)} files).")
+
+    def rename(self, new_name: str):
+        new_path = str(PurePosixPath(self.path).parent / new_name)
+        self.new_path = new_path
+        self.move()
+
+
+class Codec:
+    """
+    Encodes tables to bytes and back.
+
+    `format` is "json" (strict JSON, through orjson when it is installed) or
+    "msgpack"; `compression` is None, "zlib" or "zstd". Plain JSON is written
+    as-is so tables stay valid .json files; every other codec is prefixed with
+    a short header naming it, so each table records its own codec. Old
+    str(dict) tables are recognised as "legacy" and decoded with literal_eval.
+    """
+    HEADER = b"\x00gitserver:"
+    FORMATS = ("json", "msgpack")
+    COMPRESSIONS = (None, "zlib", "zstd")
+
+    def __init__(self, format: str = "json", compression: str = None):
+        if format not in self.FORMATS:
+            raise ValueError(f"Unknown table format '{format}'.")
+        if compression not in self.COMPRESSIONS:
+            raise ValueError(f"Unknown table compression '{compression}'.")
+        if format == "msgpack" and msgpack is None:
+            raise ImportError("The 'msgpack' codec requires the msgpack package.")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("The 'zstd' compression requires the zstandard package.")
+        self.format = format
+        self.compression = compression
+
+    @property
+    def name(self):
+        return f"{self.format}+{self.compression}" if self.compression else self.format
+
+    @classmethod
+    def parse(cls, name):
+        """
+        Builds a codec from a name such as "json", "msgpack+zstd" or "json+zlib".
+        """
+        if isinstance(name, Codec):
+            return name
+        format, _, compression = name.partition("+")
+        return cls(format, compression or None)
+
+    def __eq__(self, other):
+        return isinstance(other, Codec) and other.name == self.name
+
+    def __repr__(self):
+        return f"Codec('{self.name}')"
+
+    def encode(self, DATA) -> bytes:
+        if self.format == "msgpack":
+            raw = msgpack.packb(DATA, use_bin_type=True)
+        elif orjson is not None:
+            raw = orjson.dumps(DATA, option=orjson.OPT_NON_STR_KEYS)
+        else:
+            raw = json.dumps(DATA, separators=(",", ":"), ensure_ascii=False).encode()
+
+        if self.compression == "zlib":
+            raw = zlib.compress(raw)
+        elif self.compression == "zstd":
+            raw = zstandard.ZstdCompressor().compress(raw)
+
+        if self.name == "json":
+            return raw
+        return self.HEADER + self.name.encode() + b"\n" + raw
+
+    def decode(self, raw: bytes):
+        if raw.startswith(self.HEADER):
+            raw = raw[raw.index(b"\n") + 1:]
+        if self.compression == "zlib":
+            raw = zlib.decompress(raw)
+        elif self.compression == "zstd":
+            raw = zstandard.ZstdDecompressor().decompress(raw)
+
+        if self.format == "msgpack":
+            return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+        if orjson is not None:
+            return orjson.loads(raw)
+        return json.loads(raw)
+
+    @classmethod
+    def load(cls, raw: bytes):
+        """
+        Decodes a stored table whatever its codec. Returns (DATA, codec name), where the
+        name is "legacy" for str(dict) tables that should be re-encoded on their next write.
+        """
+        if raw.startswith(cls.HEADER):
+            codec = cls.parse(raw[len(cls.HEADER):raw.index(b"\n")].decode())
+            return codec.decode(raw), codec.name
+        try:
+            return JSON.decode(raw), "json"
+        except ValueError:
+            return ast.literal_eval(raw.decode()), "legacy"
+
+
+class LegacyCodec:
+    """
+    The str(dict) format tables were stored in before Codec. A legacy table is only migrated when
+    its rows survive the new codec as they are; int keys, tuples or sets would not survive JSON, so
+    such a table keeps being written this way.
+    """
+    name = "legacy"
+
+    def __repr__(self):
+        return "LegacyCodec()"
+
+    def encode(self, DATA) -> bytes:
+        return str(DATA).encode()
+
+    def decode(self, raw: bytes):
+        return ast.literal_eval(raw.decode())
+
+
+JSON = Codec()
+LEGACY = LegacyCodec()
+
+# GitHub only inlines files up to this size in Contents API responses; bigger tables go through the blob API
+CONTENTS_LIMIT = 1024 * 1024
+
+
+class TableDecoder:
+    """
+    Decodes a stored table fed in chunks, for tables too big to hold twice.
+
+    The codec header is read from the first bytes, compressed tables are
+    inflated chunk by chunk and plain JSON tables are parsed row by row as the
+    text arrives, so only the rows parsed so far and the unparsed tail are kept
+    in memory. msgpack and legacy str(dict) tables are buffered once and decoded
+    on `close()`, which returns (DATA, codec name) like `Codec.load`. A table
+    without a header that stops being JSON part way (a legacy table whose first
+    key has an apostrophe, which repr writes between double quotes) keeps the
+    rows parsed so far and decodes the rest as a legacy table.
+    """
+    WHITESPACE = re.compile(r"[ \t\n\r]*")
+    ROW = re.compile(r'[ \t\n\r]*,[ \t\n\r]*"')
+    COLON = re.compile(r"[ \t\n\r]*:[ \t\n\r]*")
+    # What may follow the digits parsed so far of a number: more of it, or the 'j' of a legacy complex
+    NUMBER_TAIL = ".eE+-jJ"
+
+    def __init__(self):
+        self.head = b""
+        self.codec = None
+        self.inflate = None
+        self.buffer = None
+        self.text = ""
+        self.pos = 0
+        self.state = "start"
+        self.key = None
+        self.DATA = {}
+        self.guessed = False
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.decoder = json.JSONDecoder()
+
+    def feed(self, chunk: bytes):
+        if self.codec is None:
+            self.head += chunk
+            if not self._sniff(False):
+                return
+            chunk, self.head = self.head, b""
+        if self.inflate is not None:
+            chunk = self.inflate.decompress(chunk)
+        self._take(chunk, False)
+
+    def close(self):
+        if self.codec is None:
+            self._sniff(True)
+            chunk, self.head = self.head, b""
+            if self.inflate is not None:
+                chunk = self.inflate.decompress(chunk)
+            self._take(chunk, False)
+        if self.inflate is not None:
+            self._take(self.inflate.flush() if hasattr(self.inflate, "flush") else b"", False)
+        self._take(b"", True)
+        if self.codec == "legacy":
+            self.DATA.update(ast.literal_eval(bytes(self.buffer).decode()))
+            return self.DATA, "legacy"
+        if self.codec.format == "msgpack":
+            return msgpack.unpackb(bytes(self.buffer), raw=False, strict_map_key=False), self.codec.name
+        if self.state != "done":
+            raise ValueError("Table ended before its JSON object was complete.")
+        return self.DATA, self.codec.name
+
+    def drain(self):
+        """
+        Returns the rows parsed so far and forgets them, for readers that go through a table row by
+        row without keeping it (see `server.query`). `close()` then returns only the rest.
+        """
+        DATA, self.DATA = self.DATA, {}
+        return DATA.items()
+
+    def _sniff(self, final):
+        """
+        Picks the codec once enough of the table has arrived. Returns whether it did.
+        """
+        if self.head.startswith(Codec.HEADER) or (not final and Codec.HEADER.startswith(self.head)):
+            if b"\n" not in self.head:
+                if final:
+                    raise ValueError("Truncated table header.")
+                return False
+            self.codec = Codec.parse(self.head[len(Codec.HEADER):self.head.index(b"\n")].decode())
+            self.head = self.head[self.head.index(b"\n") + 1:]
+        else:
+            first = self.head.lstrip()[1:].lstrip()[:1]
+            if not first and not final:
+                return False
+            self.codec = JSON if first in (b'"', b"}") else "legacy"
+            self.guessed = True
+        if self.codec != "legacy" and self.codec.compression == "zlib":
+            self.inflate = zlib.decompressobj()
+        elif self.codec != "legacy" and self.codec.compression == "zstd":
+            self.inflate = zstandard.ZstdDecompressor().decompressobj()
+        if self.codec == "legacy" or self.codec.format == "msgpack":
+            self.buffer = bytearray()
+        return True
+
+    def _take(self, data, final):
+        if self.buffer is not None:
+            self.buffer += data
+            return
+        self.text = self.text[self.pos:] + self.utf8.decode(data, final)
+        self.pos = 0
+        self._parse(final)
+
+    def _parse(self, final):
+        try:
+            self._rows(final)
+        except ValueError:
+            # Only a table without a header can be a legacy one read as JSON
+            if not self.guessed or self.state not in ("key", "colon", "value"):
+                raise
+            self._fallback()
+
+    def _fallback(self):
+        """
+        Switches a table sniffed as JSON to the legacy parser, keeping the rows
+        parsed so far. The row being parsed and the rest of the text (plus any
+        bytes the utf-8 decoder still holds) are buffered for `close()`.
+        """
+        head = "{" if self.state == "key" else "{" + repr(self.key) + (":" if self.state == "value" else "")
+        rest = (head + self.text[self.pos:]).encode() + self.utf8.getstate()[0]
+        self.codec, self.buffer, self.text, self.pos = "legacy", bytearray(rest), "", 0
+
+    def _rows(self, final):
+        text, pos, state, key, DATA = self.text, self.pos, self.state, self.key, self.DATA
+        size = len(text)
+        skip = self.WHITESPACE.match
+        scan = self.decoder.scan_once
+        scanstring = json.decoder.scanstring
+        try:
+            while state != "done":
+                if state == "next":
+                    # Fast path for the common case, a whole `, "key": value` row at once
+                    row = self.ROW.match(text, pos)
+                    if row is not None:
+                        try:
+                            name, end = scanstring(text, row.end())
+                            colon = self.COLON.match(text, end)
+                            value, end = scan(text, colon.end())
+                        except (AttributeError, StopIteration, json.JSONDecodeError):
+                            pass
+                        else:
+                            if end < size and text[end] not in self.NUMBER_TAIL:
+                                DATA[name] = value
+                                pos = end
+                                continue
+                pos = skip(text, pos).end()
+                if pos == size:
+                    break
+                char = text[pos]
+                if state == "value":
+                    try:
+                        value, end = scan(text, pos)
+                    except (StopIteration, json.JSONDecodeError):
+                        if final:
+                            raise ValueError(f"Invalid table value at offset {pos}.")
+                        break
+                    if end < size and text[end] in "jJ":
+                        raise ValueError(f"Invalid table value at offset {pos}.")
+                    # A number at the end of the text may still be missing digits
+                    if not final and (end == size or text[end] in self.NUMBER_TAIL):
+                        break
+                    DATA[key] = value
+                    pos, state = end, "next"
+                elif state == "key" and char == '"':
+                    try:
+                        key, pos = scanstring(text, pos + 1)
+                    except json.JSONDecodeError:
+                        if final:
+                            raise
+                        break
+                    state = "colon"
+                else:
+                    expected = {"start": "{", "colon": ":", "next": ",}", "key": "}"}[state]
+                    if char not in expected:
+                        raise ValueError(f"Unexpected {char!r} at table offset {pos}.")
+                    pos += 1
+                    state = {"{": "key", ":": "value", ",": "key", "}": "done"}[char]
+        finally:
+            self.pos, self.state, self.key = pos, state, key
+
+
+class Index:
+    """
+    Secondary index of one row field, stored as [value, [names]] entries sorted
+    by value so equality and range lookups are binary searches. Only scalar
+    values (str, int, float, bool, None) of dict rows are indexed.
+    """
+    SCALARS = (str, int, float, bool, type(None))
+
+    def __init__(self, field, entries=None):
+        self.field = field
+        self.entries = entries if entries is not None else []
+
+    @staticmethod
+    def key(value):
+        if value is None:
+            return (0, 0)
+        if isinstance(value, (int, float)):
+            return (1, value)
+        return (2, value)
+
+    @classmethod
+    def value_of(cls, field, row):
+        """
+        Returns (True, value) when `row` has an indexable `field`, else (False, None).
+        """
+        if isinstance(row, dict) and field in row and isinstance(row[field], cls.SCALARS):
+            return True, row[field]
+        return False, None
+
+    @classmethod
+    def build(cls, field, rows):
+        groups = {}
+        for name, row in rows:
+            has, value = cls.value_of(field, row)
+            if has:
+                groups.setdefault(cls.key(value), [value, []])[1].append(name)
+        return cls(field, [groups[key] for key in sorted(groups)])
+
+    @classmethod
+    def from_data(cls, data):
+        return cls(data["field"], data["entries"])
+
+    def to_data(self):
+        return {"field": self.field, "entries": self.entries}
+
+    def copy(self):
+        return Index(self.field, [[value, list(names)] for value, names in self.entries])
+
+    def _position(self, value):
+        key = self.key(value)
+        i = bisect.bisect_left(self.entries, key, key=lambda entry: self.key(entry[0]))
+        return i, i < len(self.entries) and self.key(self.entries[i][0]) == key
+
+    def add(self, value, name):
+        i, found = self._position(value)
+        if not found:
+            self.entries.insert(i, [value, [name]])
+        elif name not in self.entries[i][1]:
+            self.entries[i][1].append(name)
+
+    def remove(self, value, name):
+        i, found = self._position(value)
+        if found and name in self.entries[i][1]:
+            self.entries[i][1].remove(name)
+            if not self.entries[i][1]:
+                del self.entries[i]
+
+    def find(self, value):
+        i, found = self._position(value)
+        return list(self.entries[i][1]) if found else []
+
+    def range(self, low=None, high=None):
+        """
+        Returns the names whose value is between `low` and `high` (inclusive; None means unbounded).
+        """
+        start = 0 if low is None else self._position(low)[0]
+        stop = len(self.entries)
+        if high is not None:
+            stop = bisect.bisect_right(self.entries, self.key(high), key=lambda entry: self.key(entry[0]))
+        return [name for _, names in self.entries[start:stop] for name in names]
+
+
+class Query:
+    """
+    A compiled `server.query`: which rows match, which fields are kept, their order and the page,
+    whatever the rows are read from.
+
+    `where` is a callable taking (name, row), or a dict of conditions on fields that must all hold:
+    a plain value means equality, an (operator, value) pair uses one of ==, !=, <, <=, >, >=, in,
+    'not in'. The field '_name' is the row name. Comparisons order values like indexes do (None,
+    then numbers, then strings), so mixed types never raise; a row without the field (or that is
+    not a dict) does not match, and lists or dicts only compare with ==, != and in. `select`
+    lists the fields to keep (other rows are kept whole), `order_by` is a field or '-field' for
+    descending order (rows without it come last).
+
+    Cursors are opaque strings: the sort key and name of the last row of a page when the rows are
+    ordered, its part and position in storage order otherwise (stable as long as rows before it
+    are not removed).
+    """
+    OPERATORS = {
+        "==": lambda a, b: a == b,
+        "!=": lambda a, b: a != b,
+        "<": lambda a, b: a < b,
+        "<=": lambda a, b: a <= b,
+        ">": lambda a, b: a > b,
+        ">=": lambda a, b: a >= b,
+    }
+
+    def __init__(self, where=None, select=None, order_by=None, limit=None, offset=0, cursor=None):
+        if limit is not None and limit < 0 or offset < 0:
+            raise ValueError("limit and offset must not be negative.")
+        self.where = where
+        self.select = list(select) if select is not None else None
+        self.descending = bool(order_by) and order_by.startswith("-")
+        self.order_by = order_by.lstrip("-") if order_by else None
+        self.limit = limit
+        self.offset = offset
+        self.after = self.decode(cursor) if cursor else None
+        self.conditions = []
+        if callable(where):
+            self.predicate = where
+        else:
+            for field, condition in (where or {}).items():
+                if not isinstance(condition, tuple):
+                    condition = ("==", condition)
+                if len(condition) != 2 or condition[0] not in self.OPERATORS and condition[0] not in ("in", "not in"):
+                    raise ValueError(f"Invalid condition {condition!r} on field '{field}'.")
+                self.conditions.append((field,) + condition)
+            self.predicate = self._match if self.conditions else None
+
+    @staticmethod
+    def sort_key(value):
+        if value is None:
+            return (0, 0, 0)
+        if isinstance(value, (int, float)):
+            return (0, 1, value)
+        if isinstance(value, str):
+            return (0, 2, value)
+        return (0, 3, json.dumps(value, sort_keys=True, default=str))
+
+    @staticmethod
+    def field(name, row, field):
+        """
+        Returns (True, value) of `field` in a row ('_name' being its name), or (False, None).
+        """
+        if field == "_name":
+            return True, name
+        if isinstance(row, dict) and field in row:
+            return True, row[field]
+        return False, None
+
+    def _match(self, name, row):
+        for field, op, target in self.conditions:
+            has, value = self.field(name, row, field)
+            if not has:
+                return False
+            if op == "in" or op == "not in":
+                keys = {self.sort_key(item) for item in target}
+                if (self.sort_key(value) in keys) != (op == "in"):
+                    return False
+            elif op not in ("==", "!=") and not isinstance(value, Index.SCALARS):
+                return False
+            elif not self.OPERATORS[op](self.sort_key(value), self.sort_key(target)):
+                return False
+        return True
+
+    def lookup(self, indexed):
+        """
+        Returns (field, lookup(index) -> candidate names) for the first condition an index among the
+        `indexed` fields can answer, or None. The candidates are a superset, the rows are still matched.
+        """
+        for field, op, target in self.conditions:
+            targets = target if op == "in" else [target]
+            if field not in indexed or not all(isinstance(value, Index.SCALARS) for value in targets):
+                continue
+            if op == "==":
+                return field, lambda index: index.find(target)
+            if op == "in":
+                return field, lambda index: [name for value in target for name in index.find(value)]
+            if op in ("<", "<="):
+                return field, lambda index: index.range(None, target)
+            if op in (">", ">="):
+                return field, lambda index: index.range(target, None)
+        return None
+
+    def project(self, row):
+        if self.select is None or not isinstance(row, dict):
+            return row
+        return {field: row[field] for field in self.select if field in row}
+
+    def order_key(self, name, row):
+        has, value = self.field(name, row, self.order_by)
+        return (self.sort_key(value) if has else (-1 if self.descending else 1, 0, 0)) + (name,)
+
+    @staticmethod
+    def encode(position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode(cursor):
+        try:
+            return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        except (ValueError, TypeError):
+            raise ValueError(f"Invalid query cursor {cursor!r}.")
+
+    def run(self, parts):
+        """
+        Yields (cursor, name, row) for the page of the rows read from `parts`, an iterable of (part
+        number, iterable of (name, row)) in storage order. Unordered queries stream: parts are only
+        read as far as the page needs. Ordered ones keep offset + limit rows at most.
+        """
+        matched = self._matching(parts)
+        if self.order_by is None:
+            rows = ((self.encode([number, position]), name, row) for number, position, name, row in matched)
+        else:
+            rows = self._ordered(matched)
+        stop = None if self.limit is None else self.offset + self.limit
+        for cursor, name, row in itertools.islice(rows, self.offset, stop):
+            yield cursor, name, self.project(row)
+
+    def _matching(self, parts):
+        after = self.after if self.order_by is None else None
+        for number, rows in parts:
+            if after is not None and number < after[0]:
+                continue
+            for position, (name, row) in enumerate(rows):
+                if after is not None and number == after[0] and position <= after[1]:
+                    continue
+                if self.predicate is None or self.predicate(name, row):
+                    yield number, position, name, row
+
+    def _ordered(self, matched):
+        keyed = ((self.order_key(name, row), name, row) for _, _, name, row in matched)
+        if self.after is not None:
+            after = tuple(self.after)
+            keyed = (item for item in keyed if (item[0] < after if self.descending else item[0] > after))
+        if self.limit is None:
+            ordered = sorted(keyed, key=lambda item: item[0], reverse=self.descending)
+        else:
+            pick = heapq.nlargest if self.descending else heapq.nsmallest
+            ordered = pick(self.offset + self.limit, keyed, key=lambda item: item[0])
+        for key, name, row in ordered:
+            yield self.encode(list(key)), name, row
+
+
+class TableCache:
+    """
+    In-process LRU cache of parsed tables, keyed by (class, table, branch).
+
+    Each entry keeps the parsed dict, the blob sha and what it is revalidated
+    with: the ContentFile it came from (an ETag for AsyncServer), or None for
+    tables written through a tree commit, which are downloaded again once stale. Entries younger than `ttl` seconds are served without any request;
+    older ones are revalidated with If-None-Match, so a 304 skips both the
+    download and the parse. `max_bytes` caps the cache by encoded table size.
+    """
+    def __init__(self, ttl: float = 5.0, max_bytes: int = 64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    def _hit(self):
+        self.hits += 1
+        Metrics.record("cache_hits")
+
+    def _miss(self):
+        self.misses += 1
+        Metrics.record("cache_misses")
+
+    def get(self, key, fresh: bool = False):
+        """
+        Returns the cached entry for `key`, or None. With `fresh=True` (or when
+        the entry is older than `ttl`) the entry is revalidated first; if the
+        table changed upstream the entry comes back with `data` set to None and
+        `content` holding the new ContentFile, ready to be parsed and `put`.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self._miss()
+                return None
+            self.entries.move_to_end(key)
+
+        if not fresh and (self.ttl is None or time.monotonic() - entry["fetched_at"] < self.ttl):
+            with self.lock:
+                self._hit()
+            return entry
+
+        if entry["content"] is None:
+            with self.lock:
+                self._miss()
+            self.invalidate(key)
+            return None
+
+        try:
+            changed = entry["content"].update()
+        except Exception:
+            with self.lock:
+                self._miss()
+            self.invalidate(key)
+            return None
+
+        with self.lock:
+            self.revalidations += 1
+            if changed:
+                self._miss()
+                return dict(entry, data=None)
+            entry["fetched_at"] = time.monotonic()
+            self._hit()
+        return entry
+
+    def peek(self, key, fresh: bool = False):
+        """
+        Like `get`, for readers that revalidate on their own (AsyncServer): returns (entry, stale)
+        without any request. A fresh entry counts as a hit; a stale one must be reported back
+        with `revalidated`.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self._miss()
+                return None, True
+            self.entries.move_to_end(key)
+            if not fresh and (self.ttl is None or time.monotonic() - entry["fetched_at"] < self.ttl):
+                self._hit()
+                return entry, False
+            return entry, True
+
+    def revalidated(self, key, changed: bool):
+        with self.lock:
+            self.revalidations += 1
+            if changed:
+                self._miss()
+                return
+            self._hit()
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry["fetched_at"] = time.monotonic()
+
+    def put(self, key, data, sha, content, size):
+        with self.lock:
+            self.invalidate(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self.entries[key] = {"data": data, "sha": sha, "content": content, "size": size, "fetched_at": time.monotonic()}
+            self.size += size
+            while self.max_bytes is not None and self.size > self.max_bytes:
+                _, old = self.entries.popitem(last=False)
+                self.size -= old["size"]
+                self.evictions += 1
+
+    def invalidate(self, key=None, clas=None, table=None):
+        """
+        Drops one entry, every entry of a class (`clas`) or of one of its tables
+        (`clas` and `table`, shards included), or the whole cache.
+        """
+        with self.lock:
+            if clas is not None:
+                for k in [k for k in self.entries if k[0] == clas and (table is None or k[1] == table or k[1].startswith(f"{table}/"))]:
+                    self.size -= self.entries.pop(k)["size"]
+                return
+            if key is None:
+                self.entries.clear()
+                self.size = 0
+                return
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old["size"]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "evictions": self.evictions,
+            }
+
+
+class Histogram:
+    """
+    Latency histogram with fixed, cumulative buckets (the Prometheus layout), cheap enough
+    to update on every call. Quantiles are interpolated inside the bucket they fall in.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = self.buckets[i - 1] if i else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(low + (high - low) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def cumulative(self):
+        """
+        Yields (upper bound, count of values <= bound), ending with ("+Inf", count).
+        """
+        total = 0
+        for bound, n in zip(self.buckets, self.counts):
+            total += n
+            yield bound, total
+        yield "+Inf", self.count
+
+
+class Operation:
+    """
+    One public server call being measured: what it cost in API calls, bytes and commits, and
+    with tracing on, one span per request it sent.
+    """
+    FIELDS = ("calls", "bytes_up", "bytes_down", "commits", "cache_hits", "cache_misses", "throttled")
+
+    def __init__(self, metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+        self.start = time.perf_counter()
+        self.counts = dict.fromkeys(self.FIELDS, 0)
+        self.spans = [] if metrics.trace else None
+
+
+class Metrics:
+    """
+    Counters and latency histograms per operation (`get_data`, `insert_many`, ...), quiet unless
+    asked: nothing is printed, `snapshot()` and `prometheus()` read the totals, and every finished
+    operation is handed to the `sinks` as a dict:
+
+        {"operation", "seconds", "error", "calls", "bytes_up", "bytes_down", "commits",
+         "cache_hits", "cache_misses", "throttled", "rate_limit_remaining"[, "spans"]}
+
+    A sink is any callable taking that dict (see LoggingSink and PrometheusSink). With `trace=True`
+    the record also carries "spans": one {"name", "start", "seconds", "status", "bytes"} per
+    request, `start` being relative to the start of the operation.
+
+    The operation in progress lives in a ContextVar, so requests made by the shared client (or from
+    asyncio tasks of an AsyncServer call) are charged to whichever operation sent them. Operations
+    do not nest: a public method called by another one is counted in the outer call.
+    """
+    current = contextvars.ContextVar("operation", default=None)
+
+    def __init__(self, sinks=(), trace: bool = False):
+        self.trace = trace
+        self.sinks = []
+        self.operations = {}
+        self.rate_limit = {}
+        self.lock = threading.Lock()
+        for sink in sinks:
+            self.add_sink(sink)
+
+    def add_sink(self, sink):
+        """
+        Adds a sink; one with an `attach(metrics)` method (PrometheusSink) is attached first.
+        """
+        attach = getattr(sink, "attach", None)
+        if attach is not None:
+            attach(self)
+        self.sinks.append(sink)
+        return sink
+
+    @contextlib.contextmanager
+    def operation(self, name: str):
+        current = Metrics.current.get()
+        if current is not None:
+            yield current
+            return
+        operation = Operation(self, name)
+        token = Metrics.current.set(operation)
+        error = None
+        try:
+            yield operation
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            Metrics.current.reset(token)
+            self.finish(operation, time.perf_counter() - operation.start, error)
+
+    @staticmethod
+    def record(field: str, amount: int = 1):
+        """
+        Adds `amount` to `field` (see Operation.FIELDS) of the operation in progress, if any.
+        """
+        operation = Metrics.current.get()
+        if operation is not None:
+            operation.counts[field] += amount
+
+    @staticmethod
+    def request(verb: str, url: str, status: int, seconds: float, sent: int = 0, received: int = 0, headers=None):
+        """
+        Charges one API request to the operation in progress: the call, its bytes, the commit it
+        made (a Contents API write or a new git commit) and the rate limit budget it reported.
+        """
+        operation = Metrics.current.get()
+        if operation is None:
+            return
+        counts = operation.counts
+        counts["calls"] += 1
+        counts["bytes_up"] += sent
+        counts["bytes_down"] += received
+        path = url.split("?", 1)[0]
+        if status < 400 and ((verb in ("PUT", "DELETE") and "/contents/" in path) or (verb == "POST" and path.endswith("/git/commits"))):
+            counts["commits"] += 1
+        if headers:
+            remaining = headers.get("x-ratelimit-remaining") or headers.get("X-RateLimit-Remaining")
+            if remaining is not None:
+                metrics = operation.metrics
+                metrics.rate_limit = {
+                    "remaining": int(remaining),
+                    "limit": int(headers.get("x-ratelimit-limit") or headers.get("X-RateLimit-Limit") or 0) or None,
+                    "reset": int(headers.get("x-ratelimit-reset") or headers.get("X-RateLimit-Reset") or 0) or None,
+                }
+        if operation.spans is not None:
+            start = time.perf_counter() - seconds - operation.start
+            operation.spans.append({"name": f"{verb} {path}", "start": start, "seconds": seconds, "status": status, "bytes": sent + received})
+
+    def finish(self, operation, seconds: float, error=None):
+        record = dict(operation=operation.name, seconds=seconds, error=error, **operation.counts,
+                      rate_limit_remaining=self.rate_limit.get("remaining"))
+        if operation.spans is not None:
+            record["spans"] = operation.spans
+        with self.lock:
+            stats = self.operations.get(operation.name)
+            if stats is None:
+                stats = self.operations[operation.name] = dict(count=0, errors=0, latency=Histogram(), **dict.fromkeys(Operation.FIELDS, 0))
+            stats["count"] += 1
+            stats["errors"] += error is not None
+            for field in Operation.FIELDS:
+                stats[field] += operation.counts[field]
+            stats["latency"].observe(seconds)
+        for sink in self.sinks:
+            try:
+                sink(record)
+            except Exception as e:
+                logger.warning(f"[Metrics] Sink {sink!r} failed: {e}")
+
+    def snapshot(self):
+        """
+        Totals per operation, with p50/p95/p99/max latency in seconds, and the last rate limit seen.
+        """
+        with self.lock:
+            operations = {}
+            for name, stats in self.operations.items():
+                latency = stats["latency"]
+                operations[name] = dict({k: v for k, v in stats.items() if k != "latency"}, latency={
+                    "p50": latency.quantile(0.5), "p95": latency.quantile(0.95), "p99": latency.quantile(0.99),
+                    "max": latency.max, "sum": latency.sum,
+                })
+            return {"operations": operations, "rate_limit": dict(self.rate_limit)}
+
+    def prometheus(self, prefix: str = "gitserver"):
+        """
+        The totals in the Prometheus text exposition format.
+        """
+        counters = (
+            ("operations_total", "count", "Operations finished."),
+            ("operation_errors_total", "errors", "Operations that raised."),
+            ("api_calls_total", "calls", "GitHub API requests sent."),
+            ("bytes_sent_total", "bytes_up", "Request body bytes sent."),
+            ("bytes_received_total", "bytes_down", "Response body bytes received."),
+            ("commits_total", "commits", "Commits created."),
+            ("cache_hits_total", "cache_hits", "Table cache hits."),
+            ("cache_misses_total", "cache_misses", "Table cache misses."),
+            ("throttled_total", "throttled", "Requests retried after a rate limit response."),
+        )
+        lines = []
+        with self.lock:
+            operations = sorted(self.operations.items())
+            for metric, field, help in counters:
+                lines += [f"# HELP {prefix}_{metric} {help}", f"# TYPE {prefix}_{metric} counter"]
+                lines += [f'{prefix}_{metric}{{operation="{name}"}} {stats[field]}' for name, stats in operations]
+            lines += [f"# HELP {prefix}_operation_seconds Operation latency.", f"# TYPE {prefix}_operation_seconds histogram"]
+            for name, stats in operations:
+                latency = stats["latency"]
+                lines += [f'{prefix}_operation_seconds_bucket{{operation="{name}",le="{bound}"}} {count}' for bound, count in latency.cumulative()]
+                lines.append(f'{prefix}_operation_seconds_sum{{operation="{name}"}} {latency.sum}')
+                lines.append(f'{prefix}_operation_seconds_count{{operation="{name}"}} {latency.count}')
+            if self.rate_limit.get("remaining") is not None:
+                lines += [f"# HELP {prefix}_rate_limit_remaining Requests left in the current rate limit window.",
+                          f"# TYPE {prefix}_rate_limit_remaining gauge", f"{prefix}_rate_limit_remaining {self.rate_limit['remaining']}"]
+        return "\n".join(lines) + "\n"
+
+
+class LoggingSink:
+    """
+    Logs one line per finished operation on the `gitserver` logger.
+    """
+    def __init__(self, level: int = logging.INFO, logger: logging.Logger = logger):
+        self.level = level
+        self.logger = logger
+
+    def __call__(self, record):
+        self.logger.log(
+            self.level, "[Metrics] %s %.1f ms: %d calls, %d B up, %d B down, %d commits, cache %d/%d%s",
+            record["operation"], record["seconds"] * 1000, record["calls"], record["bytes_up"], record["bytes_down"],
+            record["commits"], record["cache_hits"], record["cache_hits"] + record["cache_misses"],
+            f", failed with {record['error']}" if record["error"] else "",
+        )
+
+
+class PrometheusSink:
+    """
+    Rewrites `path` with `Metrics.prometheus()` at most every `interval` seconds (atomically, for
+    the node_exporter textfile collector or any scraper reading the file).
+    """
+    def __init__(self, path: str, interval: float = 15.0):
+        self.path = path
+        self.interval = interval
+        self.metrics = None
+        self.written = None
+
+    def attach(self, metrics):
+        self.metrics = metrics
+
+    def __call__(self, record):
+        now = time.monotonic()
+        if self.written is None or now - self.written >= self.interval:
+            self.written = now
+            self.dump()
+
+    def dump(self):
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            f.write(self.metrics.prometheus())
+        os.replace(temporary, self.path)
+
+
+def verbose_logging(level: int = logging.INFO):
+    """
+    Prints the `gitserver` log lines (the messages every call used to print) to stdout.
+    """
+    if not any(getattr(handler, "gitserver", False) for handler in logger.handlers):
+        handler = logging.StreamHandler(sys.stdout)
+        handler.gitserver = True
+        handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", "%d/%m/%Y | %H:%M"))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+
+
+class TokenBucket:
+    """
+    Refills `rate` tokens per second up to `capacity`. `wait()` is how long until one token is available.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+        self.waiters = []
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def take(self):
+        self.refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait(self):
+        self.refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate if self.rate else 60.0
+
+
+class Scheduler:
+    """
+    Paces every GitHub request of a server. Requests draw from a `core` token
+    bucket, resized from the X-RateLimit-Remaining/X-RateLimit-Reset headers of
+    each response, and content-creating writes (POST/PUT/PATCH/DELETE) also
+    from a `writes` bucket kept under GitHub's secondary limit (80 per minute
+    by default). Waiting requests are served by priority ('interactive' before
+    'normal' before 'bulk'), then in arrival order. A 403/429 rate limit
+    response pauses everything for its Retry-After (or until the reset time,
+    or an exponential backoff) and the request is sent again, up to
+    `max_retries` times.
+
+        with S.scheduler.priority('bulk'):
+            S.insert_many('TABLE', 'CLASS', rows)
+    """
+    PRIORITIES = {"interactive": 0, "normal": 1, "bulk": 2}
+    WRITES = ("POST", "PUT", "PATCH", "DELETE")
+
+    def __init__(self, requests_per_hour: int = 5000, writes_per_minute: int = 80, max_retries: int = 5, backoff: float = 1.0):
+        self.core = TokenBucket(requests_per_hour / 3600, requests_per_hour)
+        self.writes = TokenBucket(writes_per_minute / 60, writes_per_minute)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.paused_until = 0.0
+        self.remaining = None
+        self.reset = None
+        self.counter = 0
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self.current = contextvars.ContextVar("priority", default=None)
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+
+    @contextlib.contextmanager
+    def priority(self, name: str):
+        """
+        Runs the requests made inside the block with priority `name`. The outermost block wins,
+        so a caller can mark a whole operation as 'interactive' or 'bulk'.
+        """
+        if name not in self.PRIORITIES:
+            raise ValueError(f"Unknown priority '{name}', expected one of {', '.join(self.PRIORITIES)}.")
+        token = self.current.set(self.current.get() or name)
+        try:
+            yield
+        finally:
+            self.current.reset(token)
+
+    def _buckets(self, verb):
+        return [self.writes, self.core] if verb.upper() in self.WRITES else [self.core]
+
+    def _enqueue(self, bucket):
+        self.counter += 1
+        ticket = (self.PRIORITIES[self.current.get() or "normal"], self.counter)
+        heapq.heappush(bucket.waiters, ticket)
+        return ticket
+
+    def _turn(self, bucket, ticket):
+        """
+        Takes a token for `ticket` when it is first in line; otherwise returns how long to wait. Holds the lock.
+        """
+        delay = self.paused_until - time.monotonic()
+        if delay <= 0 and bucket.waiters[0] == ticket and bucket.take():
+            heapq.heappop(bucket.waiters)
+            self.changed.notify_all()
+            return 0
+        return max(delay, bucket.wait() if bucket.waiters[0] == ticket else 0, 0.005)
+
+    def acquire(self, verb: str):
+        """
+        Blocks until a request with method `verb` may be sent.
+        """
+        start = time.monotonic()
+        with self.lock:
+            for bucket in self._buckets(verb):
+                ticket = self._enqueue(bucket)
+                while (delay := self._turn(bucket, ticket)):
+                    self.changed.wait(delay)
+            self.requests += 1
+            self.waited += time.monotonic() - start
+
+    async def acquire_async(self, verb: str):
+        """
+        Same as `acquire`, awaiting instead of blocking the event loop.
+        """
+        start = time.monotonic()
+        for bucket in self._buckets(verb):
+            with self.lock:
+                ticket = self._enqueue(bucket)
+            while True:
+                with self.lock:
+                    delay = self._turn(bucket, ticket)
+                if not delay:
+                    break
+                await asyncio.sleep(min(delay, 0.05))
+        with self.lock:
+            self.requests += 1
+            self.waited += time.monotonic() - start
+
+    def observe(self, status: int, headers: dict, attempt: int = 0):
+        """
+        Resizes the core bucket from the rate limit headers of a response. Returns how long to wait
+        before sending the request again if it was rate limited, or None.
+        """
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        now = time.monotonic()
+        with self.lock:
+            if "x-ratelimit-remaining" in headers:
+                self.remaining = int(headers["x-ratelimit-remaining"])
+                self.reset = int(headers.get("x-ratelimit-reset", 0)) or None
+                window = max(self.reset - time.time(), 1) if self.reset else 3600
+                self.core.refill()
+                self.core.tokens = min(self.core.tokens, self.remaining)
+                self.core.rate = max(self.remaining, 1) / window
+            limited = status == 429 or (status == 403 and ("retry-after" in headers or self.remaining == 0))
+            if not limited or attempt >= self.max_retries:
+                return None
+            if "retry-after" in headers:
+                delay = float(headers["retry-after"])
+            elif self.remaining == 0 and self.reset:
+                delay = max(self.reset - time.time(), 0) + 1
+            else:
+                delay = self.backoff * 2 ** min(attempt, 6)
+            self.paused_until = max(self.paused_until, now + delay)
+            self.core.tokens = max(self.core.tokens, 1)
+            self.throttled += 1
+            self.changed.notify_all()
+            return delay
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "waited": round(self.waited, 3),
+                "remaining": self.remaining,
+                "reset": self.reset,
+                "queued": len(self.core.waiters) + len(self.writes.waiters),
+            }
+
+    def install(self, client):
+        """
+        Routes every request of a PyGithub `client` through the scheduler and returns the client.
+        """
+        requester = client.requester
+        raw = requester._Requester__requestRaw
+
+        def request(cnx, verb, url, requestHeaders, input, *args, **kwargs):
+            for attempt in range(self.max_retries + 1):
+                self.acquire(verb)
+                start = time.perf_counter()
+                status, headers, output = raw(cnx, verb, url, requestHeaders, input, *args, **kwargs)
+                Metrics.request(verb, url, status, time.perf_counter() - start, len(input) if input else 0,
+                                len(output) if isinstance(output, (str, bytes)) else 0, headers)
+                delay = self.observe(status, headers, attempt)
+                if delay is None:
+                    return status, headers, output
+                Metrics.record("throttled")
+                logger.warning(f"[GitHub] Rate limited on {verb} {url}, retrying in {delay:.1f}s.")
+            return status, headers, output
+
+        requester._Requester__requestRaw = request
+        return client
+
+    def client(self, token: str, **kwargs):
+        """
+        Returns a Github client whose requests go through the scheduler. PyGithub's own
+        pacing and rate limit retries are turned off, the scheduler does both.
+        """
+        kwargs = dict(dict(retry=None, seconds_between_requests=0, seconds_between_writes=0), **kwargs)
+        return self.install(Github(token, **kwargs))
+
+
+def prioritized(name, operation=None):
+    """
+    Runs a server method with scheduler priority `name` (see Scheduler.priority), measured as one
+    operation named `operation`, by default after the method (see Metrics).
+    """
+    def decorate(method):
+        label = operation or method.__name__
+        if asyncio.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def run(self, *args, **kwargs):
+                with self.scheduler.priority(name), self.metrics.operation(label):
+                    return await method(self, *args, **kwargs)
+        else:
+            @functools.wraps(method)
+            def run(self, *args, **kwargs):
+                with self.scheduler.priority(name), self.metrics.operation(label):
+                    return method(self, *args, **kwargs)
+        return run
+    return decorate
+
+
+class Snapshot:
+    """
+    The commit a `server.snapshot()` pins reads to: its tree and the blob sha of every file in it.
+    The pins live in a ContextVar, {id(server): Snapshot}, so a pin holds for the thread (or asyncio
+    task) that opened it and only for the server that opened it; snapshots of other servers opened
+    inside it keep their own.
+    """
+    current = contextvars.ContextVar("snapshot", default={})
+
+    def __init__(self, server, commit, tree, files):
+        self.server = server
+        self.commit = commit
+        self.tree = tree
+        self.files = files
+
+    @classmethod
+    def of(cls, server):
+        snapshot = cls.current.get().get(id(server))
+        return snapshot if snapshot is not None and snapshot.server is server else None
+
+    @classmethod
+    def pin(cls, server, snapshot):
+        """
+        Pins the reads of `server` to `snapshot` (None: unpins them), leaving other servers' pins
+        alone. Returns the token to `current.reset` with.
+        """
+        pins = dict(cls.current.get())
+        if snapshot is None:
+            pins.pop(id(server), None)
+        else:
+            pins[id(server)] = snapshot
+        return cls.current.set(pins)
+
+
+class Immutable:
+    """
+    Stands in for the ContentFile of a cached table read by blob sha: the blob cannot change, so
+    revalidating it never needs a request.
+    """
+    def update(self):
+        return False
+
+
+def unpinned(method):
+    """
+    Marks a server method that writes to the branch: it raises RuntimeError inside a `snapshot` of
+    the same server, whose reads come from the pinned commit and would base the write on stale rows.
+    """
+    @functools.wraps(method)
+    def run(self, *args, **kwargs):
+        if self._pinned() is not None:
+            raise RuntimeError(f"'{method.__name__}' writes to the branch and cannot be called inside a snapshot.")
+        return method(self, *args, **kwargs)
+    return run
+
+
+# Row values that cannot be changed in place, so copies of a row can share them
+ATOMIC = frozenset((str, int, float, bool, type(None), bytes))
+
+
+class TableLayout:
+    """
+    Where and how table rows are stored, shared by `server` and `AsyncServer`: file paths,
+    shard routing, index files and the codec of each table.
+    """
+    def _table_path(self, table, clas):
+        return f'{clas}/{table}.json'
+
+    @staticmethod
+    def _shard_of(name, shards):
+        return zlib.crc32(str(name).encode()) % shards
+
+    @staticmethod
+    def _shard_table(table, index):
+        return f'{table}/shard_{index:02d}'
+
+    def _part_of(self, table, shards, name):
+        if shards is None:
+            return table
+        return self._shard_table(table, self._shard_of(name, shards))
+
+    @staticmethod
+    def _index_part(table, field=None):
+        """
+        Returns the part of the index of `field` (None: the registry of the table's indexes). Field names are
+        percent-encoded, a leading '_' included, so no name can nest folders or land on the registry file.
+        """
+        if field is None:
+            return f'_indexes/{table}/_registry'
+        if not isinstance(field, str) or not field:
+            raise ValueError(f"Invalid index field {field!r}: expected a non-empty string.")
+        name = urllib.parse.quote(field, safe="")
+        return f'_indexes/{table}/{"%5F" + name[1:] if name.startswith("_") else name}'
+
+    def _codec(self, table, clas):
+        """
+        Returns the codec a table is written with: the one it was read with, or the server default
+        for new and legacy (str(dict)) tables, which are migrated on their next write.
+        """
+        name = self.codecs.get((clas, table))
+        if name is None or name == "legacy":
+            return self.codec
+        return Codec.parse(name)
+
+    @staticmethod
+    def _survives(codec, name, data):
+        """
+        Whether `codec` gives row `name` back exactly as written. JSON turns int keys into strings and tuples
+        into lists and cannot hold sets or other objects; msgpack keeps int keys but not tuples.
+        """
+        try:
+            return codec.decode(codec.encode({name: data})) == {name: data}
+        except (TypeError, ValueError, OverflowError):
+            return False
+
+    @staticmethod
+    def _lossy(table, clas, codec, name):
+        return TypeError(
+            f"Row {name!r} of table '{clas}/{table}' would not be read back as written with the {codec.name} codec: "
+            f"use str keys and JSON-like values (dict, list, str, int, float, bool, None)."
+        )
+
+    def _encode(self, table, clas, DATA):
+        """
+        Encodes a table with its codec and remembers the codec it was written with. A legacy table
+        whose rows the codec cannot hold as they are stays legacy rather than losing data.
+        """
+        codec = self._codec(table, clas)
+        raw = codec.encode(DATA)
+        if self.codecs.get((clas, table)) == "legacy" and codec.decode(raw) != DATA:
+            codec = LEGACY
+            raw = codec.encode(DATA)
+        self.codecs[(clas, table)] = codec.name
+        return raw
+
+    @staticmethod
+    def _tables_in(items, clas):
+        """
+        Returns the table names of class `clas` in a tree listing: '.json' files and folders with a manifest.
+        """
+        paths = {item.path for item in items}
+        tables = []
+        for name, kind in TreeWalker.children(items, clas):
+            if kind != "tree" and name.endswith(".json"):
+                tables.append(name[:-len(".json")])
+            elif kind == "tree" and f"{clas}/{name}/_manifest.json" in paths:
+                tables.append(name)
+        return sorted(tables)
+
+    @staticmethod
+    def _rows(rows):
+        return rows.items() if isinstance(rows, dict) else rows
+
+    @staticmethod
+    def _detached(value):
+        """
+        Returns a deep copy of rows crossing the API: rows handed to callers and rows they write, so
+        changing them never reaches the cached tables. The dicts and lists rows are made of are copied
+        directly, about twice as fast as copy.deepcopy, which copies anything else.
+        """
+        kind = type(value)
+        if kind is dict:
+            return {key: item if type(item) in ATOMIC else TableLayout._detached(item) for key, item in value.items()}
+        if kind is list:
+            return [item if type(item) in ATOMIC else TableLayout._detached(item) for item in value]
+        if kind in ATOMIC:
+            return value
+        return copy.deepcopy(value)
+
+    @staticmethod
+    def _table_of(path):
+        """
+        Returns (class, table, kind) of a repository path, kind being 'rows' (a table file or a shard),
+        'manifest' or 'index'; None for anything else (.gitkeep, other files).
+        """
+        parts = PurePosixPath(path).parts
+        if len(parts) == 2 and parts[1].endswith(".json"):
+            return parts[0], parts[1][:-len(".json")], "rows"
+        if len(parts) >= 3 and parts[1] == "_indexes":
+            return parts[0], parts[2], "index"
+        if len(parts) == 3 and parts[2] == "_manifest.json":
+            return parts[0], parts[1], "manifest"
+        if len(parts) == 3 and parts[2].startswith("shard_") and parts[2].endswith(".json"):
+            return parts[0], parts[1], "rows"
+        return None
+
+    @staticmethod
+    def _row_changes(old, new):
+        """
+        Returns {row name: 'added' | 'updated' | 'removed'} between two versions of a table's rows.
+        """
+        changes = {name: "removed" for name in old.keys() - new.keys()}
+        for name, data in new.items():
+            if name not in old:
+                changes[name] = "added"
+            elif old[name] != data:
+                changes[name] = "updated"
+        return changes
+
+    @staticmethod
+    def _changed_tables(paths):
+        """
+        Groups changed repository paths by table: {(class, table): [paths holding rows]}, in path order.
+        Index files are left out, they change along with the rows they index.
+        """
+        tables = {}
+        for path in sorted(paths):
+            found = TableLayout._table_of(path)
+            if found is not None and found[2] != "index":
+                parts = tables.setdefault(found[:2], [])
+                if found[2] == "rows":
+                    parts.append(path)
+        return tables
+
+    def _forget(self, clas, table):
+        """
+        Drops what the server knows about a table: cached rows and indexes, layout and index fields.
+        """
+        self.cache.invalidate(clas=clas, table=table)
+        self.cache.invalidate(clas=clas, table=f'_indexes/{table}')
+        self.layouts.pop((clas, table), None)
+        self.indexes.pop((clas, table), None)
+
+    def _forget_paths(self, paths):
+        """
+        Forgets every table (or only the index fields, for index files) that one of `paths` belongs to.
+        """
+        for path in paths:
+            found = self._table_of(path)
+            if found is None:
+                continue
+            clas, table, kind = found
+            if kind == "index":
+                self.cache.invalidate(clas=clas, table=f'_indexes/{table}')
+                self.indexes.pop((clas, table), None)
+            else:
+                self._forget(clas, table)
+
+    def _report(self, action, table, clas, outcomes):
+        done = sum(1 for outcome in outcomes.values() if outcome == action)
+        logger.info(f"{done} of {len(outcomes)} rows {action} in table '{table}' in class '{clas}' of the repository '{self.repo}'.")
+
+
+class WriteBehind:
+    """
+    Buffer of the row writes of a `server(write_behind=...)`. Each insert, update or remove is
+    applied at once to an in-memory overlay of the rows it touched, which every read of the server
+    sees, and queued; the queued writes of a table are then committed together, one row write
+    (`_commit_rows`) per table, depending on `durability`:
+
+        'sync'    the call flushes its table before returning, so callers writing the same table
+                  at the same time share a commit (group commit)
+        'window'  a background thread flushes a table `interval` seconds after its first queued write
+        'exit'    only on `flush()`, `close()` or at interpreter exit
+
+    Every mode flushes what is left at exit. Writes are replayed on the table as it is when they
+    are flushed, so a row another writer changed meanwhile is not overwritten blindly; the outcome a
+    call returned is the one of the buffered state. A flush that fails drops its writes from the
+    overlay, and its error is raised by the next `flush()` (in 'sync' mode, by the call itself).
+    """
+    MODES = ("sync", "window", "exit")
+    REMOVED = object()
+
+    def __init__(self, server, durability="window", interval=1.0):
+        if durability not in self.MODES:
+            raise ValueError(f"Unknown write-behind durability '{durability}', expected one of {', '.join(self.MODES)}.")
+        self.server = server
+        self.durability = durability
+        self.interval = interval
+        self.lock = threading.Condition()
+        self.queues = {}
+        self.overlay = {}
+        self.first = {}
+        self.active = set()
+        self.handled = {}
+        self.generations = {}
+        self.failed = {}
+        self.errors = []
+        self.seq = 0
+        self.queued = 0
+        self.flushes = 0
+        self.closed = threading.Event()
+        self.worker = None
+        if durability == "window":
+            self.worker = threading.Thread(target=self._run, name="gitserver-write-behind", daemon=True)
+            self.worker.start()
+        atexit.register(self.close)
+
+    def apply(self, table, clas, rows, apply):
+        """
+        Applies `apply(DATA, name, data)` to each (name, data) row like `server._mutate`, on the
+        buffered state of the table, and queues the rows it changed. Returns the outcomes.
+        """
+        key = (clas, table)
+        rows = list(rows)
+        while True:
+            with self.lock:
+                generation = self.generations.get(key, 0)
+                missing = [name for name, _ in rows if name not in self.overlay.get(key, {})]
+            base = self._base(table, clas, missing) if missing else {}
+            with self.lock:
+                # A flush that finished meanwhile may have made `base` stale
+                if self.generations.get(key, 0) != generation:
+                    continue
+                overlay = self.overlay.setdefault(key, {})
+                queue = self.queues.setdefault(key, [])
+                outcomes, mine = {}, []
+                for name, data in rows:
+                    current = overlay[name][1] if name in overlay else base.get(name, self.REMOVED)
+                    probe = {} if current is self.REMOVED else {name: current}
+                    outcomes[name] = apply(probe, name, data)
+                    if outcomes[name] in ("inserted", "updated", "removed"):
+                        self.seq += 1
+                        overlay[name] = (self.seq, probe.get(name, self.REMOVED))
+                        queue.append((self.seq, name, apply, data))
+                        mine.append(self.seq)
+                if mine:
+                    self.queued += len(mine)
+                    self.first.setdefault(key, time.monotonic())
+                    self.lock.notify_all()
+            break
+        if mine and (self.durability == "sync" or self.closed.is_set()):
+            self._flush_table(key, until=mine[-1])
+            with self.lock:
+                errors = [self.failed.pop(seq) for seq in mine if seq in self.failed]
+            if errors:
+                raise errors[0]
+        return outcomes
+
+    def _base(self, table, clas, names):
+        """
+        Returns the stored rows among `names`, reading each part holding them once (usually from the cache).
+        """
+        shards = self.server._shards(table, clas)
+        groups = {}
+        for name in names:
+            groups.setdefault(self.server._part_of(table, shards, name), []).append(name)
+        base = {}
+        for part, group in groups.items():
+            DATA, _ = self.server._read_table(part, clas)
+            base.update((name, DATA[name]) for name in group if name in DATA)
+        return base
+
+    def view(self, table, clas):
+        """
+        Returns the rows of a table not flushed yet, as {name: row or REMOVED}.
+        """
+        with self.lock:
+            return {name: row for name, (_, row) in self.overlay.get((clas, table), {}).items()}
+
+    def _flush_table(self, key, until=None):
+        """
+        Commits the queued writes of one table. One flush per table runs at a time: writes queued
+        while a flush is in progress wait for it and go out together in the next one, sent by the
+        first of their callers to get the turn. With `until`, returns as soon as the writes up to
+        that sequence number are handled, whoever flushed them.
+        """
+        with self.lock:
+            while key in self.active and (until is None or self.handled.get(key, 0) < until):
+                self.lock.wait()
+            if until is not None and self.handled.get(key, 0) >= until:
+                return
+            batch = self.queues.pop(key, [])
+            self.first.pop(key, None)
+            if not batch:
+                return
+            self.active.add(key)
+        clas, table = key
+        error = None
+        try:
+            self.server._commit_rows(table, clas, [(name, (apply, data)) for _, name, apply, data in batch],
+                                     lambda DATA, name, write: write[0](DATA, name, write[1]))
+        except Exception as e:
+            error = e
+            logger.warning(f"[WriteBehind] Flushing {len(batch)} writes to table '{clas}/{table}' failed: {e}")
+        with self.lock:
+            last = batch[-1][0]
+            overlay = self.overlay.get(key, {})
+            for _, name, _, _ in batch:
+                if name in overlay and overlay[name][0] <= last:
+                    del overlay[name]
+            if error is not None:
+                if self.durability == "sync" or self.closed.is_set():
+                    self.failed.update((seq, error) for seq, _, _, _ in batch)
+                else:
+                    self.errors.append(error)
+            self.generations[key] = self.generations.get(key, 0) + 1
+            self.handled[key] = last
+            self.active.discard(key)
+            self.queued -= len(batch)
+            self.flushes += 1
+            self.lock.notify_all()
+
+    def flush(self):
+        """
+        Commits every queued write, waiting for flushes in progress, then raises the first error of
+        the flushes that failed since the last call.
+        """
+        with self.lock:
+            keys = set(self.queues) | self.active
+        for key in keys:
+            self._flush_table(key)
+        with self.lock:
+            errors, self.errors = self.errors, []
+        if errors:
+            raise errors[0]
+
+    def discard(self, clas, table=None):
+        """
+        Drops the queued writes of a table (every table of `clas` when table is None) that is being removed.
+        """
+        with self.lock:
+            for key in [key for key in set(self.queues) | set(self.overlay) if key[0] == clas and table in (None, key[1])]:
+                self.queued -= len(self.queues.pop(key, []))
+                self.overlay.pop(key, None)
+                self.first.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {"buffered": self.queued, "flushes": self.flushes}
+
+    def close(self):
+        """
+        Stops the background thread and flushes what is left. The exit hook is dropped, so a closed
+        buffer (and its server) is not kept alive until the interpreter exits.
+        """
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        atexit.unregister(self.close)
+        with self.lock:
+            self.lock.notify_all()
+        if self.worker is not None:
+            self.worker.join()
+        self.flush()
+
+    def _run(self):
+        while not self.closed.is_set():
+            with self.lock:
+                now = time.monotonic()
+                due = [key for key, first in self.first.items() if now - first >= self.interval]
+                if not due:
+                    self.lock.wait(min((first + self.interval - now for first in self.first.values()), default=None))
+                    continue
+            try:
+                with self.server.scheduler.priority('bulk'), self.server.metrics.operation('write_behind'):
+                    for key in due:
+                        self._flush_table(key)
+            except Exception as e:
+                logger.warning(f"[WriteBehind] Background flush failed: {e}")
+
+
+class WebhookReceiver:
+    """
+    A small HTTP endpoint for the repository's webhook (content type json): 'push'
+    events are handed to `server.handle_push`, 'ping' is answered, other events are
+    ignored. With a `secret` the X-Hub-Signature-256 of each delivery is checked and
+    unsigned ones are refused. Deliveries are acknowledged before they are
+    processed, since GitHub gives up on a delivery after 10 seconds. It binds to
+    the loopback interface by default; any other host needs a `secret`, since an
+    unsigned push would let anyone drop the cache and trigger reads.
+    """
+    def __init__(self, server, host: str = "127.0.0.1", port: int = 8000, path: str = "/", secret: str = None, rows: bool = False):
+        if not secret and not self.loopback(host):
+            raise ValueError(f"A webhook secret is required to listen on '{host}'.")
+        self.server = server
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.rows = rows
+        self.received = 0
+        self.rejected = 0
+        self.httpd = None
+
+    @staticmethod
+    def loopback(host: str):
+        if host == "localhost":
+            return True
+        try:
+            return ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            return False
+
+    def start(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                event = self.headers.get("X-GitHub-Event")
+                status, message = receiver.accept(self.path, event, body, self.headers.get("X-Hub-Signature-256"))
+                data = message.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                self.wfile.flush()
+                if status == 202:
+                    receiver.process(event, body)
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, name="gitserver-webhook", daemon=True).start()
+        logger.info(f"[Webhook] Listening on {self.url}")
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{self.path}"
+
+    def verify(self, body: bytes, signature: str):
+        if not self.secret:
+            return True
+        expected = "sha256=" + hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature or "")
+
+    def accept(self, path, event, body, signature):
+        """
+        Returns the (status, message) to answer a delivery with; 202 means it is to be processed.
+        """
+        if path.split("?", 1)[0] != self.path:
+            return 404, "not found"
+        if not self.verify(body, signature):
+            self.rejected += 1
+            return 401, "bad signature"
+        self.received += 1
+        if event == "ping":
+            return 200, "pong"
+        if event != "push":
+            return 200, "ignored"
+        return 202, "accepted"
+
+    def process(self, event, body):
+        try:
+            changes = self.server.handle_push(json.loads(body), rows=self.rows)
+            logger.info(f"[Webhook] Push applied, {len(changes)} tables changed.")
+        except Exception as e:
+            logger.warning(f"[Webhook] Could not apply a push: {e}")
+
+
+class server(TableLayout):
+    def __init__(self, token, repo, branch='main', cache_ttl=5.0, cache_max_bytes=64 * 1024 * 1024, shard_max_bytes=512 * 1024, codec='json', max_retries=10, retry_delay=0.1, scheduler=None,
+                 mode='api', path=None, remote=None, refresh_interval=30.0, push_batch=20, push_interval=5.0, connect=True, metadata_ttl=3600.0,
+                 metrics=None, sinks=(), trace=False, verbose=False, base_url=None, write_behind=None, flush_interval=1.0,
+                 blob_cache_bytes=256 * 1024 * 1024):
+        """
+        # Server (__init__)
+        Parameters: token and repository (str, str)
+        Optional: branch (str), cache_ttl (float, seconds), cache_max_bytes (int), shard_max_bytes (int), codec (str),
+        max_retries (int), retry_delay (float, seconds), scheduler (Scheduler), mode ('api' or 'mirror'), path (str),
+        remote (str), refresh_interval (float, seconds), push_batch (int), push_interval (float, seconds), connect (bool),
+        metadata_ttl (float, seconds), metrics (Metrics), sinks (list of callables), trace (bool), verbose (bool),
+        base_url (str), write_behind ('sync', 'window' or 'exit'), flush_interval (float, seconds) and blob_cache_bytes (int)
+
+        The purpose of this function is to pass parameters to the 'Server' class. This class was developed
+        to manipulate data on a server, using GitHub as a repository. To use it, access your GitHub account,
+        get the name of the desired repository and the corresponding access token.
+        Tables read by the server are kept in a TableCache (see `cache_stats`); a `cache_ttl` of 0
+        revalidates on every read, None never revalidates. Sharded tables (see `create_table`) double their
+        shard count once a shard grows past `shard_max_bytes`. New tables are written with `codec` (see Codec, e.g.
+        'json', 'json+zlib', 'msgpack+zstd'); existing tables keep the codec they were written with.
+        Row writes are conditional on the sha that was read; on a conflict they are re-applied up to `max_retries`
+        times with a jittered backoff starting at `retry_delay` (and capped at 16 times it), so many writers can
+        share a table. Threads of one server take turns on a table instead of conflicting with each other.
+        Every GitHub request goes through `scheduler` (see Scheduler and `scheduler_stats`), which keeps
+        the server inside the rate limits; pass one Scheduler to several servers sharing a token.
+        With mode='mirror' the data lives in a local clone at `path` (see Mirror): reads never go over
+        HTTP, writes are committed locally and pushed in batches. `remote` is any git URL or the path of a
+        bare repository (default: the GitHub repository `repo`, authenticated with `token`, which is kept out of the
+        clone's config and of the logs), so a mirror can also run fully offline.
+        Servers of the same token share one client (see GitHubConnection). The repository metadata is kept on
+        disk for `metadata_ttl` seconds, so a warm start makes no request; with connect=False nothing is
+        requested until the first operation (in mirror mode, the first fetch is deferred too).
+        Every operation is measured in `metrics` (see Metrics): API calls, bytes, commits, cache hits and
+        latency, handed to `sinks` and, with trace=True, broken down into one span per request. Nothing is
+        printed unless verbose=True; the messages go to the 'gitserver' logger.
+        `base_url` points the server at another API root (GitHub Enterprise's https://HOST/api/v3, or the
+        fake server of benchmarks/fake_github.py).
+        With write_behind set, row writes are buffered (see WriteBehind): they are visible to this server's reads
+        right away and committed together, one commit per table per `flush_interval` window ('window'), at
+        once but shared by concurrent writers ('sync') or only on `flush()` and at exit ('exit').
+        Blobs read by sha (large tables, `changes_since`, `snapshot`) are kept on disk in a BlobCache of up to
+        `blob_cache_bytes`, shared by every process using the same cache directory; 0 turns it off.
+        """
+        if verbose:
+            verbose_logging()
+        self.metrics = metrics or Metrics(sinks, trace=trace)
+        try:
+            self.token = token
+            self.repo = repo
+            self.branch = branch
+            self.cache = TableCache(ttl=cache_ttl, max_bytes=cache_max_bytes)
+            self.shard_max_bytes = shard_max_bytes
+            self.layouts = {}
+            self.codec = Codec.parse(codec)
+            self.codecs = {}
+            self.indexes = {}
+            self.max_retries = max_retries
+            self.retry_delay = retry_delay
+            self.conflicts = 0
+            self.retries = 0
+            self.failures = 0
+            self.lock = threading.Lock()
+            self.turns = {}
+            self.subscribers = []
+            self.connection = GitHubConnection.shared(token, scheduler, MetadataCache(ttl=metadata_ttl), base_url)
+            self.scheduler = self.connection.scheduler
+            self.mode = mode
+            if mode == 'mirror':
+                from .Mirror import Mirror
+                if not path:
+                    raise ValueError("Mirror mode needs a local 'path' for the clone.")
+                auth = None
+                if remote is None:
+                    remote, auth = self.connection.repo(self.repo).clone_url, self.token
+                self.G = None
+                self.repo = Mirror(remote, path, branch, refresh_interval=refresh_interval, push_batch=push_batch, push_interval=push_interval, connect=connect, token=auth)
+            elif mode == 'api':
+                metadata = self.connection.metadata
+                self.G = GitHubRepoDev(token=self.token, repo_name=self.repo, scheduler=scheduler, connect=connect, base_url=base_url, metadata=metadata)
+                self.repo = GitHubRepo(token=self.token, repo_name=self.repo, scheduler=scheduler, connect=connect, base_url=base_url, metadata=metadata).get_repo()
+            else:
+                raise ValueError(f"Unknown mode '{mode}', expected 'api' or 'mirror'.")
+            self.write_behind = WriteBehind(self, write_behind, flush_interval) if write_behind else None
+            # A mirror already reads blobs from its local object store
+            self.blobs = BlobCache(max_bytes=blob_cache_bytes) if mode == 'api' else None
+            time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            
+            serv = f'''
+= Note ================================================
+Server initialized with:
+[TIME]             [{time}]
+[SERVER]                            [\033[34mON\033[0m]
+[GUITHUB]                    [\033[33mCONNECTED\033[0m]
+[REPOSITORY]                 [\033[33mCONNECTED\033[0m]
+[TOKEN]                      [\033[33mCONNECTED\033[0m]
+=======================================================
+            '''
+            logger.info(serv)
+        except Exception as e:
+            logger.warning(f"Error initializing Server: {e}")
+            raise
+        
+    @prioritized('normal')
+    @unpinned
+    def create_class(self, name):
+        """
+        # Server (CreateClass)
+        Parameters: name (str)
+
+        The purpose of this function is to create a class in the repository.
+        """
+        # Verifica se a pasta já existe
+        try:
+            self.repo.get_contents(f'{name}/', ref=self.branch)
+            logger.info(f"Class '{name}' already exists in the repository '{self.repo}'.")
+            return name
+        except Exception:
+            Folder(self.repo, f'{name}/', self.branch).create()
+            logger.info(f"Class '{name}' created successfully in the repository '{self.repo}'.")
+            return name
+
+    @prioritized('normal')
+    @unpinned
+    def create_table(self, name, clas, shards=None):
+        """
+        # Server (CreateTable)
+        Parameters: name and clas (str, str)
+        Optional: shards (int)
+
+        The purpose of this function is to create a table in the specified class. With `shards`, the rows are
+        stored in '{clas}/{name}/shard_XX.json' files chosen by a hash of the row name, next to a small
+        '_manifest.json', so point reads and writes only touch one shard.
+        """
+        # Verifica se o arquivo já existe
+        try:
+            self._shards(name, clas, fresh=True)
+            logger.info(f"Table '{name}' already exists in class '{clas}' of the repository '{self.repo}'.")
+            return name
+        except GithubException:
+            pass
+        if shards:
+            self._write_shards(name, clas, [{} for _ in range(shards)], f"Creating sharded table '{clas}/{name}'")
+        else:
+            File(self.repo, f'{clas}/{name}.json', self.codec.encode({}),branch=self.branch).create()
+            self.layouts[(clas, name)] = "plain"
+        logger.info(f"Table '{name}' created successfully in class '{clas}' of the repository '{self.repo}'.")
+        return name
+
+    def _shards(self, table, clas, fresh=False):
+        """
+        Returns the shard count of a table, or None for a plain single-file table.
+        Raises GithubException (404) if the table does not exist.
+        """
+        snapshot = self._pinned()
+        if snapshot is not None and not fresh:
+            if self._table_path(table, clas) in snapshot.files:
+                return None
+            return self._read_table(f'{table}/_manifest', clas)[0]["shards"]
+        layout = self.layouts.get((clas, table))
+        if layout is None:
+            try:
+                self._read_table(table, clas, fresh=fresh)
+                self.layouts[(clas, table)] = "plain"
+                return None
+            except GithubException as e:
+                if e.status != 404:
+                    raise
+        elif layout == "plain":
+            return None
+        manifest, _ = self._read_table(f'{table}/_manifest', clas, fresh=fresh)
+        self.layouts[(clas, table)] = "sharded"
+        return manifest["shards"]
+
+    def _parts(self, table, clas, fresh=False):
+        """
+        Returns the cache/table keys holding the rows of a table: the table itself, or one per shard.
+        """
+        shards = self._shards(table, clas, fresh=fresh)
+        if shards is None:
+            return [table]
+        return [self._shard_table(table, index) for index in range(shards)]
+
+    def _write_shards(self, table, clas, parts, message, expect=None):
+        """
+        Writes a whole sharded table (manifest plus one dict per shard) in a single commit,
+        removing any shard files beyond the new count and the plain table file it replaces.
+        The commit fails with a 409 if a path in `expect` changed since it was read.
+        """
+        tree = Tree(self.repo, self.branch)
+        head = tree.head()
+        plain = self._table_path(table, clas)
+        old = [item.path for item in tree.blobs(head[1], [f'{clas}/{table}', plain])]
+        elements = [tree.element(self._table_path(f'{table}/_manifest', clas), JSON.encode({"shards": len(parts), "hash": "crc32"}))]
+        paths = set()
+        for index, DATA in enumerate(parts):
+            part = self._shard_table(table, index)
+            path = self._table_path(part, clas)
+            paths.add(path)
+            elements.append(tree.element(path, self._encode(part, clas, DATA)))
+        for path in old:
+            if (path == plain or path.rsplit("/", 1)[-1].startswith("shard_")) and path not in paths:
+                elements.append(InputGitTreeElement(path, "100644", "blob", sha=None))
+        tree.commit(elements, message, head, expect=expect)
+        self.cache.invalidate(clas=clas, table=table)
+        self.layouts[(clas, table)] = "sharded"
+
+    @prioritized('bulk')
+    @unpinned
+    def reshard(self, table, clas, shards):
+        """
+        # Server (reshard)
+        Parameters: table, clas and shards (str, str, int)
+
+        The purpose of this function is to redistribute the rows of a table over a new number of shards in a single
+        commit. A plain table is converted to the sharded layout; readers keep working while it runs. The commit is
+        conditional on the files that were read, so a write landing meanwhile makes it start over rather than be lost.
+        """
+        def attempt(n):
+            current = self._shards(table, clas, fresh=True)
+            if current == shards:
+                return
+            expect = {}
+            if current is not None:
+                manifest = f'{table}/_manifest'
+                expect[self._table_path(manifest, clas)] = self._read_table(manifest, clas)[1]
+            parts = [{} for _ in range(shards)]
+            for part in self._parts(table, clas):
+                DATA, sha = self._read_table(part, clas, fresh=True)
+                expect[self._table_path(part, clas)] = sha
+                for name, data in DATA.items():
+                    parts[self._shard_of(name, shards)][name] = data
+                if self.codecs.get((clas, part)) == "legacy":
+                    # The new shards are migrated like the legacy table they come from would be
+                    self.codecs.update(((clas, self._shard_table(table, index)), "legacy") for index in range(shards))
+            self._write_shards(table, clas, parts, f"Resharding table '{clas}/{table}' into {shards} shards", expect=expect)
+
+        self._retry(attempt, (clas, table))
+        logger.info(f"Table '{table}' in class '{clas}' resharded into {shards} shards.")
+
+    def _read_table(self, table, clas, fresh=False):
+        """
+        Returns (DATA, sha) for a table, served from the TableCache when possible.
+        `fresh=True` forces a revalidation, which is what every write path uses. Inside a
+        `snapshot` the table is read as of the pinned commit (unless fresh).
+        """
+        snapshot = self._pinned()
+        if snapshot is not None and not fresh:
+            return self._read_pinned(snapshot, table, clas)
+        key = (clas, table, self.branch)
+        entry = self.cache.get(key, fresh=fresh)
+        if entry is not None and entry["data"] is not None:
+            return entry["data"], entry["sha"]
+
+        content = entry["content"] if entry is not None else self.repo.get_contents(self._table_path(table, clas), ref=self.branch)
+        if getattr(content, "encoding", None) == "none":
+            # Too big to be inlined by the Contents API: stream the blob and parse it as it arrives
+            decoder = TableDecoder()
+            for chunk in self._blob(content.sha):
+                decoder.feed(chunk)
+            (DATA, self.codecs[(clas, table)]), size = decoder.close(), content.size
+        else:
+            raw = content.decoded_content
+            (DATA, self.codecs[(clas, table)]), size = Codec.load(raw), len(raw)
+        self.cache.put(key, DATA, content.sha, content, size)
+        return DATA, content.sha
+
+    def _read_pinned(self, snapshot, table, clas):
+        """
+        Returns (DATA, sha) for a table as of the pinned commit, read by blob sha. The cached
+        entry is keyed by that sha and never needs a request to be revalidated.
+        """
+        path = self._table_path(table, clas)
+        sha = snapshot.files.get(path)
+        if sha is None:
+            raise GithubException(404, {"message": f"'{path}' does not exist at commit {snapshot.commit[:7]}"}, None)
+        key = (clas, table, sha)
+        entry = self.cache.get(key)
+        if entry is not None and entry["data"] is not None:
+            return entry["data"], sha
+        decoder, size = TableDecoder(), 0
+        for chunk in self._blob(sha):
+            decoder.feed(chunk)
+            size += len(chunk)
+        DATA = decoder.close()[0]
+        self.cache.put(key, DATA, sha, Immutable(), size)
+        return DATA, sha
+
+    def _blob(self, sha):
+        """
+        Yields the bytes of blob `sha`, through the BlobCache when there is one.
+        """
+        def fetch():
+            return Tree(self.repo, self.branch).read_blob(sha)
+        return fetch() if self.blobs is None else self.blobs.read(sha, fetch)
+
+    def _pinned(self):
+        """
+        Returns the Snapshot this server's reads are pinned to in the current context, or None.
+        """
+        return Snapshot.of(self)
+
+    def _write_table(self, table, clas, DATA, sha):
+        """
+        Writes a whole table in one commit on top of blob `sha` and refreshes the cache.
+        Returns the new blob sha and the encoded size.
+        """
+        raw = self._encode(table, clas, DATA)
+        if len(raw) > CONTENTS_LIMIT:
+            # Large tables are written as a blob and a tree commit, the Contents API only takes small files
+            path = self._table_path(table, clas)
+            tree = Tree(self.repo, self.branch)
+            tree.commit([tree.element(path, raw)], "File updated via PyGithub", expect={path: sha})
+            self.cache.put((clas, table, self.branch), DATA, Tree.blob_sha(raw), None, len(raw))
+            return Tree.blob_sha(raw), len(raw)
+        result = self.repo.update_file(
+            path=self._table_path(table, clas),
+            message="File updated via PyGithub",
+            content=raw,
+            sha=sha,
+            branch=self.branch
+        )
+        content = result["content"]
+        self.cache.put((clas, table, self.branch), DATA, content.sha, content, len(raw))
+        return content.sha, len(raw)
+
+    def cache_stats(self):
+        """
+        # Server (cache_stats)
+
+        The purpose of this function is to report the table cache counters (hits, misses, revalidations,
+        evictions, entries and bytes), and under 'blobs' those of the on-disk BlobCache.
+        """
+        stats = self.cache.stats()
+        if self.blobs is not None:
+            stats["blobs"] = self.blobs.stats()
+        return stats
+
+    def clear_cache(self):
+        """
+        # Server (clear_cache)
+
+        The purpose of this function is to drop every cached table, forcing the next reads to download them again.
+        """
+        self.cache.invalidate()
+
+    @unpinned
+    def _mutate(self, table, clas, rows, apply):
+        """
+        Applies `apply(DATA, name, data)` to each (name, data) row of a table and returns the dict of
+        per-row outcomes: through the WriteBehind buffer when there is one, otherwise written right away.
+        """
+        rows = self._detached(list(rows))
+        self._check_rows(table, clas, rows)
+        if self.write_behind is not None:
+            return self.write_behind.apply(table, clas, rows, apply)
+        return self._commit_rows(table, clas, rows, apply)
+
+    def _check_rows(self, table, clas, rows):
+        """
+        Raises TypeError for a row the codec of its table would not give back unchanged, before anything is
+        written or buffered, so the cache never holds rows a fresh read would not return. Legacy (str(dict))
+        tables take any row: they stay legacy rather than losing data.
+        """
+        shards = self._shards(table, clas)
+        for name, data in rows:
+            part = self._part_of(table, shards, name)
+            known = (clas, part) in self.codecs
+            # A table whose codec is not known yet may be JSON, which takes the fewest types
+            if self._survives(self._codec(part, clas), name, data) and (known or self._survives(JSON, name, data)):
+                continue
+            self._read_table(part, clas)
+            codec = self._codec(part, clas)
+            if self.codecs.get((clas, part)) != "legacy" and not self._survives(codec, name, data):
+                raise self._lossy(table, clas, codec, name)
+
+    def _commit_rows(self, table, clas, rows, apply):
+        """
+        Groups `rows` ((name, data) pairs) by the file holding them, reads each touched file once, lets
+        `apply(DATA, name, data)` change a copy of it and writes it back in a single commit if anything changed.
+        `apply` returns the row outcome; the dict of per-row outcomes is returned.
+
+        Every write is conditional on the sha that was read. When another writer got there first the
+        rows that were not written yet are re-read and re-applied (see `_retry`).
+        """
+        pending = list(rows)
+        outcomes = {}
+        with self.lock:
+            turn = self.turns.setdefault((clas, table), threading.Lock())
+        # Threads of this server take turns on a table instead of conflicting with each other
+        with turn:
+            self._retry(lambda attempt: self._apply_rows(table, clas, pending, apply, outcomes, fresh=attempt > 0), (clas, table))
+        return outcomes
+
+    def _apply_rows(self, table, clas, pending, apply, outcomes, fresh=False):
+        """
+        One attempt of `_commit_rows`. Rows are dropped from `pending` as soon as their file is written.
+        """
+        shards = self._shards(table, clas, fresh=True)
+        fields = self._index_fields(table, clas, fresh=fresh)
+        groups = {}
+        for row in pending:
+            groups.setdefault(self._part_of(table, shards, row[0]), []).append(row)
+
+        writes = {}
+        changes = []
+        sizes = {}
+        for part, items in groups.items():
+            DATA, sha = self._read_table(part, clas, fresh=True)
+            DATA = dict(DATA)
+            for name, data in items:
+                # A copy, so a row changed in place cannot make the indexes miss the change
+                before = self._detached(DATA.get(name))
+                outcomes[name] = apply(DATA, name, data)
+                if outcomes[name] in ("inserted", "updated", "removed"):
+                    changes.append((name, before, DATA.get(name)))
+                    writes[part] = (DATA, sha)
+            if not fields:
+                if part in writes:
+                    sizes[part] = self._write_table(part, clas, DATA, sha)[1]
+                done = set(map(id, items))
+                pending[:] = [row for row in pending if id(row) not in done]
+
+        if fields and writes:
+            writes.update(self._index_updates(table, clas, fields, changes))
+            sizes = self._write_files(clas, writes, f"Updating table '{clas}/{table}'")
+        pending.clear()
+        if shards is not None and any(size > self.shard_max_bytes for part, size in sizes.items() if part.startswith(f"{table}/shard_")):
+            try:
+                self.reshard(table, clas, shards * 2)
+            except GithubException as e:
+                # The rows are written; growing the table is left to a later write
+                if e.status != 409:
+                    raise
+                logger.warning(f"Resharding table '{clas}/{table}' kept conflicting, it will be tried again on a later write.")
+
+    def _retry(self, attempt, layout=None):
+        """
+        Runs `attempt(n)` until it stops failing with a 409 conflict, sleeping a jittered exponential
+        backoff between tries (capped, so a writer that keeps losing keeps trying at a steady pace), up to
+        `max_retries` retries. Conflicts and retries are counted in `write_stats`.
+        A 404 on table `layout` ((class, table)) while it is known as plain is a conflict too: another
+        server resharded it since, so its layout is forgotten and read again.
+        """
+        for n in range(self.max_retries + 1):
+            try:
+                return attempt(n)
+            except GithubException as e:
+                resharded = e.status == 404 and layout is not None and self.layouts.pop(layout, None) == "plain"
+                if e.status != 409 and not resharded:
+                    raise
+                with self.lock:
+                    self.conflicts += 1
+                if n == self.max_retries:
+                    with self.lock:
+                        self.failures += 1
+                    raise
+                with self.lock:
+                    self.retries += 1
+                time.sleep(random.uniform(0, self.retry_delay * 2 ** min(n, 4)))
+
+    def write_stats(self):
+        """
+        # Server (write_stats)
+
+        The purpose of this function is to report the optimistic concurrency counters: write conflicts detected,
+        retries made and writes that gave up after `max_retries`; with write_behind, also the writes still buffered
+        and the flushes made.
+        """
+        with self.lock:
+            stats = {"conflicts": self.conflicts, "retries": self.retries, "failures": self.failures}
+        if self.write_behind is not None:
+            stats.update(self.write_behind.stats())
+        return stats
+
+    @prioritized('normal')
+    @unpinned
+    def flush(self):
+        """
+        # Server (flush)
+
+        The purpose of this function is to commit the row writes buffered by write_behind, blocking until they are
+        written. Raises the first error of the buffered writes that failed since the last flush. Without
+        write_behind every write is already committed and it does nothing.
+        """
+        if self.write_behind is not None:
+            self.write_behind.flush()
+
+    @unpinned
+    def close(self):
+        """
+        # Server (close)
+
+        The purpose of this function is to release what the server keeps running: it flushes and stops the
+        write_behind buffer and, in mirror mode, pushes what is left and stops the mirror's refresh. Servers that
+        are not closed are closed at interpreter exit.
+        """
+        if self.write_behind is not None:
+            self.write_behind.close()
+        if self.mode == 'mirror':
+            self.repo.close()
+
+    def _pending(self, table, clas):
+        """
+        Returns the buffered rows of a table that are not written yet, {name: row or WriteBehind.REMOVED}.
+        Reads inside a `snapshot` see the pinned commit only.
+        """
+        if self.write_behind is None or self._pinned() is not None:
+            return {}
+        return self.write_behind.view(table, clas)
+
+    def refresh(self):
+        """
+        # Server (refresh)
+
+        The purpose of this function is to bring the server up to date with the repository now: in mirror mode the
+        branch is fetched and local commits are pushed; either way cached tables and layouts are read again.
+        """
+        if self.mode == 'mirror':
+            self.repo.refresh()
+        self.cache.invalidate()
+        self.layouts.clear()
+        self.indexes.clear()
+
+    def push(self):
+        """
+        # Server (push)
+
+        The purpose of this function is to push the commits a mirror is holding without waiting for the next batch.
+        Writes made through the API are already on GitHub, so it does nothing outside mirror mode.
+        """
+        if self.mode == 'mirror':
+            self.repo.push()
+
+    def head_commit(self):
+        """
+        # Server (head_commit)
+
+        The purpose of this function is to return the sha of the latest commit of the branch: the point to pass
+        to `changes_since` next time.
+        """
+        return self.repo.get_git_ref(f"heads/{self.branch}").object.sha
+
+    @contextlib.contextmanager
+    def snapshot(self, ref=None):
+        """
+        # Server (snapshot)
+        Optional: ref (str: a commit sha or a branch name, default: the head of the branch)
+
+        The purpose of this function is to read several tables as of one commit. Inside the `with` block every read of
+        this server in the same thread (get_data, search_data, find_by, find_range, query, list_classes, list_tables)
+        is served from the tree of that commit, so writers committing in the meantime never show up half-way. Tables
+        are fetched by blob sha through the on-disk BlobCache and cached without revalidation. Writes of this server
+        (row writes, flush, creating or removing classes, tables and indexes, reshard, import_) raise RuntimeError
+        inside the block, since they would be based on the pinned rows. Yields the pinned commit sha.
+
+            with S.snapshot() as commit:
+                orders, users = S.get_data('orders', 'shop'), S.get_data('users', 'shop')
+        """
+        snapshot = self._pin(ref)
+        token = Snapshot.pin(self, snapshot)
+        try:
+            yield snapshot.commit
+        finally:
+            Snapshot.current.reset(token)
+
+    @prioritized('interactive', 'snapshot')
+    def _pin(self, ref=None):
+        """
+        Returns the Snapshot of commit or branch `ref`: one tree listing, cached by tree sha.
+        """
+        if ref is None or not re.fullmatch(r"[0-9a-f]{40}", ref):
+            ref = self.repo.get_git_ref(f"heads/{ref or self.branch}").object.sha
+        tree = self.repo.get_git_commit(ref).tree.sha
+        files = {item.path: item.sha for item in TreeWalker(self.repo).walk(tree) if item.type == "blob"}
+        return Snapshot(self, ref, tree, files)
+
+    def _tree(self):
+        """
+        Returns the sha of the tree listings are made from: the pinned commit's in a snapshot, the branch head's otherwise.
+        """
+        snapshot = self._pinned()
+        return snapshot.tree if snapshot is not None else Tree(self.repo, self.branch).head()[1].tree.sha
+
+    def changes_since(self, commit_sha, head=None, rows=True):
+        """
+        # Server (changes_since)
+        Parameters: commit_sha (str)
+        Optional: head (str, default: the branch head) and rows (bool)
+
+        The purpose of this function is to tell what changed between two commits without reading every table. It
+        yields one TableChange (clas, table, rows, commit) per table written since `commit_sha`, `rows` mapping each
+        changed row name to 'added', 'updated' or 'removed'. Only the changed files of those tables are read, one
+        blob each side; rows=False reads none and yields rows=None. The changed files come from one compare
+        request (past its 300 files, from the two tree listings). Changed tables are dropped from the cache.
+
+            head = S.head_commit()
+            for change in S.changes_since(last_seen, head):
+                ...
+            last_seen = head
+        """
+        head, changed = self._compare(commit_sha, head)
+        self._forget_paths(changed)
+        base = None
+        for (clas, table), parts in self._changed_tables(changed).items():
+            if not rows:
+                yield TableChange(clas, table, None, head)
+                continue
+            if base is None:
+                base = self._blob_shas(commit_sha)
+            yield TableChange(clas, table, self._table_diff(parts, base, changed), head)
+
+    @prioritized('normal', 'changes_since')
+    def _compare(self, base, head=None):
+        """
+        Returns (head, {path: blob sha at head, None if removed}) of the files changed from `base` to `head`.
+        """
+        head = head or self.head_commit()
+        if head == base:
+            return head, {}
+        files = self.repo.compare(base, head).files
+        if len(files) < COMPARE_FILES_LIMIT:
+            changed = {}
+            for file in files:
+                if file.status == "renamed" and file.previous_filename:
+                    changed[file.previous_filename] = None
+                changed[file.filename] = None if file.status == "removed" else file.sha
+            return head, changed
+        old, new = self._blob_shas(base), self._blob_shas(head)
+        return head, {path: new.get(path) for path in old.keys() | new.keys() if old.get(path) != new.get(path)}
+
+    @prioritized('bulk')
+    def export(self, path, commit=None):
+        """
+        # Server (export)
+        Parameters: path (str)
+        Optional: commit (str, default: the head of the branch)
+
+        The purpose of this function is to back up the whole database in one request: the branch (inside a `snapshot`,
+        its commit) is downloaded as a gzipped tarball and streamed to the file `path` as it arrives, never held in
+        memory. Buffered writes are flushed first, unless a snapshot is pinned: they are not part of its commit anyway.
+        Returns the sha of the exported commit; `import_` loads the file back.
+        """
+        pinned = self._pinned()
+        if pinned is None:
+            self.flush()
+        commit = commit or (pinned.commit if pinned is not None else self.head_commit())
+        partial, size = f"{path}.part", 0
+        try:
+            with open(partial, "wb") as file:
+                for chunk in Tree(self.repo, self.branch).read_archive(commit):
+                    file.write(chunk)
+                    size += len(chunk)
+            os.replace(partial, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(partial)
+            raise
+        logger.info(f"Commit {commit[:7]} of '{self.branch}' exported to '{path}' ({size} bytes).")
+        return commit
+
+    @prioritized('bulk')
+    @unpinned
+    def import_(self, path, message=None, replace=False):
+        """
+        # Server (import_)
+        Parameters: path (str)
+        Optional: message (str) and replace (bool)
+
+        The purpose of this function is to load a snapshot written by `export` (any tarball of the repository, its
+        files under one top folder) into the branch as a single commit. The archive is read one file at a time: each
+        file is uploaded as a blob unless the branch already holds it, and only paths and blob shas are kept until
+        the tree and the commit are created. With replace=True the files of the branch missing from the snapshot
+        are deleted too, so the branch matches it exactly. Returns the sha of the new commit, None when nothing changed.
+        """
+        self.flush()
+        tree = Tree(self.repo, self.branch)
+        head = tree.head()
+        current = {item.path: item.sha for item in tree.blobs(head[1])}
+        elements, seen = [], set()
+        with tarfile.open(path, "r|*") as archive:
+            for member in archive:
+                target = member.name.split("/", 1)[-1] if "/" in member.name else ""
+                if not member.isfile() or not target:
+                    continue
+                data = archive.extractfile(member).read()
+                seen.add(target)
+                if current.get(target) != Tree.blob_sha(data):
+                    elements.append(tree.element(target, data, inline=False))
+        if replace:
+            elements += [InputGitTreeElement(target, "100644", "blob", sha=None) for target in current if target not in seen]
+        if not elements:
+            logger.info(f"Snapshot '{path}' already matches '{self.branch}', nothing imported.")
+            return None
+        commit = tree.commit(elements, message or f"Importing snapshot '{os.path.basename(path)}'", head)
+        self.cache.invalidate()
+        self.layouts.clear()
+        self.indexes.clear()
+        logger.info(f"Snapshot '{path}' imported into '{self.branch}': {len(elements)} files changed in commit {commit[:7]}.")
+        return commit
+
+    def _blob_shas(self, commit_sha):
+        items = TreeWalker(self.repo).walk(self.repo.get_git_commit(commit_sha).tree.sha)
+        return {item.path: item.sha for item in items if item.type == "blob"}
+
+    @prioritized('normal', 'changes_since_rows')
+    def _table_diff(self, parts, base, changed):
+        """
+        Returns the row changes of one table from the blobs its changed `parts` had before (`base`) and after (`changed`).
+        """
+        old, new = {}, {}
+        for path in parts:
+            if base.get(path):
+                old.update(self._blob_rows(base[path]))
+            if changed.get(path):
+                new.update(self._blob_rows(changed[path]))
+        return self._row_changes(old, new)
+
+    def _blob_rows(self, sha):
+        decoder = TableDecoder()
+        for chunk in self._blob(sha):
+            decoder.feed(chunk)
+        return decoder.close()[0]
+
+    def subscribe(self, callback, clas=None, table=None):
+        """
+        # Server (subscribe)
+        Parameters: callback (callable taking a TableChange)
+        Optional: clas and table (str, str)
+
+        The purpose of this function is to be told when tables change upstream: `callback` is called with a
+        TableChange for each table written by a push the server hears of (see `handle_push` and `listen`), only for
+        class `clas` and table `table` when they are given. Returns the callback, to pass to `unsubscribe`.
+        """
+        self.subscribers.append((callback, clas, table))
+        return callback
+
+    def unsubscribe(self, callback):
+        """
+        # Server (unsubscribe)
+        Parameters: callback (callable)
+
+        The purpose of this function is to stop calling a callback given to `subscribe`.
+        """
+        self.subscribers = [subscriber for subscriber in self.subscribers if subscriber[0] is not callback]
+
+    def _publish(self, change):
+        for callback, clas, table in list(self.subscribers):
+            if (clas is None or clas == change.clas) and (table is None or table == change.table):
+                try:
+                    callback(change)
+                except Exception as e:
+                    logger.warning(f"Subscriber {callback!r} failed on table '{change.table}' in class '{change.clas}': {e}")
+
+    def handle_push(self, payload, rows=False):
+        """
+        # Server (handle_push)
+        Parameters: payload (dict, the body of a GitHub 'push' webhook event)
+        Optional: rows (bool)
+
+        The purpose of this function is to apply a push made to the repository by anyone: the tables it wrote are
+        dropped from the cache and the subscribers (see `subscribe`) are called with one TableChange each. The file
+        lists of the event are used as they are, without any request; with rows=True, or when the event does not
+        list every file (a forced push, or more than 20 commits), the changes are read with `changes_since`.
+        In mirror mode the branch is fetched first. Returns the changes.
+        """
+        if payload.get("ref") != f"refs/heads/{self.branch}" or payload.get("deleted"):
+            return []
+        if self.mode == 'mirror':
+            self.repo.refresh()
+        before, after = payload.get("before") or "", payload["after"]
+        commits = payload.get("commits") or []
+        created = set(before) <= {"0"}
+        if not created and (rows or payload.get("forced") or len(commits) >= 20):
+            changes = list(self.changes_since(before, after, rows=rows))
+        else:
+            paths = {path for commit in commits for key in ("added", "modified", "removed") for path in commit.get(key, [])}
+            self._forget_paths(paths)
+            changes = [TableChange(clas, table, None, after) for clas, table in self._changed_tables(paths)]
+        for change in changes:
+            self._publish(change)
+        return changes
+
+    def listen(self, port=8000, host="127.0.0.1", path="/", secret=None, rows=False):
+        """
+        # Server (listen)
+        Optional: port (int), host (str), path (str), secret (str) and rows (bool)
+
+        The purpose of this function is to receive the repository's webhook: it starts a WebhookReceiver on
+        `host`:`port` that hands every push to `handle_push` (with `rows`). Create the hook with the same `secret`,
+        e.g. S.G.create_hook({"url": "https://HOST:PORT/", "content_type": "json", "secret": secret}).
+        It listens on 127.0.0.1 unless told otherwise, and any other host (e.g. "0.0.0.0") raises ValueError
+        without a `secret`. Returns the receiver; `stop()` it when done.
+        """
+        return WebhookReceiver(self, host, port, path, secret, rows).start()
+
+    def scheduler_stats(self):
+        """
+        # Server (scheduler_stats)
+
+        The purpose of this function is to report the request scheduler counters: requests sent, rate limited
+        responses, seconds spent waiting for a turn, the last known remaining quota and requests queued now.
+        """
+        return self.scheduler.stats()
+
+    def metrics_stats(self):
+        """
+        # Server (metrics_stats)
+
+        The purpose of this function is to report, per operation, how many calls were made and what they cost:
+        API requests, bytes sent and received, commits, cache hits and misses, and latency percentiles.
+        """
+        return self.metrics.snapshot()
+
+    def metrics_text(self):
+        """
+        # Server (metrics_text)
+
+        The purpose of this function is to dump the same counters and the latency histograms in the Prometheus
+        text format, ready to be served on a /metrics endpoint.
+        """
+        return self.metrics.prometheus()
+
+    def _write_files(self, clas, parts, message, expect=None):
+        """
+        Writes several tables of a class in a single tree commit. `parts` maps each table key to
+        (DATA, sha read), DATA None deleting it; the commit fails with a 409 if any of them (or any
+        extra path in `expect`) changed since it was read. Returns the encoded size of each table.
+        """
+        tree = Tree(self.repo, self.branch)
+        head = tree.head()
+        elements = []
+        expect = dict(expect or {})
+        encoded = {}
+        for part, (DATA, sha) in parts.items():
+            path = self._table_path(part, clas)
+            expect[path] = sha
+            if DATA is None:
+                elements.append(InputGitTreeElement(path, "100644", "blob", sha=None))
+                continue
+            encoded[part] = self._encode(part, clas, DATA)
+            elements.append(tree.element(path, encoded[part]))
+        tree.commit(elements, message, head, expect=expect)
+
+        for part, (DATA, _) in parts.items():
+            if DATA is None:
+                self.cache.invalidate((clas, part, self.branch))
+            else:
+                raw = encoded[part]
+                self.cache.put((clas, part, self.branch), DATA, Tree.blob_sha(raw), None, len(raw))
+        return {part: len(raw) for part, raw in encoded.items()}
+
+    # === Indexes ===
+    def _index_fields(self, table, clas, fresh=False):
+        """
+        Returns the indexed fields of a table ([] when it has none). The answer is remembered for
+        the cache TTL so writes to tables without indexes don't pay an extra request.
+        """
+        snapshot = self._pinned()
+        if snapshot is not None and not fresh:
+            if self._table_path(self._index_part(table), clas) not in snapshot.files:
+                return []
+            return self._read_table(self._index_part(table), clas)[0]["fields"]
+        known = self.indexes.get((clas, table))
+        if known is not None and not fresh and (self.cache.ttl is None or time.monotonic() - known[1] < self.cache.ttl):
+            return known[0]
+        try:
+            fields = self._read_table(self._index_part(table), clas, fresh=fresh)[0]["fields"]
+        except GithubException as e:
+            if e.status != 404:
+                raise
+            fields = []
+        self.indexes[(clas, table)] = (fields, time.monotonic())
+        return fields
+
+    def _index_updates(self, table, clas, fields, changes):
+        """
+        Applies row changes ((name, before, after) triples) to every index of a table.
+        Returns the index tables to write, as (data, sha) by table key.
+        """
+        updates = {}
+        for field in fields:
+            part = self._index_part(table, field)
+            data, sha = self._read_table(part, clas, fresh=True)
+            index = Index.from_data(data).copy()
+            for name, before, after in changes:
+                old = Index.value_of(field, before)
+                new = Index.value_of(field, after)
+                if old == new:
+                    continue
+                if old[0]:
+                    index.remove(old[1], name)
+                if new[0]:
+                    index.add(new[1], name)
+            updates[part] = (index.to_data(), sha)
+        return updates
+
+    @prioritized('bulk')
+    @unpinned
+    def create_index(self, table, clas, field):
+        """
+        # Server (create_index)
+        Parameters: table, clas and field (str, str, str)
+
+        The purpose of this function is to index a row field of a table, so `find_by` and `find_range` can look rows up
+        by that field without scanning the table. The index is stored in '{clas}/_indexes/{table}/{field}.json' (the
+        field name percent-encoded) and is kept in sync by every insert, update and remove. Lookups only use it on
+        sharded tables, where it spares reading the other shards: a plain table is one file, scanned from the cache.
+        """
+        self._index_part(table, field)
+
+        def attempt(n):
+            fields = self._index_fields(table, clas, fresh=True)
+            if field in fields:
+                return False
+            expect = {}
+            rows = []
+            for part in self._parts(table, clas, fresh=True):
+                DATA, sha = self._read_table(part, clas, fresh=True)
+                expect[self._table_path(part, clas)] = sha
+                rows.extend(DATA.items())
+            registry_sha = self._read_table(self._index_part(table), clas)[1] if fields else None
+            self._write_files(clas, {
+                self._index_part(table): ({"fields": fields + [field]}, registry_sha),
+                self._index_part(table, field): (Index.build(field, rows).to_data(), None),
+            }, f"Creating index on '{field}' for table '{clas}/{table}'", expect=expect)
+            self.indexes[(clas, table)] = (fields + [field], time.monotonic())
+            return True
+
+        if not self._retry(attempt):
+            logger.info(f"Index on '{field}' already exists in table '{table}' in class '{clas}'.")
+            return field
+        logger.info(f"Index on '{field}' created successfully in table '{table}' in class '{clas}' of the repository '{self.repo}'.")
+        return field
+
+    @prioritized('normal')
+    @unpinned
+    def remove_index(self, table, clas, field):
+        """
+        # Server (remove_index)
+        Parameters: table, clas and field (str, str, str)
+
+        The purpose of this function is to drop the index of a row field of a table.
+        """
+        def attempt(n):
+            fields = self._index_fields(table, clas, fresh=True)
+            if field not in fields:
+                return False
+            rest = [f for f in fields if f != field]
+            self._write_files(clas, {
+                self._index_part(table): ({"fields": rest} if rest else None, self._read_table(self._index_part(table), clas)[1]),
+                self._index_part(table, field): (None, self._read_table(self._index_part(table, field), clas, fresh=True)[1]),
+            }, f"Removing index on '{field}' for table '{clas}/{table}'")
+            self.indexes[(clas, table)] = (rest, time.monotonic())
+            return True
+
+        if not self._retry(attempt):
+            logger.info(f"Index on '{field}' does not exist in table '{table}' in class '{clas}'.")
+            return
+        logger.info(f"Index on '{field}' removed successfully from table '{table}' in class '{clas}'.")
+
+    def _find(self, table, clas, field, lookup, match):
+        """
+        Returns the rows selected by `lookup(index)` when `field` is indexed on a sharded table, otherwise
+        the rows of a full scan whose field value satisfies `match(value)`. A plain table is a single
+        file the scan reads anyway, so its index is not downloaded. Buffered writes are matched on top.
+        """
+        shards = self._shards(table, clas)
+        found = {}
+        if shards is None or field not in self._index_fields(table, clas):
+            for part in self._parts(table, clas):
+                for name, row in self._read_table(part, clas)[0].items():
+                    has, value = Index.value_of(field, row)
+                    if has and match(value):
+                        found[name] = row
+        else:
+            index = Index.from_data(self._read_table(self._index_part(table, field), clas)[0])
+            groups = {}
+            for name in lookup(index):
+                groups.setdefault(self._part_of(table, shards, name), []).append(name)
+            for part, names in groups.items():
+                DATA, _ = self._read_table(part, clas)
+                found.update((name, DATA[name]) for name in names if name in DATA)
+
+        for name, row in self._pending(table, clas).items():
+            has, value = Index.value_of(field, row) if row is not WriteBehind.REMOVED else (False, None)
+            if has and match(value):
+                found[name] = row
+            else:
+                found.pop(name, None)
+        return self._detached(found)
+
+    @prioritized('interactive')
+    def find_by(self, table, clas, field, value):
+        """
+        # Server (find_by)
+        Parameters: table, clas, field and value (str, str, str, any)
+
+        The purpose of this function is to find the rows of a table whose `field` equals `value`, using the field's
+        index when the table is sharded and has one. Returns a dict of name -> row.
+        """
+        key = Index.key(value)
+        found = self._find(table, clas, field, lambda index: index.find(value), lambda v: Index.key(v) == key)
+        logger.info(f"{len(found)} rows with '{field}' == {value!r} found in table '{table}' in class '{clas}'.")
+        return found
+
+    @prioritized('interactive')
+    def find_range(self, table, clas, field, low=None, high=None):
+        """
+        # Server (find_range)
+        Parameters: table, clas, field (str, str, str), low and high (any, optional)
+
+        The purpose of this function is to find the rows of a table whose `field` is between `low` and `high`
+        (inclusive, None meaning unbounded), using the field's index when the table is sharded and has one. Returns a
+        dict of name -> row.
+        """
+        def match(value):
+            return (low is None or Index.key(value) >= Index.key(low)) and (high is None or Index.key(value) <= Index.key(high))
+
+        found = self._find(table, clas, field, lambda index: index.range(low, high), match)
+        logger.info(f"{len(found)} rows with {low!r} <= '{field}' <= {high!r} found in table '{table}' in class '{clas}'.")
+        return found
+
+    def query(self, table, clas, where=None, select=None, order_by=None, limit=None, offset=0, cursor=None):
+        """
+        # Server (query)
+        Parameters: table, clas (str, str), where (dict or callable), select (list), order_by (str), limit, offset
+        (int) and cursor (str, optional)
+
+        The purpose of this function is to go through the rows of a table matching `where`, keeping the `select` fields,
+        as a generator of (name, row). Rows are matched while the table is parsed and its parts are only read as far
+        as the generator is consumed, so stopping early never loads the whole table; a condition on an indexed field
+        only reads the shards holding the rows it selects. See Query for the conditions and `query_page` for pages.
+        """
+        plan = Query(where, select, order_by, limit, offset, cursor)
+        return ((name, self._detached(row)) for _, name, row in self._measured("query", "interactive", self._query(table, clas, plan), self._pinned()))
+
+    @prioritized('interactive', 'query')
+    def query_page(self, table, clas, size=50, cursor=None, where=None, select=None, order_by=None):
+        """
+        # Server (query_page)
+        Parameters: table, clas (str, str), size (int), cursor (str), where, select and order_by (optional)
+
+        The purpose of this function is to read one page of `size` rows of a query (see `query`), starting after
+        `cursor`. Returns (rows, cursor of the next page), rows being a dict of name -> row and the cursor None after
+        the last page. Unordered pages stop reading the table as soon as the page is full.
+        """
+        if size < 1:
+            raise ValueError("The page size must be at least 1.")
+        page = list(self._query(table, clas, Query(where, select, order_by, size + 1, 0, cursor)))
+        following = page[size - 1][0] if len(page) > size else None
+        return self._detached({name: row for _, name, row in page[:size]}), following
+
+    def _measured(self, operation, priority, items, snapshot=None):
+        """
+        Yields from generator `items` as one operation at a scheduler priority, like `prioritized`
+        but only while the generator runs: the consumer's work between items is neither timed nor
+        charged to the operation, and requests made by a lazy read are. The generator keeps reading
+        from `snapshot`, the one open where it was created, even if it is consumed after.
+        """
+        if Metrics.current.get() is not None:
+            pinned = Snapshot.pin(self, snapshot)
+            try:
+                yield from items
+            finally:
+                Snapshot.current.reset(pinned)
+            return
+        measured, seconds, error = Operation(self.metrics, operation), 0.0, None
+        try:
+            while True:
+                start = time.perf_counter()
+                with self.scheduler.priority(priority):
+                    token, pinned = Metrics.current.set(measured), Snapshot.pin(self, snapshot)
+                    try:
+                        item = next(items, None)
+                    finally:
+                        Snapshot.current.reset(pinned)
+                        Metrics.current.reset(token)
+                        seconds += time.perf_counter() - start
+                if item is None:
+                    return
+                yield item
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            items.close()
+            self.metrics.finish(measured, seconds, error)
+
+    def _query(self, table, clas, plan):
+        """
+        Yields (cursor, name, row) for a compiled Query, reading only the parts it may need.
+        """
+        parts = list(enumerate(self._parts(table, clas)))
+        shards = self._shards(table, clas)
+        found = plan.lookup(self._index_fields(table, clas)) if plan.conditions and shards is not None else None
+        pending = self._pending(table, clas)
+        candidates, count = None, len(parts)
+        if found is not None:
+            field, lookup = found
+            candidates = set(lookup(Index.from_data(self._read_table(self._index_part(table, field), clas)[0]))) | pending.keys()
+            wanted = {self._part_of(table, shards, name) for name in candidates}
+            parts = [(number, part) for number, part in parts if part in wanted]
+
+        def overlay(rows, seen):
+            for name, row in rows:
+                if name in pending:
+                    seen.add(name)
+                    row = pending[name]
+                    if row is WriteBehind.REMOVED:
+                        continue
+                yield name, row
+
+        def read():
+            seen = set()
+            for number, part in parts:
+                rows = self._scan(part, clas)
+                if candidates is not None:
+                    rows = ((name, row) for name, row in rows if name in candidates)
+                yield number, overlay(rows, seen) if pending else rows
+            if pending:
+                # Buffered rows that are not stored yet come after the stored ones
+                yield count, [(name, row) for name, row in pending.items() if name not in seen and row is not WriteBehind.REMOVED]
+
+        yield from plan.run(read())
+
+    def _scan(self, part, clas):
+        """
+        Yields the (name, row) of a table part: from the cache, from the Contents API payload, or,
+        for files over its limit, as they are parsed from the blob stream without keeping the table.
+        """
+        snapshot = self._pinned()
+        if snapshot is not None:
+            yield from self._read_pinned(snapshot, part, clas)[0].items()
+            return
+        key = (clas, part, self.branch)
+        entry = self.cache.get(key)
+        if entry is not None and entry["data"] is not None:
+            yield from list(entry["data"].items())
+            return
+        content = entry["content"] if entry is not None else self.repo.get_contents(self._table_path(part, clas), ref=self.branch)
+        if getattr(content, "encoding", None) != "none":
+            raw = content.decoded_content
+            DATA, self.codecs[(clas, part)] = Codec.load(raw)
+            self.cache.put(key, DATA, content.sha, content, len(raw))
+            yield from DATA.items()
+            return
+        decoder = TableDecoder()
+        for chunk in self._blob(content.sha):
+            decoder.feed(chunk)
+            yield from decoder.drain()
+        DATA, self.codecs[(clas, part)] = decoder.close()
+        yield from DATA.items()
+
+    @prioritized('normal')
+    def insert_data(self, table, clas, name,  data):
+        """
+        # Server (insert_data_table)
+        Parameters: table, clas, name and data (str, str, str, dict)
+
+        The purpose of this function is to insert data into a specified table.
+        """
+        if self.insert_many(table, clas, [(name, data)], report=False)[name] == "exists":
+            logger.info(f"Data with name '{name}' already exists in table '{table}'.")
+            return
+        logger.info(f"Data inserted successfully into table '{table}' in class '{clas}' of the repository '{self.repo}'.")
+        
+    @prioritized('normal')
+    def remove_data(self, table, clas, name):
+        """
+        # Server (remove_data_table)
+        Parameters: table, clas and name (str, str, str)
+
+        The purpose of this function is to remove data from a specified table.
+        """
+        if self.remove_many(table, clas, [name], report=False)[name] == "missing":
+            logger.info(f"Data with name '{name}' does not exist in table '{table}'.")
+            return
+        logger.info(f"Data with name '{name}' removed successfully from table '{table}' in class '{clas}' of the repository '{self.repo}'.")
+        
+        
+    @prioritized('normal')
+    def update_data(self, table, clas, name, data):
+        """
+        # Server (update_data)
+        Parameters: table, clas, name, data (str, str, str, dict)
+
+        The purpose of this function is to update data for a specific entry in a given table.
+        """
+        if self.update_many(table, clas, [(name, data)], report=False)[name] == "missing":
+            logger.info(f"Data with name '{name}' does not exist in table '{table}'.")
+            return
+        logger.info(f"Data with name '{name}' updated successfully in table '{table}' in class '{clas}' of the repository '{self.repo}'.")
+
+    @prioritized('bulk')
+    def insert_many(self, table, clas, rows, report=True):
+        """
+        # Server (insert_many)
+        Parameters: table, clas and rows (str, str, iterable of (name, data) or dict)
+
+        The purpose of this function is to insert many rows into a table with a single read and a single commit per table
+        (per touched shard for sharded tables).
+        Returns a dict mapping each name to 'inserted' or 'exists'.
+        """
+        def apply(DATA, name, data):
+            if name in DATA:
+                return "exists"
+            DATA[name] = data
+            return "inserted"
+
+        outcomes = self._mutate(table, clas, self._rows(rows), apply)
+        if report:
+            self._report("inserted", table, clas, outcomes)
+        return outcomes
+
+    @prioritized('bulk')
+    def update_many(self, table, clas, rows, report=True):
+        """
+        # Server (update_many)
+        Parameters: table, clas and rows (str, str, iterable of (name, data) or dict)
+
+        The purpose of this function is to update many existing rows of a table with a single read and a single commit per table
+        (per touched shard for sharded tables).
+        Returns a dict mapping each name to 'updated' or 'missing'.
+        """
+        def apply(DATA, name, data):
+            if name not in DATA:
+                return "missing"
+            DATA[name] = data
+            return "updated"
+
+        outcomes = self._mutate(table, clas, self._rows(rows), apply)
+        if report:
+            self._report("updated", table, clas, outcomes)
+        return outcomes
+
+    @prioritized('bulk')
+    def remove_many(self, table, clas, names, report=True):
+        """
+        # Server (remove_many)
+        Parameters: table, clas and names (str, str, iterable of str)
+
+        The purpose of this function is to remove many rows from a table with a single read and a single commit per table
+        (per touched shard for sharded tables).
+        Returns a dict mapping each name to 'removed' or 'missing'.
+        """
+        def apply(DATA, name, data):
+            if name not in DATA:
+                return "missing"
+            del DATA[name]
+            return "removed"
+
+        outcomes = self._mutate(table, clas, [(name, None) for name in names], apply)
+        if report:
+            self._report("removed", table, clas, outcomes)
+        return outcomes
+
+    @prioritized('interactive')
+    def get_data(self, table, clas):
+        """
+        # Server (get_data)
+        Parameters: table, clas (str, str)
+
+        The purpose of this function is to retrieve all data from a specified table in a given class.
+        """
+        DATA = {}
+        for part in self._parts(table, clas):
+            DATA.update(self._read_table(part, clas)[0])
+        for name, row in self._pending(table, clas).items():
+            if row is WriteBehind.REMOVED:
+                DATA.pop(name, None)
+            else:
+                DATA[name] = row
+        logger.info(f"{len(DATA)} rows read from table '{table}' in class '{clas}' of the repository '{self.repo}'.")
+        return self._detached(DATA)
+    
+    @prioritized('interactive')
+    def search_data(self, table, clas, name):
+        """
+        # Server (search_data)
+        Parameters: table, clas, name (str, str, str)
+
+        The purpose of this function is to search for a specific entry by name in a given table and class.
+        """
+        pending = self._pending(table, clas)
+        if name in pending:
+            DATA = {} if pending[name] is WriteBehind.REMOVED else {name: pending[name]}
+        else:
+            DATA, _ = self._read_table(self._part_of(table, self._shards(table, clas), name), clas)
+        if name not in DATA:
+            logger.info(f"Data with name '{name}' does not exist in table '{table}'.")
+            return
+        logger.info(f"Data with name '{name}' found in table '{table}' in class '{clas}' of the repository '{self.repo}'.")
+        return self._detached(DATA[name])
+
+
+    @prioritized('interactive')
+    def list_classes(self):
+        """
+        # Server (list_classes)
+
+        The purpose of this function is to list the classes (top-level folders) of the repository.
+        """
+        items = TreeWalker(self.repo).walk(self._tree())
+        return sorted(name for name, kind in TreeWalker.children(items) if kind == "tree")
+
+    @prioritized('interactive')
+    def list_tables(self, clas):
+        """
+        # Server (list_tables)
+        Parameters: clas (str)
+
+        The purpose of this function is to list the tables of a class, sharded tables included.
+        """
+        items = TreeWalker(self.repo).walk(self._tree())
+        return self._tables_in(items, clas)
+
+    @prioritized('normal')
+    @unpinned
+    def remove_table(self, clas, table):
+        """
+        # Server (remove_table)
+        Parameters: clas and table (str, str)
+
+        The purpose of this function is to remove a specified table (JSON file) from a given class (folder) in the repository.
+        """
+        if self.write_behind is not None:
+            self.write_behind.discard(clas, table)
+        sharded = self._shards(table, clas, fresh=True) is not None
+        if self._index_fields(table, clas, fresh=True):
+            path = f'{clas}/{table}' if sharded else self._table_path(table, clas)
+            Tree(self.repo, self.branch).delete([path, f'{clas}/_indexes/{table}'], message=f"Deleting table '{clas}/{table}' and its indexes")
+        elif sharded:
+            Tree(self.repo, self.branch).delete(f'{clas}/{table}', message=f"Deleting sharded table '{clas}/{table}'")
+        else:
+            File(self.repo, f'{clas}/{table}.json', '{}',branch=self.branch).delete()
+        self._forget(clas, table)
+        logger.info(f"Table '{table}' removed successfully from class '{clas}' in the repository '{self.repo}'.")
+                
+    @prioritized('normal')
+    @unpinned
+    def remove_class(self, clas):
+        """
+        # Server (remove_class)
+        Parameters: clas (str)
+
+        The purpose of this function is to remove a specified class (folder) and all its contents from the repository.
+        """
+        if self.write_behind is not None:
+            self.write_behind.discard(clas)
+        Folder(self.repo, f'{clas}/', self.branch).delete()
+        self.cache.invalidate(clas=clas)
+        self.layouts = {key: layout for key, layout in self.layouts.items() if key[0] != clas}
+        self.indexes = {key: fields for key, fields in self.indexes.items() if key[0] != clas}
+        logger.info(f"Class '{clas}' removed successfully from the repository '{self.repo}'.")
+
+
+        
+            
+# S = server('TOKEN', 'REPO')
+# S.create_class('TESTE')
+# S.create_table('TESTE', 'TESTE')
+# S.insert_data('TESTE', 'TESTE', 'teste1', 'teste')
+# S.insert_data('TESTE', 'TESTE', 'teste2', 'teste')
+# S.get_data('TESTE', 'TESTE')
+# S.search_data('TESTE', 'TESTE', 'teste1')
+# S.update_data('TESTE', 'TESTE', 'teste1', 'TESTE')
+# S.search_data('TESTE', 'TESTE', 'teste1')
+# S.remove_data('TESTE', 'TESTE', 'teste1')
+# S.get_data('TESTE', 'TESTE')
+# S.remove_data('TESTE', 'TESTE', 'teste1')
+# S.get_data('TESTE', 'TESTE')
+# S.remove_table('TESTE', 'TESTE')
+# S.remove_class('TESTE')
@@ -1 +1,2 @@
-from .Server import server
+from .Server import server, Scheduler, Metrics, LoggingSink, PrometheusSink, TableChange, WebhookReceiver
+from .AsyncServer import AsyncServer
@@ -0,0 +1,76 @@
+"""
+Microbenchmark of the table codecs against the old str(dict) / ast.literal_eval path.
+
+    python benchmarks/bench_codec.py --rows 100000
+
+Reports serialize and parse throughput (rows/s) and the encoded size of each codec.
+"""
+import argparse
+import ast
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from Server import Codec, msgpack, orjson, zstandard
+
+
+def make_table(rows):
+    return {
+        f"user{i}": {"id": i, "name": f"User {i}", "email": f"user{i}@example.com", "active": i % 3 == 0,
+                     "score": i * 1.5, "tags": ["a", "b", str(i % 10)]}
+        for i in range(rows)
+    }
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench(label, encode, decode, DATA, repeat):
+    encode_time, raw = timed(lambda: encode(DATA), repeat)
+    decode_time, _ = timed(lambda: decode(raw), repeat)
+    rows = len(DATA)
+    print(f"{label:<22}{len(raw) / 1e6:>10.2f} MB{rows / encode_time:>16,.0f}/s{rows / decode_time:>16,.0f}/s")
+    return encode_time, decode_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    DATA = make_table(args.rows)
+    print(f"{args.rows} rows")
+    print(f"{'codec':<22}{'size':>13}{'serialize rows':>18}{'parse rows':>18}")
+
+    base = bench("legacy (literal_eval)", lambda d: str(d).encode(), lambda r: ast.literal_eval(r.decode()), DATA, args.repeat)
+    results = {
+        "json (stdlib)": bench("json (stdlib)", lambda d: json.dumps(d, separators=(",", ":")).encode(), json.loads, DATA, args.repeat),
+    }
+
+    codecs = ["json", "json+zlib"]
+    if msgpack is not None:
+        codecs += ["msgpack", "msgpack+zlib"]
+    if zstandard is not None:
+        codecs += ["json+zstd"] + (["msgpack+zstd"] if msgpack is not None else [])
+    for name in codecs:
+        codec = Codec.parse(name)
+        label = f"{name} (orjson)" if name.startswith("json") and orjson is not None else name
+        results[label] = bench(label, codec.encode, lambda raw: Codec.load(raw)[0], DATA, args.repeat)
+
+    print()
+    for label, (encode_time, decode_time) in results.items():
+        print(f"{label:<22} serialize x{base[0] / encode_time:>6.1f}   parse x{base[1] / decode_time:>6.1f}  vs legacy")
+
+
+if __name__ == "__main__":
+    main()
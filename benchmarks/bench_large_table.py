@@ -0,0 +1,92 @@
+"""
+Peak memory of reading a large table: the Contents API path (base64 inside a JSON
+response, decoded_content, then a parse of the whole buffer) against the raw blob
+stream fed to TableDecoder.
+
+    python benchmarks/bench_large_table.py --rows 200000
+
+Both paths are fed the same 64 KB network chunks. "overhead" is the peak traced
+memory minus the memory the parsed table itself holds, relative to the encoded
+table size: the buffers a read needs on top of its result.
+"""
+import argparse
+import base64
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from Server import Codec, TableDecoder
+
+
+def make_table(rows):
+    return {
+        f"user{i}": {"id": i, "name": f"User {i}", "email": f"user{i}@example.com", "active": i % 3 == 0,
+                     "score": i * 1.5, "tags": ["a", "b", str(i % 10)]}
+        for i in range(rows)
+    }
+
+
+def chunks(payload, size=64 * 1024):
+    for start in range(0, len(payload), size):
+        yield payload[start:start + size]
+
+
+def contents_api(response):
+    body = b"".join(chunks(response))
+    content = json.loads(body)["content"]
+    raw = base64.b64decode(bytearray(content, "utf-8"))
+    return Codec.load(raw)[0]
+
+
+def blob_stream(raw):
+    decoder = TableDecoder()
+    for chunk in chunks(raw):
+        decoder.feed(chunk)
+    return decoder.close()[0]
+
+
+def measure(read, payload):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    DATA = read(payload)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return DATA, elapsed, peak, peak - held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--codec", default="json")
+    args = parser.parse_args()
+
+    DATA = make_table(args.rows)
+    raw = Codec.parse(args.codec).encode(DATA)
+    response = json.dumps({"sha": "0" * 40, "encoding": "base64", "content": base64.b64encode(raw).decode()}).encode()
+    del DATA
+    size = len(raw)
+    print(f"{args.rows} rows, {args.codec}, {size / 1e6:.2f} MB table")
+    print(f"{'path':<24}{'time':>10}{'peak':>12}{'overhead':>12}")
+
+    results = {}
+    for label, read, payload in (("contents api (base64)", contents_api, response), ("blob stream", blob_stream, raw)):
+        DATA, elapsed, peak, overhead = measure(read, payload)
+        assert len(DATA) == args.rows
+        del DATA
+        results[label] = overhead
+        print(f"{label:<24}{elapsed:>9.2f}s{peak / 1e6:>10.1f} MB{overhead / size:>11.2f}x")
+
+    print()
+    print(f"blob stream needs {results['contents api (base64)'] / max(results['blob stream'], 1):.1f}x less memory on top of the table")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+End-to-end benchmark of `server` against the in-process fake of the GitHub API
+(benchmarks/fake_github.py): throughput, latency and API calls per operation of
+the usual workloads, and the peak memory of each.
+
+    python benchmarks/bench_server.py                          # every scenario, compared with baseline.json
+    python benchmarks/bench_server.py hot_search get_data_1k --latency 0.05
+    python benchmarks/bench_server.py --save                   # record a new baseline
+    python benchmarks/bench_server.py --check                  # exit 1 on a regression
+
+Scenarios:
+    bulk_insert         insert_many of 1000 rows, 10 times, into one table
+    hot_search          search_data of random rows of a cached 1k-row table
+    get_data_1k         get_data of a 1k-row table, cache cleared before each read
+    get_data_100k       the same on a 100k-row table (over the 1 MB Contents API limit)
+    folder_move         Folder.move of a 1000-file tree six folders deep, back and forth
+    concurrent_writers  8 servers inserting rows into the same table at once; a dropped write is a regression
+    write_behind        update_data of one row 500 times with write_behind='window', then flush
+    async_get_many      AsyncServer.get_many of 20 1k-row tables, cache cleared before each read
+
+Each scenario runs in a process of its own, so "rss" is the peak resident memory
+of that scenario (the fake server's object store included). `--latency` and
+`--rate-limit`/`--rate-window` are injected by the fake server on every request.
+Timings only compare with a baseline taken on the same machine and options;
+API calls per operation compare anywhere.
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from Server import Codec, Folder, Scheduler, server
+from fake_github import FakeGitHub
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+OPTIONS = ("latency", "rate_limit", "rate_window", "writes_per_minute", "rows_large", "writers")
+SCENARIOS = {}
+
+
+def scenario(function):
+    SCENARIOS[function.__name__] = function
+    return function
+
+
+def make_rows(rows):
+    return {
+        f"user{i}": {"id": i, "name": f"User {i}", "email": f"user{i}@example.com", "active": i % 3 == 0,
+                     "score": i * 1.5, "tags": ["a", "b", str(i % 10)]}
+        for i in range(rows)
+    }
+
+
+class Run:
+    """
+    Collects the latency of each operation of a scenario, and the API calls and wall time of the
+    measured part (seeding the fake server is left out).
+    """
+    def __init__(self, gh):
+        self.gh = gh
+        self.latencies = []
+        self.calls = 0
+        self.seconds = 0.0
+        self.extra = {}
+
+    @contextlib.contextmanager
+    def measure(self):
+        calls, start = self.gh.total_calls(), time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.calls += self.gh.total_calls() - calls
+
+    @contextlib.contextmanager
+    def op(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    def result(self):
+        latencies = sorted(self.latencies)
+        ops = len(latencies)
+
+        def percentile(q):
+            return latencies[min(int(q * ops), ops - 1)] * 1000 if ops else 0.0
+
+        return dict({
+            "ops": ops,
+            "ops_per_sec": ops / self.seconds if self.seconds else 0.0,
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99),
+            "calls_per_op": self.calls / ops if ops else 0.0,
+            "rss_mb": peak_rss_mb(),
+        }, **self.extra)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def connect(gh, options, token="bench"):
+    scheduler = Scheduler(requests_per_hour=options.rate_limit, writes_per_minute=options.writes_per_minute)
+    return server(token, gh.name, base_url=gh.url, scheduler=scheduler, metadata_ttl=0)
+
+
+def seed_table(gh, clas, table, rows):
+    gh.write({f"{clas}/.gitkeep": b"", f"{clas}/{table}.json": Codec.parse("json").encode(make_rows(rows))})
+
+
+@scenario
+def bulk_insert(gh, options, run):
+    S = connect(gh, options)
+    S.create_class("B")
+    S.create_table("T", "B")
+    with run.measure():
+        for batch in range(10):
+            rows = {f"b{batch}_{i}": {"id": i, "batch": batch} for i in range(1000)}
+            with run.op():
+                S.insert_many("T", "B", rows, report=False)
+
+
+@scenario
+def hot_search(gh, options, run):
+    seed_table(gh, "H", "T", 1000)
+    S = connect(gh, options)
+    S.search_data("T", "H", "user0")
+    names = [f"user{random.randrange(1000)}" for _ in range(5000)]
+    with run.measure():
+        for name in names:
+            with run.op():
+                S.search_data("T", "H", name)
+
+
+def get_data(gh, options, run, rows, reads):
+    seed_table(gh, "G", "T", rows)
+    S = connect(gh, options)
+    S.get_data("T", "G")
+    with run.measure():
+        for _ in range(reads):
+            S.clear_cache()
+            with run.op():
+                assert len(S.get_data("T", "G")) == rows
+
+
+@scenario
+def get_data_1k(gh, options, run):
+    get_data(gh, options, run, 1000, 50)
+
+
+@scenario
+def get_data_100k(gh, options, run):
+    get_data(gh, options, run, options.rows_large, 5)
+
+
+@scenario
+def folder_move(gh, options, run):
+    gh.write({
+        "deep/" + "/".join(f"d{(i >> (2 * level)) & 3}" for level in range(6)) + f"/f{i}.json": b"{}"
+        for i in range(1000)
+    })
+    S = connect(gh, options)
+    source, destination = "deep", "moved"
+    with run.measure():
+        for _ in range(10):
+            with run.op():
+                Folder(S.repo, source, S.branch, destination).move()
+            source, destination = destination, source
+
+
+@scenario
+def concurrent_writers(gh, options, run):
+    S = connect(gh, options)
+    S.create_class("C")
+    S.create_table("T", "C")
+    writers = [connect(gh, options, token=f"writer{n}") for n in range(options.writers)]
+    failed = []
+
+    def write(n, writer):
+        for i in range(10):
+            with run.op():
+                try:
+                    writer.insert_data("T", "C", f"w{n}_{i}", {"writer": n, "i": i})
+                except Exception:
+                    failed.append((n, i))
+
+    threads = [threading.Thread(target=write, args=(n, writer)) for n, writer in enumerate(writers)]
+    with run.measure():
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    S.clear_cache()
+    assert len(S.get_data("T", "C")) == 10 * options.writers - len(failed)
+    run.extra["conflicts"] = sum(writer.write_stats()["conflicts"] for writer in writers)
+    run.extra["failed"] = len(failed)
+
+
+@scenario
+def write_behind(gh, options, run):
+    seed_table(gh, "W", "T", 1000)
+    S = server("bench", gh.name, base_url=gh.url, metadata_ttl=0, write_behind="window", flush_interval=0.2,
+               scheduler=Scheduler(requests_per_hour=options.rate_limit, writes_per_minute=options.writes_per_minute))
+    S.get_data("T", "W")
+    with run.measure():
+        for i in range(500):
+            with run.op():
+                S.update_data("T", "W", "user0", {"id": 0, "clicks": i})
+        S.flush()
+    S.clear_cache()
+    assert S.search_data("T", "W", "user0") == {"id": 0, "clicks": 499}
+    run.extra["commits"] = S.metrics_stats()["operations"].get("write_behind", {}).get("commits", 0) + S.metrics_stats()["operations"]["flush"]["commits"]
+
+
+def async_server():
+    """
+    Returns the AsyncServer class. It imports Server relatively, so the repository folder is loaded
+    as the `gitserver` package for it, whatever the folder is called.
+    """
+    if "gitserver" not in sys.modules:
+        root = Path(__file__).resolve().parent.parent
+        spec = importlib.util.spec_from_file_location("gitserver", root / "__init__.py", submodule_search_locations=[str(root)])
+        sys.modules["gitserver"] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules["gitserver"])
+    return sys.modules["gitserver"].AsyncServer
+
+
+@scenario
+def async_get_many(gh, options, run):
+    tables = [("A", f"T{n}") for n in range(20)]
+    for clas, table in tables:
+        seed_table(gh, clas, table, 1000)
+    AsyncServer = async_server()
+    scheduler = sys.modules["gitserver"].Scheduler(requests_per_hour=options.rate_limit, writes_per_minute=options.writes_per_minute)
+
+    async def main():
+        async with AsyncServer("bench", gh.name, base_url=gh.url, scheduler=scheduler, metadata_ttl=0) as S:
+            await S.get_many(tables)
+            with run.measure():
+                for _ in range(10):
+                    S.clear_cache()
+                    with run.op():
+                        read = await S.get_many(tables)
+                    assert all(len(rows) == 1000 for rows in read.values())
+
+    asyncio.run(main())
+
+
+def worker(name, options):
+    """
+    Runs scenario `name` in this process and prints its result as one JSON line.
+    """
+    os.environ["GITSERVER_CACHE_DIR"] = tempfile.mkdtemp(prefix="gitserver-bench-")
+    gh = FakeGitHub(latency=options.latency, rate_limit=options.rate_limit, rate_window=options.rate_window).start()
+    try:
+        run = Run(gh)
+        SCENARIOS[name](gh, options, run)
+        print(json.dumps(run.result()))
+    finally:
+        gh.stop()
+
+
+def spawn(name, options):
+    command = [sys.executable, __file__, "--worker", name, "--options", json.dumps({k: getattr(options, k) for k in OPTIONS})]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Scenario '{name}' failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(name, result, baseline, threshold):
+    """
+    Returns (changes text, regressions) of `result` against the baseline result of the same scenario.
+    """
+    if not baseline:
+        return "no baseline", []
+    changes, regressions = [], []
+    for metric, worse_when in (("ops_per_sec", -1), ("p99_ms", 1), ("calls_per_op", 1), ("rss_mb", 1)):
+        old, new = baseline.get(metric), result.get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        changes.append(f"{metric} {change:+.0%}")
+        if change * worse_when > threshold:
+            regressions.append(f"{name}: {metric} {old:.2f} -> {new:.2f}")
+    if result.get("failed"):
+        # Concurrent writers must all get their rows in, whatever the baseline recorded
+        regressions.append(f"{name}: {result['failed']} writes failed")
+    return ", ".join(changes), regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the fake server waits on every request")
+    parser.add_argument("--rate-limit", type=int, default=1000000, help="requests per rate limit window")
+    parser.add_argument("--rate-window", type=float, default=3600, help="seconds until the rate limit resets")
+    parser.add_argument("--writes-per-minute", type=int, default=1000000, help="the scheduler's write budget")
+    parser.add_argument("--rows-large", type=int, default=100000, help="rows of the get_data_100k table")
+    parser.add_argument("--writers", type=int, default=8, help="servers of concurrent_writers")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="exit 1 if a scenario regressed")
+    parser.add_argument("--threshold", type=float, default=0.25, help="relative change counted as a regression")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--options", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return worker(args.worker, argparse.Namespace(**json.loads(args.options)))
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    saved = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    options = {k: getattr(args, k) for k in OPTIONS}
+    if saved and saved.get("options") != options:
+        print(f"note: baseline was taken with {saved.get('options')}, timings may not compare")
+
+    print(f"{'scenario':<20}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'calls/op':>10}{'rss MB':>9}  vs baseline")
+    results, regressions = {}, []
+    for name in names:
+        result = results[name] = spawn(name, args)
+        changes, regressed = compare(name, result, saved.get("results", {}).get(name), args.threshold)
+        regressions += regressed
+        extra = "".join(f", {k} {v}" for k, v in result.items() if k not in ("ops", "ops_per_sec", "p50_ms", "p99_ms", "calls_per_op", "rss_mb"))
+        rss = f"{result['rss_mb']:>9.1f}" if result["rss_mb"] is not None else f"{'-':>9}"
+        print(f"{name:<20}{result['ops_per_sec']:>10.1f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+              f"{result['calls_per_op']:>10.2f}{rss}  {changes}{extra}")
+
+    if regressions:
+        print("\nregressions:\n  " + "\n  ".join(regressions))
+    if args.save:
+        merged = dict(saved.get("results", {}), **results) if saved.get("options") == options else results
+        args.baseline.write_text(json.dumps({"options": options, "results": merged}, indent=2, sort_keys=True) + "\n")
+        print(f"\nbaseline saved to {args.baseline}")
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
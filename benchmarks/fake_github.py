@@ -0,0 +1,488 @@
+"""
+In-process fake of the GitHub REST and Git Data endpoints used by GitServer.
+
+Objects are stored the way git stores them (blobs, trees and commits addressed
+by sha1), so blob shas, tree walks and fast-forward checks behave like the real
+API. Latency and a primary rate limit can be injected per request.
+
+    gh = FakeGitHub(latency=0.05, rate_limit=5000).start()
+    S = server('TOKEN', 'repo', base_url=gh.url)
+"""
+import base64
+import hashlib
+import io
+import json
+import re
+import tarfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+
+class FakeGitHub:
+    """
+    One repository `owner/repo` served on 127.0.0.1 (see `url`) once `start()`ed. Every request
+    sleeps `latency` seconds and spends one of `rate_limit` requests, refilled every `rate_window`
+    seconds; past that it answers 403 with Retry-After, like GitHub. Recursive tree listings are
+    truncated past `max_tree_entries` and files larger than `contents_limit` come back without
+    content from the Contents API. `calls` counts the requests per endpoint.
+    """
+    def __init__(self, owner="owner", repo="repo", branch="main", latency=0.0, rate_limit=5000,
+                 max_tree_entries=100000, contents_limit=1024 * 1024, rate_window=3600):
+        self.owner = owner
+        self.name = repo
+        self.branch = branch
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.rate_window = rate_window
+        self.reset_at = time.time() + rate_window
+        self.max_tree_entries = max_tree_entries
+        self.contents_limit = contents_limit
+        self.objects = {}
+        self.refs = {}
+        self.calls = {}
+        self.lock = threading.RLock()
+        self.httpd = None
+        self.refs[f"heads/{branch}"] = self._commit(self._tree({}), [], "Initial commit")
+
+    # === Object store ===
+    def _store(self, kind, payload, raw):
+        sha = hashlib.sha1(f"{kind} {len(raw)}\0".encode() + raw).hexdigest()
+        self.objects[sha] = (kind, payload)
+        return sha
+
+    def _blob(self, data: bytes):
+        return self._store("blob", data, data)
+
+    def _tree(self, entries: dict):
+        raw = b"".join(
+            f"{mode} {name}\0".encode() + bytes.fromhex(sha)
+            for name, (mode, kind, sha) in sorted(entries.items())
+        )
+        return self._store("tree", dict(entries), raw)
+
+    def _commit(self, tree, parents, message):
+        raw = json.dumps([tree, parents, message, time.time()]).encode()
+        return self._store("commit", {"tree": tree, "parents": parents, "message": message}, raw)
+
+    def _walk(self, tree_sha, prefix=""):
+        for name, (mode, kind, sha) in sorted(self.objects[tree_sha][1].items()):
+            path = f"{prefix}{name}"
+            yield path, mode, kind, sha
+            if kind == "tree":
+                yield from self._walk(sha, path + "/")
+
+    def _lookup(self, tree_sha, path):
+        node = ("040000", "tree", tree_sha)
+        for part in [p for p in path.split("/") if p]:
+            if node[1] != "tree":
+                return None
+            node = self.objects[node[2]][1].get(part)
+            if node is None:
+                return None
+        return node
+
+    def _apply(self, tree_sha, changes):
+        """changes: {path: (mode, type, sha) or None}; returns the new root tree sha."""
+        entries = dict(self.objects[tree_sha][1]) if tree_sha else {}
+        nested = {}
+        for path, value in changes.items():
+            head, _, rest = path.strip("/").partition("/")
+            if rest:
+                nested.setdefault(head, {})[rest] = value
+            elif value is None:
+                entries.pop(head, None)
+            else:
+                entries[head] = value
+        for head, sub in nested.items():
+            current = entries.get(head)
+            base = current[2] if current and current[1] == "tree" else None
+            new = self._apply(base, sub)
+            if self.objects[new][1]:
+                entries[head] = ("040000", "tree", new)
+            else:
+                entries.pop(head, None)
+        return self._tree(entries)
+
+    def head(self, branch=None):
+        return self.refs[f"heads/{branch or self.branch}"]
+
+    def read(self, path, ref=None):
+        commit = self._resolve(ref)
+        node = self._lookup(self.objects[commit][1]["tree"], path)
+        return self.objects[node[2]][1] if node and node[1] == "blob" else None
+
+    def _resolve(self, ref):
+        ref = ref or self.branch
+        if f"heads/{ref}" in self.refs:
+            return self.refs[f"heads/{ref}"]
+        return ref if ref in self.objects else None
+
+    def _is_ancestor(self, old, new):
+        stack, seen = [new], set()
+        while stack:
+            sha = stack.pop()
+            if sha == old:
+                return True
+            if sha in seen:
+                continue
+            seen.add(sha)
+            stack.extend(self.objects[sha][1]["parents"])
+        return False
+
+    def _commit_change(self, branch, changes, message):
+        parent = self.head(branch)
+        tree = self._apply(self.objects[parent][1]["tree"], changes)
+        sha = self._commit(tree, [parent], message)
+        self.refs[f"heads/{branch}"] = sha
+        return sha
+
+    def write(self, files: dict, message="Seed", branch=None):
+        """
+        Commits `files` ({path: bytes, or None to delete}) straight into the store, without any
+        request: a fast way to seed a benchmark. Returns the commit sha.
+        """
+        with self.lock:
+            changes = {path: None if data is None else ("100644", "blob", self._blob(data)) for path, data in files.items()}
+            return self._commit_change(branch or self.branch, changes, message)
+
+    def _spend(self):
+        now = time.time()
+        if now >= self.reset_at:
+            self.remaining = self.rate_limit
+            self.reset_at = now + self.rate_window
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+    # === Server ===
+    def start(self):
+        fake = self
+
+        class Handler(FakeHandler):
+            github = fake
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def count(self, kind):
+        with self.lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    github = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    # === Plumbing ===
+    def _dispatch(self, method):
+        gh = self.github
+        parts = urlsplit(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        self.body = json.loads(raw) if raw else {}
+        path = parts.path
+        if path.startswith("/api/v3"):
+            path = path[len("/api/v3"):]
+        if gh.latency:
+            time.sleep(gh.latency)
+
+        with gh.lock:
+            if path != "/rate_limit" and not gh._spend():
+                retry_after = max(int(gh.reset_at - time.time()) + 1, 1)
+                return self._send(403, {"message": "API rate limit exceeded"}, {"Retry-After": str(retry_after)})
+            prefix = f"/repos/{gh.owner}/{gh.name}"
+            for pattern, handler in ROUTES:
+                if pattern[0] != method:
+                    continue
+                match = re.fullmatch(pattern[1].replace("{repo}", re.escape(prefix)), path)
+                if match:
+                    gh.count(handler.__name__)
+                    return handler(self, *[unquote(g) for g in match.groups()])
+            self._send(404, {"message": "Not Found"})
+
+    def _send(self, status, data=None, headers=None, raw=None):
+        gh = self.github
+        body = raw if raw is not None else (json.dumps(data).encode() if data is not None else b"")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream" if raw is not None else "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-RateLimit-Limit", str(gh.rate_limit))
+        self.send_header("X-RateLimit-Remaining", str(max(gh.remaining, 0)))
+        self.send_header("X-RateLimit-Reset", str(int(gh.reset_at)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _url(self, suffix=""):
+        gh = self.github
+        return f"http://{self.headers.get('Host')}/repos/{gh.owner}/{gh.name}{suffix}"
+
+    def _content_json(self, path, sha, data=None, ref=None):
+        gh = self.github
+        item = {
+            "type": "file", "name": path.rsplit("/", 1)[-1], "path": path, "sha": sha,
+            "size": len(data) if data is not None else 0,
+            "url": self._url(f"/contents/{path}") + (f"?ref={ref}" if ref else ""),
+        }
+        if data is not None:
+            if len(data) > gh.contents_limit:
+                item.update(content="", encoding="none")
+            else:
+                item.update(content=base64.b64encode(data).decode(), encoding="base64")
+        return item
+
+    def _commit_json(self, sha):
+        commit = self.github.objects[sha][1]
+        return {
+            "sha": sha, "url": self._url(f"/git/commits/{sha}"), "message": commit["message"],
+            "tree": {"sha": commit["tree"], "url": self._url(f"/git/trees/{commit['tree']}")},
+            "parents": [{"sha": p, "url": self._url(f"/git/commits/{p}")} for p in commit["parents"]],
+        }
+
+    # === Endpoints ===
+    def user(self):
+        gh = self.github
+        self._send(200, {"login": gh.owner, "id": 1, "url": f"http://{self.headers.get('Host')}/users/{gh.owner}"})
+
+    def repository(self):
+        gh = self.github
+        self._send(200, {
+            "id": 1, "name": gh.name, "full_name": f"{gh.owner}/{gh.name}", "private": True,
+            "owner": {"login": gh.owner, "id": 1}, "default_branch": gh.branch, "url": self._url(),
+            "html_url": f"https://github.com/{gh.owner}/{gh.name}", "description": "",
+        })
+
+    def rate_limit(self):
+        gh = self.github
+        core = {"limit": gh.rate_limit, "remaining": gh.remaining, "reset": int(gh.reset_at), "used": gh.rate_limit - gh.remaining}
+        self._send(200, {"resources": {"core": core}, "rate": core})
+
+    def get_contents(self, path):
+        gh = self.github
+        ref = self.query.get("ref")
+        commit = gh._resolve(ref)
+        node = gh._lookup(gh.objects[commit][1]["tree"], path) if commit else None
+        if node is None:
+            return self._send(404, {"message": "Not Found"})
+        if node[1] == "tree":
+            items = []
+            for name, (mode, kind, sha) in sorted(gh.objects[node[2]][1].items()):
+                sub = f"{path.strip('/')}/{name}".strip("/")
+                item = self._content_json(sub, sha, ref=ref)
+                item["type"] = "dir" if kind == "tree" else "file"
+                items.append(item)
+            return self._send(200, items)
+        etag = f'"{node[2]}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, None, {"ETag": etag})
+        self._send(200, self._content_json(path, node[2], gh.objects[node[2]][1], ref), {"ETag": etag})
+
+    def put_contents(self, path):
+        gh = self.github
+        branch = self.body.get("branch", gh.branch)
+        node = gh._lookup(gh.objects[gh.head(branch)][1]["tree"], path)
+        if node is not None and self.body.get("sha") != node[2]:
+            return self._send(409 if self.body.get("sha") else 422, {"message": f"{path} does not match {self.body.get('sha')}"})
+        if node is None and self.body.get("sha"):
+            return self._send(404, {"message": "Not Found"})
+        data = base64.b64decode(self.body["content"])
+        blob = gh._blob(data)
+        commit = gh._commit_change(branch, {path: ("100644", "blob", blob)}, self.body.get("message", ""))
+        self._send(201 if node is None else 200, {
+            "content": self._content_json(path, blob, ref=branch), "commit": self._commit_json(commit),
+        })
+
+    def delete_contents(self, path):
+        gh = self.github
+        branch = self.body.get("branch", gh.branch)
+        node = gh._lookup(gh.objects[gh.head(branch)][1]["tree"], path)
+        if node is None:
+            return self._send(404, {"message": "Not Found"})
+        if self.body.get("sha") != node[2]:
+            return self._send(409, {"message": f"{path} does not match {self.body.get('sha')}"})
+        commit = gh._commit_change(branch, {path: None}, self.body.get("message", ""))
+        self._send(200, {"content": None, "commit": self._commit_json(commit)})
+
+    def get_ref(self, ref):
+        gh = self.github
+        if ref not in gh.refs:
+            return self._send(404, {"message": "Not Found"})
+        self._send(200, {
+            "ref": f"refs/{ref}", "url": self._url(f"/git/refs/{ref}"),
+            "object": {"sha": gh.refs[ref], "type": "commit", "url": self._url(f"/git/commits/{gh.refs[ref]}")},
+        })
+
+    def patch_ref(self, ref):
+        gh = self.github
+        sha = self.body["sha"]
+        if ref not in gh.refs or sha not in gh.objects:
+            return self._send(422, {"message": "Reference does not exist"})
+        if not self.body.get("force") and not gh._is_ancestor(gh.refs[ref], sha):
+            return self._send(422, {"message": "Update is not a fast forward"})
+        gh.refs[ref] = sha
+        self.get_ref(ref)
+
+    def post_ref(self):
+        gh = self.github
+        ref = self.body["ref"].removeprefix("refs/")
+        if ref in gh.refs:
+            return self._send(422, {"message": "Reference already exists"})
+        gh.refs[ref] = self.body["sha"]
+        self.get_ref(ref)
+
+    def get_commit(self, sha):
+        if self.github.objects.get(sha, ("",))[0] != "commit":
+            return self._send(404, {"message": "Not Found"})
+        self._send(200, self._commit_json(sha))
+
+    def post_commit(self):
+        gh = self.github
+        sha = gh._commit(self.body["tree"], list(self.body.get("parents", [])), self.body.get("message", ""))
+        self._send(201, self._commit_json(sha))
+
+    def compare(self, base, head):
+        gh = self.github
+        if gh.objects.get(base, ("",))[0] != "commit" or gh.objects.get(head, ("",))[0] != "commit":
+            return self._send(404, {"message": "Not Found"})
+        old, new = ({path: s for path, mode, kind, s in gh._walk(gh.objects[sha][1]["tree"]) if kind == "blob"} for sha in (base, head))
+        files = []
+        for path in sorted(old.keys() | new.keys()):
+            if old.get(path) != new.get(path):
+                status = "added" if path not in old else "removed" if path not in new else "modified"
+                files.append({"filename": path, "status": status, "sha": new.get(path) or old[path]})
+        self._send(200, {
+            "url": self._url(f"/compare/{base}...{head}"), "status": "ahead", "total_commits": 0,
+            "base_commit": self._commit_json(base), "merge_base_commit": self._commit_json(base),
+            "commits": [], "files": files[:300],
+        })
+
+    def get_tree(self, sha):
+        gh = self.github
+        if gh.objects.get(sha, ("",))[0] != "tree":
+            return self._send(404, {"message": "Not Found"})
+        if self.query.get("recursive"):
+            walked = list(gh._walk(sha))
+        else:
+            walked = [(name, mode, kind, s) for name, (mode, kind, s) in sorted(gh.objects[sha][1].items())]
+        truncated = bool(self.query.get("recursive")) and len(walked) > gh.max_tree_entries
+        tree = [
+            {"path": path, "mode": mode, "type": kind, "sha": s, "url": self._url(f"/git/{kind}s/{s}"),
+             **({"size": len(gh.objects[s][1])} if kind == "blob" else {})}
+            for path, mode, kind, s in (walked[:gh.max_tree_entries] if truncated else walked)
+        ]
+        self._send(200, {"sha": sha, "url": self._url(f"/git/trees/{sha}"), "tree": tree, "truncated": truncated})
+
+    def post_tree(self):
+        gh = self.github
+        changes = {}
+        for item in self.body["tree"]:
+            if "content" in item:
+                changes[item["path"]] = (item["mode"], "blob", gh._blob(item["content"].encode()))
+            elif item.get("sha") is None:
+                changes[item["path"]] = None
+            else:
+                changes[item["path"]] = (item["mode"], item["type"], item["sha"])
+        sha = gh._apply(self.body.get("base_tree"), changes)
+        self.get_tree(sha)
+
+    def get_blob(self, sha):
+        gh = self.github
+        if gh.objects.get(sha, ("",))[0] != "blob":
+            return self._send(404, {"message": "Not Found"})
+        data = gh.objects[sha][1]
+        if "raw" in (self.headers.get("Accept") or ""):
+            return self._send(200, raw=data)
+        self._send(200, {"sha": sha, "size": len(data), "url": self._url(f"/git/blobs/{sha}"),
+                         "content": base64.b64encode(data).decode(), "encoding": "base64"})
+
+    def get_tarball(self, ref):
+        gh = self.github
+        commit = gh._resolve(ref or None)
+        if commit is None:
+            return self._send(404, {"message": "Not Found"})
+        # GitHub redirects archive requests to codeload
+        self._send(302, headers={"Location": f"http://{self.headers.get('Host')}/_codeload/{gh.owner}/{gh.name}/tar.gz/{commit}"})
+
+    def codeload(self, commit):
+        gh = self.github
+        if gh.objects.get(commit, ("",))[0] != "commit":
+            return self._send(404, {"message": "Not Found"})
+        buffer = io.BytesIO()
+        prefix = f"{gh.owner}-{gh.name}-{commit[:7]}/"
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            for path, mode, kind, sha in gh._walk(gh.objects[commit][1]["tree"]):
+                if kind != "blob":
+                    continue
+                data = gh.objects[sha][1]
+                info = tarfile.TarInfo(prefix + path)
+                info.size = len(data)
+                info.mode = 0o755 if mode == "100755" else 0o644
+                archive.addfile(info, io.BytesIO(data))
+        self._send(200, raw=buffer.getvalue())
+
+    def post_blob(self):
+        gh = self.github
+        content = self.body["content"]
+        data = base64.b64decode(content) if self.body.get("encoding") == "base64" else content.encode()
+        sha = gh._blob(data)
+        self._send(201, {"sha": sha, "url": self._url(f"/git/blobs/{sha}")})
+
+
+ROUTES = [
+    (("GET", r"/user"), FakeHandler.user),
+    (("GET", r"/rate_limit"), FakeHandler.rate_limit),
+    (("GET", r"{repo}"), FakeHandler.repository),
+    (("GET", r"{repo}/contents/?(.*)"), FakeHandler.get_contents),
+    (("PUT", r"{repo}/contents/(.+)"), FakeHandler.put_contents),
+    (("DELETE", r"{repo}/contents/(.+)"), FakeHandler.delete_contents),
+    (("GET", r"{repo}/git/refs?/(heads/.+)"), FakeHandler.get_ref),
+    (("PATCH", r"{repo}/git/refs/(heads/.+)"), FakeHandler.patch_ref),
+    (("POST", r"{repo}/git/refs"), FakeHandler.post_ref),
+    (("GET", r"{repo}/git/commits/(\w+)"), FakeHandler.get_commit),
+    (("POST", r"{repo}/git/commits"), FakeHandler.post_commit),
+    (("GET", r"{repo}/compare/(\w+)\.\.\.(\w+)"), FakeHandler.compare),
+    (("GET", r"{repo}/git/trees/(\w+)"), FakeHandler.get_tree),
+    (("POST", r"{repo}/git/trees"), FakeHandler.post_tree),
+    (("GET", r"{repo}/git/blobs/(\w+)"), FakeHandler.get_blob),
+    (("POST", r"{repo}/git/blobs"), FakeHandler.post_blob),
+    (("GET", r"{repo}/tarball/?(.*)"), FakeHandler.get_tarball),
+    (("GET", r"/_codeload/[^/]+/[^/]+/tar\.gz/(\w+)"), FakeHandler.codeload),
+]
@@ -0,0 +1,53 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+# The repository folder is the package: load it as `gitserver` whatever the folder is called, so the
+# relative imports of AsyncServer and of the mirror mode resolve
+spec = importlib.util.spec_from_file_location("gitserver", ROOT / "__init__.py", submodule_search_locations=[str(ROOT)])
+sys.modules["gitserver"] = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sys.modules["gitserver"])
+
+from gitserver.Server import Scheduler, server
+from fake_github import FakeGitHub
+
+
+@pytest.fixture
+def gh(tmp_path, monkeypatch):
+    """
+    A fresh fake GitHub API per test, with the server's on-disk caches kept in the test's directory.
+    """
+    monkeypatch.setenv("GITSERVER_CACHE_DIR", str(tmp_path))
+    fake = FakeGitHub().start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def scheduler():
+    """
+    Like the benchmarks, the clients of a test share a scheduler whose budgets never throttle them.
+    """
+    return Scheduler(requests_per_hour=1000000, writes_per_minute=1000000)
+
+
+@pytest.fixture
+def connect(gh, scheduler):
+    """
+    Returns a function that opens a server on the fake API; each one is closed after the test.
+    """
+    servers = []
+
+    def connect(**kwargs):
+        S = server("test", gh.name, base_url=gh.url, metadata_ttl=0, scheduler=scheduler, **kwargs)
+        servers.append(S)
+        return S
+
+    yield connect
+    for S in servers:
+        S.close()
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from github import GithubException
+
+import fake_github
+from gitserver.AsyncServer import AsyncServer
+
+pytest.importorskip("aiohttp")
+
+
+@pytest.fixture
+def client(gh, scheduler):
+    """
+    Returns a function that builds an AsyncServer on the fake API, to be opened with `async with`.
+    """
+    def client(**kwargs):
+        return AsyncServer("test", gh.name, base_url=gh.url, metadata_ttl=0, scheduler=scheduler, **kwargs)
+
+    return client
+
+
+def test_rows_round_trip_and_are_seen_by_server(client, connect):
+    async def main():
+        async with client() as S:
+            await S.create_class("C")
+            await S.create_table("T", "C")
+            await S.create_table("SH", "C", shards=4)
+            assert await S.insert_many("SH", "C", {f"k{i}": {"v": i} for i in range(20)}, report=False) == {f"k{i}": "inserted" for i in range(20)}
+            await S.insert_data("T", "C", "a", 1)
+            await S.update_data("SH", "C", "k1", {"v": 100})
+            await S.remove_data("SH", "C", "k2")
+            assert await S.insert_many("SH", "C", {"k3": {}}, report=False) == {"k3": "exists"}
+            assert await S.search_data("SH", "C", "k1") == {"v": 100}
+            S.clear_cache()
+            return await S.get_many([("C", "T"), ("C", "SH")])
+
+    tables = asyncio.run(main())
+    expected = {f"k{i}": {"v": 100 if i == 1 else i} for i in range(20) if i != 2}
+    assert tables == {("C", "T"): {"a": 1}, ("C", "SH"): expected}
+    reader = connect()
+    assert reader.get_data("SH", "C") == expected
+    assert reader.list_tables("C") == ["SH", "T"]
+
+
+def test_indexes_and_queries(client):
+    async def main():
+        async with client() as S:
+            await S.create_class("C")
+            await S.create_table("T", "C", shards=4)
+            await S.create_index("T", "C", "v")
+            await S.insert_many("T", "C", {f"k{i}": {"v": i % 5} for i in range(30)}, report=False)
+            await S.update_data("T", "C", "k0", {"v": 9})
+            S.clear_cache()
+            found = await S.find_by("T", "C", "v", 3)
+            ranged = await S.find_range("T", "C", "v", 4, 9)
+            queried = {name: row async for name, row in S.query("T", "C", where={"v": 3})}
+            page, following = await S.query_page("T", "C", size=10, order_by="v")
+            return found, ranged, queried, page, following
+
+    found, ranged, queried, page, following = asyncio.run(main())
+    assert found == queried == {f"k{i}": {"v": 3} for i in range(3, 30, 5)}
+    assert set(ranged) == {f"k{i}" for i in range(4, 30, 5)} | {"k0"}
+    assert len(page) == 10 and following is not None
+
+
+def test_concurrent_writes_to_one_table_are_all_kept(client, connect):
+    async def main():
+        async with client() as S, client() as other:
+            await S.create_class("C")
+            await S.create_table("T", "C")
+            await asyncio.gather(*(W.insert_data("T", "C", f"{n}_{i}", i) for n, W in enumerate((S, other)) for i in range(10)))
+            return S.write_stats()
+
+    stats = asyncio.run(main())
+    assert stats["failures"] == 0
+    assert sorted(connect().get_data("T", "C")) == sorted(f"{n}_{i}" for n in range(2) for i in range(10))
+
+
+def test_rows_the_codec_cannot_hold_are_rejected(client):
+    async def main():
+        async with client() as S:
+            await S.create_class("C")
+            await S.create_table("T", "C")
+            with pytest.raises(TypeError):
+                await S.insert_data("T", "C", "a", {"v": (1, 2)})
+            return await S.get_data("T", "C")
+
+    assert asyncio.run(main()) == {}
+
+
+def test_an_error_page_that_is_not_json_raises_github_exception(client, monkeypatch):
+    def outage(handler, path):
+        handler._send(502, raw=b"<html><body>Bad gateway</body></html>")
+
+    routes = [(pattern, outage if handler.__name__ == "get_contents" else handler) for pattern, handler in fake_github.ROUTES]
+    monkeypatch.setattr(fake_github, "ROUTES", routes)
+
+    async def main():
+        async with client() as S:
+            await S.create_class("C")
+
+    with pytest.raises(GithubException) as error:
+        asyncio.run(main())
+    assert error.value.status == 502
+    assert "Bad gateway" in error.value.data["message"]
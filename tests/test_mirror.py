@@ -0,0 +1,115 @@
+import shutil
+import subprocess
+
+import pytest
+
+from gitserver.Server import Index, server
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="the mirror mode needs git")
+
+
+def by_value(index):
+    return {value: sorted(names) for value, names in index.entries}
+
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    """
+    Returns a function that opens a server in mirror mode on one bare remote shared by the test; the
+    mirrors only push and fetch when told to. Each one is closed after the test.
+    """
+    monkeypatch.setenv("GITSERVER_CACHE_DIR", str(tmp_path))
+    remote = tmp_path / "remote.git"
+    subprocess.run(["git", "init", "--bare", "--quiet", "-b", "main", str(remote)], check=True)
+    servers = []
+
+    def mirror():
+        S = server(None, "remote", mode="mirror", path=str(tmp_path / f"clone{len(servers)}"), remote=str(remote),
+                   push_batch=1000, push_interval=3600, refresh_interval=None)
+        servers.append(S)
+        return S
+
+    yield mirror
+    for S in servers:
+        S.close()
+
+
+def test_two_mirrors_writing_the_same_table(mirror):
+    A = mirror()
+    A.create_class("C")
+    A.create_table("T", "C")
+    A.insert_many("T", "C", {"a": 1, "b": 2, "c": 3}, report=False)
+    A.repo.push()
+    B = mirror()
+
+    A.insert_data("T", "C", "from_a", 1)
+    A.update_data("T", "C", "a", 10)
+    A.remove_data("T", "C", "c")
+    B.insert_data("T", "C", "from_b", 2)
+    B.update_data("T", "C", "b", 20)
+    B.update_data("T", "C", "c", 30)
+    A.repo.push()
+    B.repo.push()
+    A.refresh()
+
+    expected = {"a": 10, "b": 20, "from_a": 1, "from_b": 2}
+    for S in (A, B):
+        S.clear_cache()
+        assert S.get_data("T", "C") == expected
+        assert S.repo.stats()["unpushed"] == 0
+    assert B.repo.stats()["merges"] == 1
+
+
+def test_refresh_rebases_local_writes_on_the_remote(mirror):
+    A = mirror()
+    A.create_class("C")
+    A.create_table("T", "C", shards=4)
+    A.create_index("T", "C", "v")
+    A.repo.push()
+    B = mirror()
+
+    B.insert_many("T", "C", {f"b{i}": {"v": i % 3} for i in range(12)}, report=False)
+    B.repo.push()
+    A.insert_many("T", "C", {f"a{i}": {"v": i % 3} for i in range(12)}, report=False)
+    A.update_data("T", "C", "a0", {"v": 7})
+    A.refresh()
+
+    A.clear_cache()
+    rows = A.get_data("T", "C")
+    assert len(rows) == 24 and rows["a0"] == {"v": 7}
+    assert A.find_by("T", "C", "v", 1) == {name: row for name, row in rows.items() if row["v"] == 1}
+    data, _ = A._read_table(A._index_part("T", "v"), "C", fresh=True)
+    assert by_value(Index.from_data(data)) == by_value(Index.build("v", rows.items()))
+    assert A.repo.stats()["unpushed"] == 0
+
+    B.refresh()
+    B.clear_cache()
+    assert B.get_data("T", "C") == rows
+
+
+def test_a_file_changed_on_both_sides_keeps_the_remote_version(mirror):
+    A = mirror()
+    A.create_class("C")
+    A.repo.push()
+    B = mirror()
+    A.repo.create_file("C/notes.txt", "A", "from a")
+    B.repo.create_file("C/notes.txt", "B", "from b")
+    B.repo.push()
+    A.refresh()
+    assert A.repo.get_contents("C/notes.txt").decoded_content == b"from b"
+    assert A.repo.stats()["unpushed"] == 0
+
+
+def test_close_pushes_local_writes_over_a_moved_remote(mirror):
+    A = mirror()
+    A.create_class("C")
+    A.create_table("T", "C")
+    A.repo.push()
+    B = mirror()
+    B.insert_data("T", "C", "b", 1)
+    B.repo.push()
+    A.insert_data("T", "C", "a", 1)
+    A.close()
+
+    reader = mirror()
+    assert reader.get_data("T", "C") == {"a": 1, "b": 1}
@@ -0,0 +1,356 @@
+import threading
+import time
+
+import pytest
+from github import GithubException
+
+from gitserver.Server import Folder, GitHubConnection, Index, MetadataCache, Tree
+
+
+def paths(gh):
+    return sorted(path for path, _, kind, _ in gh._walk(gh.objects[gh.head()][1]["tree"]) if kind == "blob")
+
+
+def stored_index(S, table, clas, field):
+    """
+    Returns the index file of `field` as {value: sorted names}, read from the branch.
+    """
+    data, _ = S._read_table(S._index_part(table, field), clas, fresh=True)
+    return {value: sorted(names) for value, names in Index.from_data(data).entries}
+
+
+def expected_index(rows, field):
+    return {value: sorted(names) for value, names in Index.build(field, rows.items()).entries}
+
+
+# === connections ===
+def test_connections_differ_by_metadata_settings_and_are_dropped(gh, tmp_path):
+    def shared(metadata):
+        return GitHubConnection.shared("test", None, metadata, gh.url)
+
+    fresh = shared(MetadataCache(ttl=0))
+    assert shared(MetadataCache(ttl=0)) is fresh
+    assert shared(MetadataCache(ttl=60)) is not fresh
+    assert shared(MetadataCache(path=str(tmp_path / "other"), ttl=0)) is not fresh
+    assert shared(MetadataCache(ttl=0)).metadata.ttl == 0
+    count = len(GitHubConnection.connections)
+    del fresh
+    assert len(GitHubConnection.connections) < count
+
+
+# === tree commits ===
+def test_tree_commit_without_expect_is_rebased_when_only_the_branch_moved(connect, gh):
+    S = connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+    tree = Tree(S.repo, S.branch)
+    head = tree.head()
+    S.insert_data("T", "C", "a", 1)
+    tree.commit([tree.element("C/other.txt", b"x")], "Unrelated file", head)
+    assert gh.read("C/other.txt") == b"x"
+    S.clear_cache()
+    assert S.get_data("T", "C") == {"a": 1}
+
+
+def test_tree_commit_without_expect_raises_when_its_paths_changed(connect, gh):
+    S = connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+    tree = Tree(S.repo, S.branch)
+    head = tree.head()
+    S.insert_data("T", "C", "a", 1)
+    with pytest.raises(GithubException) as error:
+        tree.commit([tree.element("C/T.json", b"{}")], "Stale write", head)
+    assert error.value.status == 409
+    assert "C/T.json" in paths(gh)
+    S.clear_cache()
+    assert S.get_data("T", "C") == {"a": 1}
+
+
+def test_folder_move_raises_instead_of_losing_the_move(connect, monkeypatch):
+    S = connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+
+    def failing(self, *args, **kwargs):
+        raise GithubException(409, {"message": "'main' moved while committing"}, None)
+
+    monkeypatch.setattr(Tree, "commit", failing)
+    with pytest.raises(GithubException):
+        Folder(S.repo, "C", S.branch, "D").move()
+    with pytest.raises(GithubException):
+        Folder(S.repo, "C", S.branch).delete()
+
+
+# === indexes ===
+def test_index_follows_inserts_updates_and_removes(connect):
+    S = connect()
+    S.create_class("C")
+    S.create_table("T", "C", shards=4)
+    S.create_index("T", "C", "v")
+    S.insert_many("T", "C", {f"k{i}": {"v": i % 5} for i in range(40)}, report=False)
+    S.update_many("T", "C", {f"k{i}": {"v": 10 + i % 3} for i in range(0, 40, 4)}, report=False)
+    S.update_data("T", "C", "k1", {"other": 1})
+    S.update_data("T", "C", "k2", [1, 2])
+    S.remove_many("T", "C", [f"k{i}" for i in range(3, 40, 6)], report=False)
+    S.insert_data("T", "C", "new", {"v": None})
+
+    reader = connect()
+    rows = reader.get_data("T", "C")
+    assert stored_index(reader, "T", "C", "v") == expected_index(rows, "v")
+    for value in {row["v"] for row in rows.values() if isinstance(row, dict) and "v" in row}:
+        assert reader.find_by("T", "C", "v", value) == {name: row for name, row in rows.items() if isinstance(row, dict) and "v" in row and row["v"] == value}
+    assert set(reader.find_range("T", "C", "v", 10, 12)) == {name for name, row in rows.items() if isinstance(row, dict) and isinstance(row.get("v"), int) and 10 <= row["v"] <= 12}
+
+
+def test_index_follows_writes_of_another_server(connect):
+    S, other = connect(), connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+    S.create_index("T", "C", "v")
+    S.insert_many("T", "C", {"a": {"v": 1}, "b": {"v": 2}}, report=False)
+    assert S.find_by("T", "C", "v", 1) == {"a": {"v": 1}}
+    other.update_data("T", "C", "a", {"v": 2})
+    other.remove_data("T", "C", "b")
+
+    S.clear_cache()
+    assert S.find_by("T", "C", "v", 1) == {}
+    assert S.find_by("T", "C", "v", 2) == {"a": {"v": 2}}
+    assert stored_index(S, "T", "C", "v") == expected_index(S.get_data("T", "C"), "v")
+
+
+def test_index_field_names_cannot_nest_or_hit_the_registry(connect, gh):
+    S = connect()
+    S.create_class("C")
+    S.create_table("T", "C", shards=2)
+    S.create_index("T", "C", "_registry")
+    S.create_index("T", "C", "a/b")
+    S.insert_many("T", "C", {"x": {"_registry": 1, "a/b": 2}, "y": {"_registry": 2, "a/b": 2}}, report=False)
+    indexes = [path for path in paths(gh) if path.startswith("C/_indexes/T/")]
+    assert sorted(indexes) == ["C/_indexes/T/%5Fregistry.json", "C/_indexes/T/_registry.json", "C/_indexes/T/a%2Fb.json"]
+
+    reader = connect()
+    assert reader._index_fields("T", "C") == ["_registry", "a/b"]
+    assert reader.find_by("T", "C", "_registry", 1) == {"x": {"_registry": 1, "a/b": 2}}
+    assert set(reader.find_by("T", "C", "a/b", 2)) == {"x", "y"}
+    with pytest.raises(ValueError):
+        S.create_index("T", "C", "")
+
+
+def test_find_by_on_a_plain_table_does_not_read_the_index(connect, monkeypatch):
+    S = connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+    S.create_index("T", "C", "v")
+    S.insert_many("T", "C", {"a": {"v": 1}, "b": {"v": 2}}, report=False)
+    read_table = S._read_table
+    parts = []
+
+    def reading(part, *args, **kwargs):
+        parts.append(part)
+        return read_table(part, *args, **kwargs)
+
+    monkeypatch.setattr(S, "_read_table", reading)
+    assert S.find_by("T", "C", "v", 1) == {"a": {"v": 1}}
+    assert dict(S.query("T", "C", where={"v": 2})) == {"b": {"v": 2}}
+    assert S._index_part("T", "v") not in parts
+
+
+# === codecs ===
+@pytest.mark.parametrize("row", [{1: "a"}, (1, 2), {"v": {1, 2}}, {"v": (1, 2)}], ids=["int key", "tuple", "set", "nested tuple"])
+def test_rows_a_json_table_cannot_hold_are_rejected(connect, row):
+    S = connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+    with pytest.raises(TypeError, match="read back as written"):
+        S.insert_data("T", "C", "a", row)
+    with pytest.raises(TypeError):
+        S.insert_data("T", "C", 1, {"v": 1})
+    assert S.search_data("T", "C", "a") is None
+    assert connect().get_data("T", "C") == {}
+
+
+def test_a_legacy_table_keeps_rows_json_cannot_hold(connect, gh):
+    S = connect()
+    S.create_class("C")
+    gh.write({"C/L.json": str({"a": {1: (2, 3)}}).encode()})
+    S.insert_data("L", "C", "b", {2: (4, 5)})
+    assert S.search_data("L", "C", "b") == {2: (4, 5)}
+    assert connect().get_data("L", "C") == {"a": {1: (2, 3)}, "b": {2: (4, 5)}}
+
+
+# === reshard ===
+def test_reshard_keeps_a_write_made_while_it_runs(connect, gh, monkeypatch):
+    S, other = connect(), connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+    S.create_index("T", "C", "v")
+    other.insert_data("T", "C", "a", {"v": 1})
+    write_shards = S._write_shards
+    raced = []
+
+    def racing(*args, **kwargs):
+        # Another server commits between the reshard's read and its write
+        if not raced:
+            raced.append(other.insert_many("T", "C", {"b": {"v": 2}}, report=False))
+        return write_shards(*args, **kwargs)
+
+    monkeypatch.setattr(S, "_write_shards", racing)
+    S.reshard("T", "C", 4)
+    assert raced == [{"b": "inserted"}]
+    assert "C/T.json" not in paths(gh) and "C/T/_manifest.json" in paths(gh)
+
+    # `other` still has the plain layout cached: its write finds the table moved and retries
+    assert other.insert_many("T", "C", {"c": {"v": 3}}, report=False) == {"c": "inserted"}
+    reader = connect()
+    rows = reader.get_data("T", "C")
+    assert rows == {"a": {"v": 1}, "b": {"v": 2}, "c": {"v": 3}}
+    assert stored_index(reader, "T", "C", "v") == expected_index(rows, "v")
+    assert S.write_stats()["failures"] == 0 and other.write_stats()["failures"] == 0
+
+
+def test_reshard_under_concurrent_writers(connect):
+    S = connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+    writers = [connect() for _ in range(4)]
+    errors = []
+
+    def write(n, W):
+        try:
+            for i in range(8):
+                W.insert_data("T", "C", f"w{n}_{i}", {"v": i})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n, W)) for n, W in enumerate(writers)]
+    for thread in threads:
+        thread.start()
+    S.reshard("T", "C", 2)
+    S.reshard("T", "C", 4)
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    reader = connect()
+    rows = reader.get_data("T", "C")
+    assert sorted(rows) == sorted(f"w{n}_{i}" for n in range(4) for i in range(8))
+    assert reader._shards("T", "C") == 4
+
+
+# === write-behind ===
+def test_flush_raises_the_error_of_a_failed_write(connect):
+    S = connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+    buffered = connect(write_behind="exit")
+    buffered.insert_data("T", "C", "a", 1)
+    S.remove_table("C", "T")
+
+    with pytest.raises(GithubException) as error:
+        buffered.flush()
+    assert error.value.status == 404
+    assert buffered.write_stats()["buffered"] == 0
+    buffered.flush()
+
+
+def test_background_flush_error_is_raised_by_the_next_flush(connect):
+    S = connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+    buffered = connect(write_behind="window", flush_interval=0.5)
+    buffered.insert_data("T", "C", "a", 1)
+    S.remove_table("C", "T")
+    deadline = time.monotonic() + 10
+    while buffered.write_stats()["flushes"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    with pytest.raises(GithubException):
+        buffered.flush()
+    buffered.flush()
+
+
+def test_sync_write_behind_raises_from_the_call(connect):
+    S = connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+    buffered = connect(write_behind="sync")
+    with pytest.raises(TypeError):
+        buffered.insert_data("T", "C", "bad", {"v": object()})
+    assert buffered.search_data("T", "C", "bad") is None
+
+
+# === snapshots ===
+WRITES = {
+    "insert_data": lambda S: S.insert_data("T", "C", "new", 1),
+    "update_data": lambda S: S.update_data("T", "C", "a", 2),
+    "remove_data": lambda S: S.remove_data("T", "C", "a"),
+    "insert_many": lambda S: S.insert_many("T", "C", {"new": 1}, report=False),
+    "create_class": lambda S: S.create_class("D"),
+    "create_table": lambda S: S.create_table("U", "C"),
+    "remove_table": lambda S: S.remove_table("C", "T"),
+    "create_index": lambda S: S.create_index("T", "C", "v"),
+    "reshard": lambda S: S.reshard("T", "C", 2),
+    "flush": lambda S: S.flush(),
+}
+
+
+@pytest.mark.parametrize("write", WRITES.values(), ids=WRITES.keys())
+def test_writes_inside_a_snapshot_raise(connect, gh, write):
+    S = connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+    S.insert_data("T", "C", "a", 1)
+    before = paths(gh), S.get_data("T", "C")
+    with S.snapshot():
+        with pytest.raises(RuntimeError):
+            write(S)
+    assert (paths(gh), S.get_data("T", "C")) == before
+    write(S)
+
+
+def test_snapshot_does_not_see_writes_of_other_servers(connect):
+    S, writer = connect(), connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+    S.insert_data("T", "C", "a", 1)
+    with S.snapshot():
+        rows = S.get_data("T", "C")
+        writer.insert_data("T", "C", "late", 2)
+        writer.create_table("U", "C")
+        assert S.get_data("T", "C") == rows
+        assert S.search_data("T", "C", "late") is None
+        assert "U" not in S.list_tables("C")
+        pinned = S.query("T", "C")
+    assert dict(pinned) == {"a": 1}
+    S.clear_cache()
+    assert S.get_data("T", "C") == {"a": 1, "late": 2}
+
+
+def test_nested_snapshots_of_two_servers_keep_their_own_pins(connect):
+    S, other, writer = connect(), connect(), connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+    S.insert_data("T", "C", "a", 1)
+    with S.snapshot():
+        writer.insert_data("T", "C", "b", 2)
+        with other.snapshot():
+            writer.insert_data("T", "C", "c", 3)
+            assert S.get_data("T", "C") == {"a": 1}
+            assert other.get_data("T", "C") == {"a": 1, "b": 2}
+        assert S._pinned() is not None and other._pinned() is None
+        assert S.get_data("T", "C") == {"a": 1}
+    assert S._pinned() is None
+
+
+def test_export_inside_a_snapshot(connect, tmp_path):
+    S, writer = connect(), connect()
+    S.create_class("C")
+    S.create_table("T", "C")
+    S.insert_data("T", "C", "a", 1)
+    with S.snapshot() as commit:
+        writer.insert_data("T", "C", "late", 2)
+        assert S.export(tmp_path / "pinned.bundle") == commit
+    target = connect()
+    target.import_(tmp_path / "pinned.bundle")
+    assert target.get_data("T", "C") == {"a": 1}